@@ -0,0 +1,54 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_ALIAS = 'auth_tokens'
+
+
+def token_cache_key(key: str) -> str:
+    # Sin el token en claro dentro de la caché
+    return f"auth_token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def invalidate_tokens(keys):
+    """Descartar tokens de la caché al confirmar la transacción actual"""
+    cache_keys = [token_cache_key(key) for key in keys]
+    if cache_keys:
+        transaction.on_commit(lambda: caches[TOKEN_CACHE_ALIAS].delete_many(cache_keys))
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication con el par (usuario, token) en caché
+
+    Evita el JOIN de authtoken_token con users_user en cada request. La caché
+    'auth_tokens' vive en Redis si hay REDIS_URL; si no, es por proceso con
+    un TTL de pocos segundos, que es lo que tarda en llegar a las demás
+    instancias una invalidación. Solo guarda tokens válidos de usuarios
+    activos y se invalida con las señales de apps/authentication/signals.py:
+    logout o rotación del token y cualquier save del usuario (desactivación
+    incluida). Un update() masivo de usuarios no dispara señales: ahí manda
+    el TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        ttl = settings.AUTH_TOKEN_CACHE_TTL
+        if not ttl:
+            return super().authenticate_credentials(key)
+
+        cache = caches[TOKEN_CACHE_ALIAS]
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            # Lanza AuthenticationFailed si el token no existe o el usuario está inactivo
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, ttl)
+
+        return token.user, token
@@ -0,0 +1,96 @@
+import time
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from apps.authentication.authentication import CachedTokenAuthentication, TOKEN_CACHE_ALIAS, token_cache_key
+
+
+class Command(BaseCommand):
+    help = ('Mide requests/s de un endpoint autenticado por token con TokenAuthentication '
+            'y con CachedTokenAuthentication, sobre una base de datos de prueba')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000,
+                            help='Requests por clase de autenticación')
+        parser.add_argument('--users', type=int, default=200,
+                            help='Usuarios (tokens) distintos, usados en ronda')
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help='Latencia simulada por consulta (la base de prueba es local)')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, options):
+        from rest_framework.authentication import TokenAuthentication
+        from rest_framework.authtoken.models import Token
+        from rest_framework.permissions import IsAuthenticated
+        from rest_framework.response import Response
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.views import APIView
+        from apps.users.models import User
+
+        keys = []
+        for index in range(options['users']):
+            user = User.objects.create_user(
+                username=f'bench-auth-{index}', password=None, phone=f'7{index:07d}', user_type='client'
+            )
+            keys.append(Token.objects.create(user=user).key)
+
+        factory = APIRequestFactory()
+        requests = [
+            factory.get('/bench/', HTTP_AUTHORIZATION=f'Token {keys[index % len(keys)]}')
+            for index in range(options['requests'])
+        ]
+        queries = [0]
+        latency = options['db_latency_ms'] / 1000
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            if latency:
+                time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        self.stdout.write(f"{options['requests']} requests por clase, {len(keys)} tokens, "
+                          f"latencia simulada {options['db_latency_ms']:.1f} ms por consulta")
+
+        results = {}
+        for authentication_class in (TokenAuthentication, CachedTokenAuthentication):
+            class BenchmarkView(APIView):
+                authentication_classes = [authentication_class]
+                permission_classes = [IsAuthenticated]
+
+                def get(self, request):
+                    return Response({'user': str(request.user.id)})
+
+            view = BenchmarkView.as_view()
+            # Solo las claves del benchmark: en Redis clear() vaciaría toda la base
+            caches[TOKEN_CACHE_ALIAS].delete_many([token_cache_key(key) for key in keys])
+            queries[0] = 0
+            failed = 0
+
+            with connection.execute_wrapper(count_queries):
+                started = time.perf_counter()
+                for request in requests:
+                    if view(request).status_code != 200:
+                        failed += 1
+                elapsed = time.perf_counter() - started
+
+            rate = len(requests) / elapsed
+            results[authentication_class.__name__] = rate
+            self.stdout.write(
+                f"  {authentication_class.__name__:<27} {rate:9.0f} req/s  "
+                f"{elapsed / len(requests) * 1e6:7.1f} µs/req  "
+                f"consultas={queries[0]:<6} errores={failed}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"CachedTokenAuthentication: {results['CachedTokenAuthentication'] / results['TokenAuthentication']:.2f}x"
+        ))
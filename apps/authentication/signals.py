@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens, invalidate_user_tokens
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Logout o rotación del token"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_saved_user(sender, instance, created=False, update_fields=None, **kwargs):
+    """El usuario cacheado pudo cambiar (is_active, user_type, ...)"""
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        # Sin tokens previos / el login no cambia nada de lo que usa la API
+        return
+    invalidate_user_tokens(instance.pk)
@@ -1,3 +1,59 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.users.models import User
+from .authentication import CachedTokenAuthentication, TOKEN_CACHE_ALIAS, token_cache_key
+
+PROTECTED_URL = '/api/notifications/unread_count/'
+# La primera autenticación (sesión) no envía WWW-Authenticate: DRF responde 403
+REJECTED = 403
+
+
+@override_settings(AUTH_TOKEN_CACHE_TTL=60)
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', password=None, phone='62000001', user_type='client')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.cache = caches[TOKEN_CACHE_ALIAS]
+        self.addCleanup(self.cache.delete, token_cache_key(self.token.key))
+
+    def get(self):
+        return self.client.get(PROTECTED_URL).status_code
+
+    def test_token_is_served_from_the_cache(self):
+        self.assertEqual(self.get(), 200)
+        self.assertIsNotNone(self.cache.get(token_cache_key(self.token.key)))
+
+        with self.assertNumQueries(0):
+            user, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(user.id, self.user.id)
+
+    def test_logout_revokes_the_cached_token(self):
+        self.assertEqual(self.get(), 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/users/logout/').status_code, 200)
+
+        self.assertIsNone(self.cache.get(token_cache_key(self.token.key)))
+        self.assertEqual(self.get(), REJECTED)
+
+    def test_deleted_token_is_rejected(self):
+        self.assertEqual(self.get(), 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(key=self.token.key).delete()
+
+        self.assertEqual(self.get(), REJECTED)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.get(), 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.get(), REJECTED)
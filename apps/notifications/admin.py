@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, FCMToken
+from .models import Notification, FCMToken, NotificationPurgeRun
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -12,4 +12,10 @@ class NotificationAdmin(admin.ModelAdmin):
 class FCMTokenAdmin(admin.ModelAdmin):
     list_display = ('user', 'platform', 'device_id', 'is_active', 'created_at')
     list_filter = ('platform', 'is_active', 'created_at')
-    search_fields = ('user__username', 'device_id')
\ No newline at end of file
+    search_fields = ('user__username', 'device_id')
+
+@admin.register(NotificationPurgeRun)
+class NotificationPurgeRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'status', 'expired_deleted', 'promotions_deleted', 'unread_deleted', 'batches', 'duration_ms')
+    list_filter = ('status', 'started_at')
+    readonly_fields = ('started_at', 'finished_at')
@@ -0,0 +1,50 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.notifications.models import Notification
+from apps.notifications.services.notification_service import NotificationService
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Envía una notificación a todos los usuarios (o a un tipo de usuario) en bloques'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--title', required=True)
+        parser.add_argument('--message', required=True)
+        parser.add_argument('--type', dest='notification_type', default='promotion',
+                            choices=[choice for choice, _ in Notification.NOTIFICATION_TYPES])
+        parser.add_argument('--user-type', default=None,
+                            help='Solo usuarios de este tipo (client, driver, business, admin)')
+        parser.add_argument('--data', default=None,
+                            help='Datos adicionales en JSON')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Usuarios por bloque (por defecto NOTIFICATION_BULK_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            data = json.loads(options['data']) if options['data'] else {}
+        except ValueError as e:
+            raise CommandError(f"--data no es JSON válido: {e}")
+
+        users = User.objects.filter(is_active=True)
+        if options['user_type']:
+            users = users.filter(user_type=options['user_type'])
+
+        def progress(results):
+            self.stdout.write(f"  {results['processed_users']}/{results['total_users']} usuarios")
+
+        results = NotificationService().send_bulk_notification(
+            users.order_by('id').values_list('id', flat=True),
+            title=options['title'],
+            message=options['message'],
+            notification_type=options['notification_type'],
+            data=data,
+            chunk_size=options['chunk_size'],
+            progress=progress
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{results['success_count']} notificaciones creadas, {results['push_sent_count']} push enviados, "
+            f"{results['error_count']} errores"
+        ))
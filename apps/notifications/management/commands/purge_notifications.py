@@ -0,0 +1,52 @@
+import time
+from django.core.management.base import BaseCommand
+
+from apps.notifications.services.retention import NotificationPurger
+
+
+class Command(BaseCommand):
+    help = 'Elimina las notificaciones antiguas y las promociones leídas en lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Antigüedad máxima (por defecto NOTIFICATION_RETENTION_DAYS)')
+        parser.add_argument('--promotion-days', type=int, default=None,
+                            help='Antigüedad máxima de promociones leídas '
+                                 '(por defecto NOTIFICATION_READ_PROMOTION_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Filas por DELETE (por defecto NOTIFICATION_PURGE_BATCH_SIZE)')
+        parser.add_argument('--pause', type=float, default=None,
+                            help='Segundos entre lotes (por defecto NOTIFICATION_PURGE_PAUSE_SECONDS)')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Máximo de lotes por pasada')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo contar lo que se eliminaría')
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir purgando indefinidamente')
+        parser.add_argument('--interval', type=float, default=3600,
+                            help='Segundos de espera entre pasadas con --loop')
+
+    def handle(self, *args, **options):
+        purger = NotificationPurger(
+            retention_days=options['days'],
+            promotion_days=options['promotion_days'],
+            batch_size=options['batch_size'],
+            pause=options['pause']
+        )
+
+        if options['dry_run']:
+            counts = purger.count()
+            self.stdout.write(f"Se eliminarían {counts['expired']} notificaciones vencidas "
+                              f"y {counts['promotions']} promociones leídas")
+            return
+
+        while True:
+            purge_run = purger.run(max_batches=options['max_batches'])
+            style = self.style.SUCCESS if purge_run.status == 'completed' else self.style.ERROR
+            self.stdout.write(style(
+                f"{purge_run.expired_deleted} vencidas y {purge_run.promotions_deleted} promociones eliminadas "
+                f"en {purge_run.batches} lotes ({purge_run.duration_ms} ms)"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
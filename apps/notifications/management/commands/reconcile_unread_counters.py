@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+
+from apps.notifications.services.unread_counter import UnreadCounts
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de notificaciones no leídas y corrige los desvíos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Usuarios por bloque')
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir reconciliando indefinidamente')
+        parser.add_argument('--interval', type=float, default=3600,
+                            help='Segundos de espera entre pasadas con --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            totals = UnreadCounts.reconcile(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{totals['checked']} usuarios revisados, {totals['fixed']} contadores corregidos, "
+                f"{totals['created']} creados"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationPurgeRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'En curso'), ('completed', 'Completada'), ('failed', 'Fallida')], default='running', max_length=20)),
+                ('expired_cutoff', models.DateTimeField()),
+                ('promotion_cutoff', models.DateTimeField()),
+                ('expired_deleted', models.PositiveIntegerField(default=0)),
+                ('promotions_deleted', models.PositiveIntegerField(default=0)),
+                ('unread_deleted', models.PositiveIntegerField(default=0)),
+                ('batches', models.PositiveIntegerField(default=0)),
+                ('duration_ms', models.PositiveIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='notification_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['notification_type', 'is_read', 'created_at'], name='notification_type_read_idx'),
+        ),
+    ]
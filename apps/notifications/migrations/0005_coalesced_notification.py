@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0004_notification_purge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoalescedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collapse_key', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(choices=[('order_update', 'Actualización de Pedido'), ('payment', 'Pago'), ('promotion', 'Promoción'), ('driver_assignment', 'Asignación de Conductor'), ('delivery', 'Entrega'), ('rating', 'Calificación')], max_length=30)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('flush_after', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coalesced_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['flush_after'], name='coalesced_flush_after_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='coalescednotification',
+            constraint=models.UniqueConstraint(fields=('user', 'collapse_key'), name='coalesced_user_key_uniq'),
+        ),
+    ]
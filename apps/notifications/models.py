@@ -30,9 +30,19 @@ class Notification(models.Model):
     fcm_response = models.JSONField(default=dict, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Feed, no leídas y por tipo: siempre por usuario y del más reciente al más antiguo
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_feed_idx'),
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_user_unread_idx'),
+            models.Index(fields=['user', 'notification_type', '-created_at'], name='notification_user_type_idx'),
+            # Purga global por antigüedad
+            models.Index(fields=['created_at'], name='notification_created_idx'),
+            models.Index(fields=['notification_type', 'is_read', 'created_at'], name='notification_type_read_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
@@ -44,4 +54,72 @@ class FCMToken(models.Model):
     platform = models.CharField(max_length=10, choices=[('ios', 'iOS'), ('android', 'Android')], blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
\ No newline at end of file
+    updated_at = models.DateTimeField(auto_now=True)
+
+class UnreadCounter(models.Model):
+    """Notificaciones no leídas por usuario (ver services/unread_counter.py)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.unread_count}"
+
+class NotificationPurgeRun(models.Model):
+    """Métricas de cada ejecución de la purga de notificaciones antiguas"""
+    RUN_STATUS = (
+        ('running', 'En curso'),
+        ('completed', 'Completada'),
+        ('failed', 'Fallida'),
+    )
+
+    status = models.CharField(max_length=20, choices=RUN_STATUS, default='running')
+    expired_cutoff = models.DateTimeField()
+    promotion_cutoff = models.DateTimeField()
+    expired_deleted = models.PositiveIntegerField(default=0)
+    promotions_deleted = models.PositiveIntegerField(default=0)
+    unread_deleted = models.PositiveIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+    duration_ms = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    @property
+    def total_deleted(self):
+        return self.expired_deleted + self.promotions_deleted
+
+    def __str__(self):
+        return f"Purga {self.started_at:%Y-%m-%d %H:%M} - {self.total_deleted} eliminadas"
+
+class CoalescedNotification(models.Model):
+    """
+    Notificación retenida unos segundos antes de enviarse
+
+    Una fila por (usuario, collapse_key): cada actualización nueva reemplaza
+    a la anterior y al vencer flush_after se entrega solo el último estado.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coalesced_notifications')
+    collapse_key = models.CharField(max_length=100)  # p. ej. 'order:<id>'
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES)
+    data = models.JSONField(default=dict, blank=True)
+
+    flush_after = models.DateTimeField()  # Fijado por la primera actualización de la ventana
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'collapse_key'], name='coalesced_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['flush_after'], name='coalesced_flush_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.collapse_key}"
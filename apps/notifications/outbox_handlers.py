@@ -0,0 +1,8 @@
+from apps.outbox.services.registry import outbox_handler
+from .services.coalescer import NotificationCoalescer, FLUSH_EVENT
+
+
+@outbox_handler(FLUSH_EVENT)
+def flush_coalesced_notifications(event):
+    """Entregar las notificaciones retenidas cuya ventana venció"""
+    NotificationCoalescer().flush_due()
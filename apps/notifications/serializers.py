@@ -1,3 +1,5 @@
+from datetime import timedelta
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Notification, FCMToken
 
@@ -14,10 +16,10 @@ class NotificationSerializer(serializers.ModelSerializer):
     
     def get_time_ago(self, obj):
         """Calcular tiempo transcurrido desde la creación"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        now = timezone.now()
+        # Un solo "ahora" para toda la lista (context['now'] o el del primer elemento)
+        now = self.context.get('now')
+        if now is None:
+            now = self.context['now'] = timezone.now()
         diff = now - obj.created_at
         
         if diff < timedelta(minutes=1):
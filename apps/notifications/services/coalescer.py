@@ -0,0 +1,135 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, Any, List
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.outbox.services.publisher import publish
+from ..models import Notification, CoalescedNotification
+from .notification_service import NotificationService
+
+logger = logging.getLogger(__name__)
+
+FLUSH_EVENT = 'notifications.flush_coalesced'
+
+
+@dataclass
+class PendingNotification:
+    user_id: object
+    collapse_key: str
+    title: str
+    message: str
+    notification_type: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+class NotificationCoalescer:
+    """
+    Retiene las notificaciones por (usuario, collapse_key) durante una ventana
+
+    enqueue() hace un upsert por fila (bulk_create con update_conflicts): la
+    última actualización reemplaza a las anteriores y la ventana no se
+    extiende, así el estado final llega a lo sumo window segundos tarde. Un
+    evento diferido del outbox vacía las filas vencidas con un solo
+    bulk_create de Notification y un push por fila con su collapse_key.
+    """
+
+    def __init__(self, window: float = None, batch_size: int = None):
+        self.window = settings.NOTIFICATION_COALESCE_SECONDS if window is None else window
+        self.batch_size = batch_size or settings.NOTIFICATION_COALESCE_BATCH_SIZE
+
+    def enqueue(self, items: List[PendingNotification]):
+        if not items:
+            return
+
+        if self.window <= 0:
+            # Sin ventana: entregar directamente
+            self._deliver([self._build_row(item, timezone.now()) for item in items])
+            return
+
+        now = timezone.now()
+        # Una fila por clave aunque vengan varias en la misma llamada: gana la última
+        latest = {(item.user_id, item.collapse_key): item for item in items}
+        CoalescedNotification.objects.bulk_create(
+            [self._build_row(item, now) for item in latest.values()],
+            update_conflicts=True,
+            unique_fields=['user', 'collapse_key'],
+            update_fields=['title', 'message', 'notification_type', 'data', 'updated_at']
+        )
+        publish(FLUSH_EVENT, 'notification', 'coalesced', delay=timedelta(seconds=self.window))
+
+    def flush_due(self) -> Dict[str, int]:
+        """
+        Entregar las filas cuya ventana venció
+
+        Dentro de la transacción solo se toman y borran las filas; las
+        notificaciones y el push salen después del commit, sin locks abiertos
+        durante la llamada a FCM. Si la entrega falla las filas vuelven a la
+        cola (sin pisar una actualización más nueva) con otro evento de flush.
+        Fuera de una transacción la entrega es inmediata y los totales incluyen
+        push_sent; dentro, push_sent se completa al confirmar.
+        """
+        totals = {'flushed': 0, 'push_sent': 0}
+
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    CoalescedNotification.objects.select_for_update(skip_locked=True).filter(
+                        flush_after__lte=timezone.now()
+                    ).order_by('flush_after')[:self.batch_size]
+                )
+                if not rows:
+                    break
+                CoalescedNotification.objects.filter(id__in=[row.id for row in rows]).delete()
+
+            totals['flushed'] += len(rows)
+            transaction.on_commit(lambda rows=rows: self._deliver_claimed(rows, totals))
+            if len(rows) < self.batch_size:
+                break
+
+        if totals['flushed']:
+            logger.info(f"Coalesced notifications flushed: {totals}")
+        return totals
+
+    def _deliver_claimed(self, rows: List[CoalescedNotification], totals: Dict[str, int]):
+        try:
+            result = self._deliver(rows)
+        except Exception as e:
+            logger.error(f"Coalesced notification delivery of {len(rows)} rows failed, requeued: {e}")
+            self._requeue(rows)
+            return
+        totals['push_sent'] += result['push_sent']
+
+    def _requeue(self, rows: List[CoalescedNotification]):
+        # Si llegó una actualización más nueva de la misma clave, gana esa
+        CoalescedNotification.objects.bulk_create(rows, ignore_conflicts=True)
+        publish(FLUSH_EVENT, 'notification', 'coalesced', delay=timedelta(seconds=self.window))
+
+    def _build_row(self, item: PendingNotification, now) -> CoalescedNotification:
+        return CoalescedNotification(
+            user_id=item.user_id,
+            collapse_key=item.collapse_key,
+            title=item.title,
+            message=item.message,
+            notification_type=item.notification_type,
+            data=item.data,
+            flush_after=now + timedelta(seconds=self.window),
+            updated_at=now
+        )
+
+    def _deliver(self, rows: List[CoalescedNotification]) -> Dict[str, int]:
+        return NotificationService().send_many(
+            [
+                Notification(
+                    user_id=row.user_id,
+                    title=row.title,
+                    message=row.message,
+                    notification_type=row.notification_type,
+                    data=row.data
+                )
+                for row in rows
+            ],
+            collapse_keys=[row.collapse_key for row in rows]
+        )
@@ -0,0 +1,97 @@
+import base64
+import uuid
+from typing import Dict, Any, Tuple
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from ..models import Notification
+
+DEFAULT_FEED_LIMIT = 20
+MAX_FEED_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(notification: Notification) -> str:
+    raw = f"{notification.created_at.isoformat()}|{notification.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, notification_id = raw.split('|', 1)
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError
+        return created_at, uuid.UUID(notification_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+class NotificationFeed:
+    """
+    Paginación por cursor (keyset) sobre (created_at, id)
+
+    Cada página es un rango del índice (user, -created_at, -id): cuesta lo
+    mismo la primera que la número cien, sin OFFSET ni COUNT.
+    """
+
+    def __init__(self, user, notification_type: str = None, unread_only: bool = False):
+        queryset = Notification.objects.filter(user=user)
+        if notification_type:
+            queryset = queryset.filter(notification_type=notification_type)
+        if unread_only:
+            queryset = queryset.filter(is_read=False)
+        self.queryset = queryset
+
+    @staticmethod
+    def parse_limit(value) -> int:
+        if value in (None, ''):
+            return DEFAULT_FEED_LIMIT
+        return max(1, min(int(value), MAX_FEED_LIMIT))
+
+    def page(self, cursor: str = None, limit: int = DEFAULT_FEED_LIMIT) -> Dict[str, Any]:
+        """Del más reciente al más antiguo; next_cursor continúa hacia atrás"""
+        queryset = self.queryset
+        if cursor:
+            created_at, notification_id = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=notification_id)
+            )
+
+        items = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+        has_more = len(items) > limit
+        items = items[:limit]
+
+        return {
+            'items': items,
+            'next_cursor': encode_cursor(items[-1]) if has_more else None,
+            'has_more': has_more,
+            'latest_cursor': encode_cursor(items[0]) if items and not cursor else None,
+        }
+
+    def since(self, cursor: str, limit: int = DEFAULT_FEED_LIMIT) -> Dict[str, Any]:
+        """
+        Lo nuevo desde cursor, del más antiguo al más reciente
+
+        latest_cursor es el since de la próxima consulta; con has_more hay
+        que volver a pedir con él para completar la sincronización.
+        """
+        created_at, notification_id = decode_cursor(cursor)
+        items = list(
+            self.queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=notification_id)
+            ).order_by('created_at', 'id')[:limit + 1]
+        )
+        has_more = len(items) > limit
+        items = items[:limit]
+
+        return {
+            'items': items,
+            'next_cursor': None,
+            'has_more': has_more,
+            'latest_cursor': encode_cursor(items[-1]) if items else cursor,
+        }
@@ -1,43 +1,333 @@
+import json
 import logging
-from typing import Dict, Any, Optional
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Any, Optional, Iterable, Callable, List, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+
+from ..models import Notification, FCMToken
+from .push_transport import PushTransport
+from .unread_counter import UnreadCounts
 
 logger = logging.getLogger(__name__)
 
+# Tipos de aviso históricos de send_order_notification -> estado de la orden
+ORDER_ACTION_STATUSES = {
+    'order_created': 'pending',
+    'order_confirmed': 'confirmed',
+    'order_assigned': 'assigned',
+    'order_picked_up': 'picked_up',
+    'order_delivered': 'delivered',
+}
+
+
+def _chunks(iterable: Iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 class NotificationService:
-    """Servicio básico para notificaciones"""
-    
+    """Servicio para enviar notificaciones push y locales"""
+
+    def __init__(self):
+        self.fcm_enabled = bool(settings.PUSH_BACKEND)
+
     def send_notification(
-        self, 
-        user, 
-        title: str, 
-        message: str, 
+        self,
+        user,
+        title: str,
+        message: str,
         notification_type: str = 'system',
         data: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Enviar notificación básica"""
+        """
+        Enviar notificación a un usuario
+
+        Args:
+            user: Usuario destinatario
+            title: Título de la notificación
+            message: Mensaje de la notificación
+            notification_type: Tipo de notificación
+            data: Datos adicionales
+
+        Returns:
+            Dict con resultado del envío
+        """
         try:
-            from ..models import Notification
-            
             # Crear notificación en la base de datos
-            notification = Notification.objects.create(
-                user=user,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                data=data or {}
-            )
-            
-            logger.info(f"Notification created: {notification.id}")
-            
-            return {
+            with transaction.atomic():
+                notification = Notification.objects.create(
+                    user=user,
+                    title=title,
+                    message=message,
+                    notification_type=notification_type,
+                    data=data or {}
+                )
+                UnreadCounts.created([notification])
+
+            result = {
                 'notification_id': notification.id,
-                'success': True,
-                'message': 'Notification sent successfully'
+                'database_saved': True,
+                'push_sent': False,
+                'push_errors': []
             }
-            
+
+            # Enviar notificación push si está habilitado
+            if self.fcm_enabled:
+                push_result = self._send_push_notification(user, title, message, data)
+                result.update(push_result)
+            else:
+                logger.info("FCM not configured, skipping push notification")
+
+            return result
+
         except Exception as e:
             logger.error(f"Failed to send notification: {e}")
+            return {
+                'notification_id': None,
+                'database_saved': False,
+                'push_sent': False,
+                'error': str(e)
+            }
+
+    def _send_push_notification(
+        self,
+        user,
+        title: str,
+        message: str,
+        data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Enviar notificación push via FCM"""
+        try:
+            # Obtener tokens activos del usuario
+            tokens = list(FCMToken.objects.filter(user=user, is_active=True).values_list('token', flat=True))
+
+            if not tokens:
+                return {
+                    'push_sent': False,
+                    'push_errors': ['No active FCM tokens found']
+                }
+
+            sent, errors = self._send_push_batch(tokens, title, message, data)
+
+            return {
+                'push_sent': sent > 0,
+                'tokens_sent': sent,
+                'push_errors': errors
+            }
+
+        except Exception as e:
+            logger.error(f"Push notification service error: {e}")
+            return {
+                'push_sent': False,
+                'push_errors': [str(e)]
+            }
+
+    def _send_push_batch(
+        self,
+        tokens: List[str],
+        title: str,
+        message: str,
+        data: Optional[Dict[str, Any]] = None
+    ) -> Tuple[int, List[str]]:
+        """
+        Enviar el mismo push a una lista de tokens
+
+        Devuelve (enviados, errores); ver PushTransport para el envío multicast
+        y la desactivación de tokens inválidos.
+        """
+        result = PushTransport().send(tokens, title, message, data)
+        return result.sent, result.errors
+
+    def send_bulk_notification(
+        self,
+        user_ids: Iterable,
+        title: str,
+        message: str,
+        notification_type: str = 'system',
+        data: Optional[Dict[str, Any]] = None,
+        chunk_size: int = None,
+        progress: Callable[[Dict[str, Any]], None] = None
+    ) -> Dict[str, Any]:
+        """
+        Enviar notificación a múltiples usuarios
+
+        user_ids puede ser una lista o un QuerySet de ids (se recorre con iterator).
+        Por bloque: una consulta de usuarios, un bulk_create de notificaciones,
+        una consulta de tokens FCM y un UPDATE de is_sent. progress recibe los
+        resultados parciales después de cada bloque.
+        """
+        from apps.users.models import User
+
+        chunk_size = chunk_size or settings.NOTIFICATION_BULK_CHUNK_SIZE
+
+        if isinstance(user_ids, QuerySet):
+            total_users = user_ids.count()
+            user_ids = user_ids.iterator(chunk_size=chunk_size)
+        else:
+            user_ids = list(user_ids)
+            total_users = len(user_ids)
+
+        results = {
+            'total_users': total_users,
+            'processed_users': 0,
+            'success_count': 0,
+            'error_count': 0,
+            'push_sent_count': 0,
+            'errors': []
+        }
+
+        for chunk in _chunks(user_ids, chunk_size):
+            try:
+                existing_ids = list(User.objects.filter(id__in=chunk).values_list('id', flat=True))
+                with transaction.atomic():
+                    notifications = Notification.objects.bulk_create([
+                        Notification(
+                            user_id=user_id,
+                            title=title,
+                            message=message,
+                            notification_type=notification_type,
+                            data=data or {}
+                        )
+                        for user_id in existing_ids
+                    ])
+                    UnreadCounts.created(notifications)
+                results['success_count'] += len(notifications)
+                results['error_count'] += len(chunk) - len(existing_ids)
+
+                if self.fcm_enabled and notifications:
+                    results['push_sent_count'] += self._push_chunk(notifications, title, message, data, results)
+
+            except Exception as e:
+                logger.error(f"Bulk notification chunk of {len(chunk)} users failed: {e}")
+                results['error_count'] += len(chunk)
+                results['errors'].append(str(e))
+
+            results['processed_users'] += len(chunk)
+            if progress:
+                progress(results)
+
+        logger.info(
+            f"Bulk notification '{title}' finished: {results['success_count']} created, "
+            f"{results['error_count']} errors, {results['push_sent_count']} pushes"
+        )
+        return results
+
+    def _push_chunk(self, notifications: List[Notification], title: str, message: str,
+                    data: Optional[Dict[str, Any]], results: Dict[str, Any]) -> int:
+        """Push para un bloque de notificaciones con una sola consulta de tokens"""
+        tokens_by_user = defaultdict(list)
+        for user_id, token in FCMToken.objects.filter(
+            user_id__in=[notification.user_id for notification in notifications],
+            is_active=True
+        ).values_list('user_id', 'token'):
+            tokens_by_user[user_id].append(token)
+
+        if not tokens_by_user:
+            return 0
+
+        tokens = [token for user_tokens in tokens_by_user.values() for token in user_tokens]
+        push = PushTransport().send(tokens, title, message, data)
+        results['errors'].extend(push.errors)
+
+        # Solo los destinatarios con al menos un token aceptado
+        accepted = set(push.accepted_tokens)
+        delivered_users = {
+            user_id for user_id, user_tokens in tokens_by_user.items()
+            if any(token in accepted for token in user_tokens)
+        }
+        Notification.objects.filter(
+            id__in=[notification.id for notification in notifications if notification.user_id in delivered_users]
+        ).update(is_sent=True)
+        return push.sent
+
+    def send_many(
+        self,
+        notifications: List[Notification],
+        collapse_keys: List[Optional[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Guardar notificaciones distintas entre sí y enviar su push
+
+        Un bulk_create para todas, una consulta de tokens FCM para todos los
+        destinatarios, un multicast por cada contenido distinto (título,
+        mensaje, data y collapse_key) y un UPDATE de is_sent. collapse_keys
+        (paralela a notifications) permite que el dispositivo reemplace el
+        push anterior.
+        """
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create(notifications)
+            UnreadCounts.created(notifications)
+
+        result = {'created': len(notifications), 'push_sent': 0}
+        if not self.fcm_enabled or not notifications:
+            return result
+
+        tokens_by_user = defaultdict(list)
+        for user_id, token in FCMToken.objects.filter(
+            user_id__in={notification.user_id for notification in notifications},
+            is_active=True
+        ).values_list('user_id', 'token'):
+            tokens_by_user[user_id].append(token)
+
+        # Los destinatarios de una misma transición reciben el mismo push
+        groups = defaultdict(list)
+        for notification, collapse_key in zip(notifications, collapse_keys or [None] * len(notifications)):
+            if tokens_by_user.get(notification.user_id):
+                key = (notification.title, notification.message,
+                       json.dumps(notification.data, sort_keys=True, default=str), collapse_key)
+                groups[key].append(notification)
+
+        transport = PushTransport()
+        sent_ids = []
+        for (title, message, _, collapse_key), group in groups.items():
+            tokens = list(dict.fromkeys(
+                token for notification in group for token in tokens_by_user[notification.user_id]
+            ))
+            push = transport.send(tokens, title, message, group[0].data, collapse_key=collapse_key)
+            result['push_sent'] += push.sent
+
+            # Solo los destinatarios con al menos un token aceptado
+            accepted = set(push.accepted_tokens)
+            sent_ids += [
+                notification.id for notification in group
+                if any(token in accepted for token in tokens_by_user[notification.user_id])
+            ]
+
+        Notification.objects.filter(id__in=sent_ids).update(is_sent=True)
+        return result
+
+    def send_order_notification(self, order, notification_type: str, custom_message: str = None):
+        """
+        Enviar notificación relacionada con una orden
+
+        Los cambios de estado ya publican 'order.status_changed'; esto queda
+        para avisos manuales y pasa por el mismo OrderNotifier en lote.
+        """
+        from .order_notifier import OrderNotifier
+
+        try:
+            recipients_count = OrderNotifier().notify([{
+                'order_id': str(order.id),
+                'status': ORDER_ACTION_STATUSES.get(notification_type, order.status),
+                'message': custom_message,
+                'action_type': notification_type
+            }])
+
+            return {
+                'success': True,
+                'recipients_count': recipients_count
+            }
+
+        except Exception as e:
+            logger.error(f"Failed to send order notification: {e}")
             return {
                 'success': False,
                 'error': str(e)
-            }
\ No newline at end of file
+            }
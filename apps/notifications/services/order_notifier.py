@@ -0,0 +1,100 @@
+import logging
+from typing import Dict, Any, List
+
+from apps.orders.models import Order
+from .coalescer import NotificationCoalescer, PendingNotification
+
+logger = logging.getLogger(__name__)
+
+# Campo de Order.values() con el id de cada destinatario
+RECIPIENT_FIELDS = {
+    'customer': 'customer_id',
+    'driver': 'driver_id',
+    'business': 'business__owner_id',
+}
+
+# estado -> (título, mensaje, destinatarios)
+ORDER_STATUS_MESSAGES = {
+    'pending': ('Nueva orden', 'La orden #{order_number} fue creada', ('customer', 'business')),
+    'confirmed': ('Orden confirmada', 'La orden #{order_number} fue confirmada', ('customer', 'business')),
+    'preparing': ('Orden en preparación', 'La orden #{order_number} se está preparando', ('customer',)),
+    'ready': ('Orden lista', 'La orden #{order_number} está lista para recoger', ('customer', 'driver')),
+    'assigned': ('Conductor asignado', 'Se asignó un conductor a la orden #{order_number}', ('customer', 'driver')),
+    'picked_up': ('Orden recogida', 'La orden #{order_number} fue recogida', ('customer',)),
+    'on_the_way': ('Orden en camino', 'La orden #{order_number} va en camino', ('customer',)),
+    'delivered': ('Orden entregada', 'La orden #{order_number} fue entregada', ('customer', 'driver', 'business')),
+    'cancelled': ('Orden cancelada', 'La orden #{order_number} fue cancelada', ('customer', 'driver', 'business')),
+}
+
+# action_type -> (título, mensaje, destinatarios); tiene prioridad sobre el estado
+ORDER_ACTION_MESSAGES = {
+    'payment_retry': (
+        'Pago expirado',
+        'El pago de tu orden #{order_number} expiró. Puedes intentarlo de nuevo',
+        ('customer',)
+    ),
+}
+
+
+class OrderNotifier:
+    """
+    Notificaciones de cambios de estado de órdenes, en lote
+
+    Resuelve cliente, conductor y dueño del negocio de todas las órdenes con
+    una sola consulta y entrega las filas por NotificationCoalescer con la
+    clave 'order:<id>': varias transiciones seguidas de la misma orden llegan
+    como una sola notificación con el último estado.
+    """
+
+    def __init__(self, coalescer: NotificationCoalescer = None):
+        self.coalescer = coalescer or NotificationCoalescer()
+
+    def notify(self, updates: List[Dict[str, Any]]) -> int:
+        """
+        updates: payloads de order_status_event (order_id, status, changed_by_id)
+        y opcionalmente message y action_type. Devuelve las notificaciones encoladas.
+        """
+        if not updates:
+            return 0
+
+        orders = {
+            str(row['id']): row
+            for row in Order.objects.filter(
+                id__in={update['order_id'] for update in updates}
+            ).values('id', 'order_number', *RECIPIENT_FIELDS.values())
+        }
+
+        items = []
+        for update in updates:
+            order = orders.get(str(update['order_id']))
+            template = ORDER_ACTION_MESSAGES.get(update.get('action_type')) or ORDER_STATUS_MESSAGES.get(update['status'])
+            if order is None or template is None:
+                continue
+
+            title, message, roles = template
+            for user_id in self._recipients(order, roles, update.get('changed_by_id')):
+                items.append(PendingNotification(
+                    user_id=user_id,
+                    collapse_key=f"order:{order['id']}",
+                    title=title,
+                    message=update.get('message') or message.format(order_number=order['order_number']),
+                    notification_type='order_update',
+                    data={
+                        'order_id': str(order['id']),
+                        'order_status': update['status'],
+                        'action_type': update.get('action_type') or 'status_changed'
+                    }
+                ))
+
+        self.coalescer.enqueue(items)
+        logger.info(f"Order notifications enqueued: {len(items)} for {len(updates)} status changes")
+        return len(items)
+
+    def _recipients(self, order: Dict[str, Any], roles, actor_id) -> List[Any]:
+        """Sin repetir y sin quien hizo el cambio"""
+        recipients = []
+        for role in roles:
+            user_id = order[RECIPIENT_FIELDS[role]]
+            if user_id and str(user_id) != str(actor_id) and user_id not in recipients:
+                recipients.append(user_id)
+        return recipients
@@ -0,0 +1,225 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from ..models import FCMToken
+
+logger = logging.getLogger(__name__)
+
+# Límite de tokens por envío multicast de FCM
+FCM_MULTICAST_LIMIT = 500
+
+# Códigos por token que significan que el token ya no sirve
+INVALID_TOKEN_ERRORS = ('unregistered', 'invalid_argument', 'sender_id_mismatch')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class PushResult:
+    sent: int = 0
+    failed: int = 0
+    invalid_tokens: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    # Tokens que el proveedor aceptó, para marcar como enviadas solo sus notificaciones
+    accepted_tokens: List[str] = field(default_factory=list)
+
+    def merge(self, other: 'PushResult'):
+        self.sent += other.sent
+        self.failed += other.failed
+        self.accepted_tokens.extend(other.accepted_tokens)
+        self.invalid_tokens.extend(other.invalid_tokens)
+        self.errors.extend(other.errors)
+
+
+class FakePushBackend:
+    """
+    Backend local: simula la latencia de un envío multicast sin salir a la red
+
+    Los tokens que empiezan con 'invalid' (o una fracción aleatoria
+    invalid_rate) se reportan como 'unregistered'.
+    """
+
+    max_batch_size = FCM_MULTICAST_LIMIT
+
+    def __init__(self, latency_ms: float = 0, invalid_rate: float = 0):
+        self.latency_ms = latency_ms
+        self.invalid_rate = invalid_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send_multicast(self, tokens: List[str], title: str, message: str,
+                       data: Dict[str, str], collapse_key: str = None) -> List[Optional[str]]:
+        with self._lock:
+            self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [
+            'unregistered' if token.startswith('invalid') or random.random() < self.invalid_rate else None
+            for token in tokens
+        ]
+
+
+class FirebasePushBackend:
+    """Backend de Firebase Cloud Messaging (requiere firebase-admin)"""
+
+    max_batch_size = FCM_MULTICAST_LIMIT
+
+    def __init__(self):
+        try:
+            import firebase_admin
+            from firebase_admin import credentials, messaging
+        except ImportError:
+            raise ImproperlyConfigured("PUSH_BACKEND='firebase' requiere el paquete firebase-admin")
+
+        self.messaging = messaging
+        try:
+            self.app = firebase_admin.get_app()
+        except ValueError:
+            # Sin archivo de credenciales se usan las credenciales por defecto de Cloud Run
+            credentials_file = settings.FIREBASE_CREDENTIALS_FILE
+            self.app = firebase_admin.initialize_app(
+                credentials.Certificate(credentials_file) if credentials_file else None
+            )
+
+    def send_multicast(self, tokens: List[str], title: str, message: str,
+                       data: Dict[str, str], collapse_key: str = None) -> List[Optional[str]]:
+        android = apns = None
+        if collapse_key:
+            # El dispositivo reemplaza el push anterior con la misma clave
+            android = self.messaging.AndroidConfig(collapse_key=collapse_key)
+            apns = self.messaging.APNSConfig(headers={'apns-collapse-id': collapse_key[:64]})
+
+        response = self.messaging.send_each_for_multicast(
+            self.messaging.MulticastMessage(
+                tokens=tokens,
+                notification=self.messaging.Notification(title=title, body=message),
+                data=data,
+                android=android,
+                apns=apns
+            ),
+            app=self.app
+        )
+        return [None if item.success else self._error_code(item.exception) for item in response.responses]
+
+    def _error_code(self, exception) -> str:
+        if isinstance(exception, self.messaging.UnregisteredError):
+            return 'unregistered'
+        if isinstance(exception, self.messaging.SenderIdMismatchError):
+            return 'sender_id_mismatch'
+        code = getattr(exception, 'code', None) or type(exception).__name__
+        return str(code).lower()
+
+
+PUSH_BACKENDS = {
+    'fake': FakePushBackend,
+    'firebase': FirebasePushBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Backend configurado en PUSH_BACKEND ('fake', 'firebase' o ruta a una clase)"""
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = settings.PUSH_BACKEND
+                if not name:
+                    raise ImproperlyConfigured('PUSH_BACKEND no está configurado')
+                backend_class = PUSH_BACKENDS.get(name) or import_string(name)
+                _backend = backend_class()
+    return _backend
+
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=settings.PUSH_WORKERS, thread_name_prefix='push')
+                _executor_pid = pid
+    return _executor
+
+
+class PushTransport:
+    """
+    Envío de un mismo push a muchos tokens
+
+    Los tokens se agrupan en lotes multicast del tamaño máximo del proveedor
+    y los lotes se envían en paralelo en un pool acotado (PUSH_WORKERS).
+    Los tokens inválidos se desactivan con un solo UPDATE.
+    """
+
+    def __init__(self, backend=None, batch_size: int = None, executor: ThreadPoolExecutor = None):
+        self.backend = backend or get_backend()
+        self.batch_size = min(batch_size or settings.PUSH_BATCH_SIZE, self.backend.max_batch_size)
+        self.executor = executor
+
+    def send(self, tokens: List[str], title: str, message: str, data: Optional[Dict[str, Any]] = None,
+             deactivate_invalid: bool = True, collapse_key: str = None) -> PushResult:
+        result = PushResult()
+        if not tokens:
+            return result
+
+        # FCM solo acepta valores string en data
+        payload = {str(key): str(value) for key, value in (data or {}).items()}
+        batches = [tokens[i:i + self.batch_size] for i in range(0, len(tokens), self.batch_size)]
+
+        if len(batches) == 1:
+            result.merge(self._send_batch(batches[0], title, message, payload, collapse_key))
+        else:
+            executor = self.executor or _get_executor()
+            futures = [
+                executor.submit(self._send_batch, batch, title, message, payload, collapse_key)
+                for batch in batches
+            ]
+            for future in futures:
+                result.merge(future.result())
+
+        if deactivate_invalid and result.invalid_tokens:
+            deactivated = FCMToken.objects.filter(
+                token__in=result.invalid_tokens, is_active=True
+            ).update(is_active=False)
+            logger.info(f"Deactivated {deactivated} invalid FCM tokens")
+
+        return result
+
+    def _send_batch(self, tokens: List[str], title: str, message: str, payload: Dict[str, str],
+                    collapse_key: str = None) -> PushResult:
+        result = PushResult()
+        try:
+            codes = self.backend.send_multicast(tokens, title, message, payload, collapse_key=collapse_key)
+        except Exception as e:
+            logger.error(f"Push multicast of {len(tokens)} tokens failed: {e}")
+            result.failed = len(tokens)
+            result.errors.append(str(e))
+            return result
+
+        for token, code in zip(tokens, codes):
+            if code is None:
+                result.sent += 1
+                result.accepted_tokens.append(token)
+                continue
+            result.failed += 1
+            if code in INVALID_TOKEN_ERRORS:
+                result.invalid_tokens.append(token)
+            else:
+                result.errors.append(f"Token {token[:20]}: {code}")
+        return result
+
@@ -0,0 +1,110 @@
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Dict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Notification, NotificationPurgeRun
+from .unread_counter import UnreadCounts
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationPurger:
+    """
+    Purga global de notificaciones antiguas
+
+    Borra las notificaciones con más de retention_days y las promociones ya
+    leídas con más de promotion_days. Cada lote es un DELETE por clave
+    primaria de a lo sumo batch_size filas en su propia transacción, con una
+    pausa entre lotes para no bloquear la tabla. Cada ejecución queda
+    registrada en NotificationPurgeRun.
+    """
+
+    def __init__(self, retention_days: int = None, promotion_days: int = None,
+                 batch_size: int = None, pause: float = None):
+        self.retention_days = retention_days or settings.NOTIFICATION_RETENTION_DAYS
+        self.promotion_days = promotion_days or settings.NOTIFICATION_READ_PROMOTION_RETENTION_DAYS
+        self.batch_size = batch_size or settings.NOTIFICATION_PURGE_BATCH_SIZE
+        self.pause = settings.NOTIFICATION_PURGE_PAUSE_SECONDS if pause is None else pause
+
+    def conditions(self, now=None) -> Dict[str, Q]:
+        now = now or timezone.now()
+        return {
+            'expired': Q(created_at__lt=now - timedelta(days=self.retention_days)),
+            'promotions': Q(
+                notification_type='promotion',
+                is_read=True,
+                created_at__lt=now - timedelta(days=self.promotion_days)
+            ),
+        }
+
+    def count(self) -> Dict[str, int]:
+        """Lo que borraría run(), sin borrar"""
+        conditions = self.conditions()
+        return {
+            'expired': Notification.objects.filter(conditions['expired']).count(),
+            # Sin contar dos veces las que también vencieron
+            'promotions': Notification.objects.filter(conditions['promotions']).exclude(conditions['expired']).count(),
+        }
+
+    def run(self, max_batches: int = None) -> NotificationPurgeRun:
+        now = timezone.now()
+        conditions = self.conditions(now)
+        purge_run = NotificationPurgeRun.objects.create(
+            expired_cutoff=now - timedelta(days=self.retention_days),
+            promotion_cutoff=now - timedelta(days=self.promotion_days)
+        )
+        started = time.monotonic()
+
+        try:
+            for kind in ('expired', 'promotions'):
+                while max_batches is None or purge_run.batches < max_batches:
+                    deleted, unread = self._delete_batch(conditions[kind])
+                    if not deleted:
+                        break
+                    purge_run.batches += 1
+                    setattr(purge_run, f'{kind}_deleted', getattr(purge_run, f'{kind}_deleted') + deleted)
+                    purge_run.unread_deleted += unread
+                    if deleted < self.batch_size:
+                        break
+                    if self.pause:
+                        time.sleep(self.pause)
+            purge_run.status = 'completed'
+        except Exception as e:
+            logger.error(f"Notification purge failed: {e}")
+            purge_run.status = 'failed'
+            purge_run.error_message = str(e)
+
+        purge_run.duration_ms = int((time.monotonic() - started) * 1000)
+        purge_run.finished_at = timezone.now()
+        purge_run.save()
+
+        logger.info(
+            f"Notification purge {purge_run.status}: {purge_run.expired_deleted} expired, "
+            f"{purge_run.promotions_deleted} read promotions in {purge_run.batches} batches "
+            f"({purge_run.duration_ms} ms)"
+        )
+        return purge_run
+
+    def _delete_batch(self, condition: Q):
+        """Un lote: leer las claves, borrar por id y descontar las no leídas"""
+        with transaction.atomic():
+            # Bloqueadas: una lectura concurrente no descuenta además la misma no leída
+            rows = list(
+                Notification.objects.select_for_update(skip_locked=True).filter(condition)
+                .order_by('created_at')
+                .values_list('id', 'user_id', 'is_read')[:self.batch_size]
+            )
+            if not rows:
+                return 0, 0
+
+            deleted, _ = Notification.objects.filter(id__in=[row[0] for row in rows]).delete()
+            unread = Counter(user_id for _, user_id, is_read in rows if not is_read)
+            UnreadCounts.decrement_many(unread)
+
+        return deleted, sum(unread.values())
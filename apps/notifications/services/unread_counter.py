@@ -0,0 +1,193 @@
+import logging
+from collections import Counter
+from typing import Dict, Iterable
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from ..models import Notification, UnreadCounter
+
+logger = logging.getLogger(__name__)
+
+# En memoria: Redis (compartida) o por proceso con TTL corto, ver settings
+UNREAD_CACHE_ALIAS = 'shared'
+
+
+class UnreadCounts:
+    """
+    Contador de notificaciones no leídas por usuario
+
+    La lectura es un cache.get y, si falta, la fila de UnreadCounter por clave
+    primaria. Crear, leer o borrar notificaciones ajusta la fila en la misma
+    transacción que el cambio y la caché después del commit (incr, que no
+    depende del orden). get() nunca escribe en la base de datos: las filas que
+    falten las crean los cambios o reconcile(), que además corrige cualquier
+    desvío recalculando con COUNT.
+    """
+
+    @staticmethod
+    def cache():
+        return caches[UNREAD_CACHE_ALIAS]
+
+    @staticmethod
+    def cache_key(user_id) -> str:
+        return f"notifications:unread:{user_id}"
+
+    @classmethod
+    def get(cls, user_id) -> int:
+        ttl = settings.NOTIFICATION_UNREAD_CACHE_TTL
+        if ttl:
+            count = cls.cache().get(cls.cache_key(user_id))
+            if count is not None:
+                return count
+
+        count = UnreadCounter.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+        if count is None:
+            # Usuario sin fila: el conteo real, sin crearla
+            count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+        if ttl:
+            cls.cache().add(cls.cache_key(user_id), count, ttl)
+        return count
+
+    @classmethod
+    def created(cls, notifications: Iterable[Notification]):
+        """Sumar las notificaciones recién creadas (create o bulk_create)"""
+        cls.increment(Counter(notification.user_id for notification in notifications if not notification.is_read))
+
+    @classmethod
+    def increment(cls, counts: Dict[object, int]):
+        """
+        Sumar counts[user_id] a cada usuario; un UPDATE por cada valor distinto
+
+        Se llama en la transacción que creó las notificaciones, después de crearlas.
+        """
+        cls._apply({user_id: amount for user_id, amount in counts.items() if amount})
+
+    @classmethod
+    def decrement(cls, user_id, amount: int = 1):
+        cls.decrement_many({user_id: amount})
+
+    @classmethod
+    def decrement_many(cls, counts: Dict[object, int]):
+        """
+        Restar counts[user_id] a cada usuario sin bajar de cero; un UPDATE por cada valor distinto
+
+        Se llama en la transacción que leyó o borró las notificaciones, después del cambio.
+        """
+        cls._apply({user_id: -amount for user_id, amount in counts.items() if amount})
+
+    @classmethod
+    def _apply(cls, deltas: Dict[object, int]):
+        if not deltas:
+            return
+
+        cls._create_missing(deltas)
+
+        by_delta = {}
+        for user_id, delta in deltas.items():
+            by_delta.setdefault(delta, []).append(user_id)
+
+        for delta, user_ids in by_delta.items():
+            UnreadCounter.objects.filter(user_id__in=user_ids).update(
+                unread_count=Greatest(F('unread_count') + delta, 0)
+            )
+
+        transaction.on_commit(lambda: cls._adjust_cache(deltas))
+
+    @classmethod
+    def _adjust_cache(cls, deltas: Dict[object, int]):
+        """Aplicar el cambio confirmado a las copias en caché"""
+        if not settings.NOTIFICATION_UNREAD_CACHE_TTL:
+            return
+
+        cache = cls.cache()
+        for user_id, delta in deltas.items():
+            key = cls.cache_key(user_id)
+            try:
+                if cache.incr(key, delta) < 0:
+                    # La fila no baja de cero: se vuelve a leer
+                    cache.delete(key)
+            except ValueError:
+                pass  # No estaba en caché: se lee de la fila en la próxima consulta
+
+    @staticmethod
+    def _create_missing(deltas: Dict[object, int]):
+        """
+        Crear las filas que falten con COUNT menos el cambio de esta transacción
+
+        El COUNT ya ve el cambio propio (deltas) y el UPDATE siguiente lo vuelve
+        a aplicar; el de otras transacciones sin confirmar no se ve y lo suma
+        cada una sobre la fila. ignore_conflicts: si otra transacción la creó
+        primero, gana la suya.
+        """
+        existing = set(UnreadCounter.objects.filter(user_id__in=deltas).values_list('user_id', flat=True))
+        missing = [user_id for user_id in deltas if user_id not in existing]
+        if not missing:
+            return
+
+        actual = dict(
+            Notification.objects.filter(user_id__in=missing, is_read=False)
+            .values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+        )
+        UnreadCounter.objects.bulk_create([
+            UnreadCounter(user_id=user_id, unread_count=max(actual.get(user_id, 0) - deltas[user_id], 0))
+            for user_id in missing
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def reconcile(cls, chunk_size: int = 1000) -> Dict[str, int]:
+        """
+        Recalcular los contadores con COUNT y corregir los que se desviaron
+
+        Recorre los usuarios por bloques de id: una consulta agrupada de
+        conteos y una de contadores por bloque. Crea las filas que falten y
+        descarta de la caché las que corrige. Una fila que cambió mientras
+        tanto no se pisa; se revisa en la próxima pasada.
+        """
+        from apps.users.models import User
+
+        totals = {'checked': 0, 'fixed': 0, 'created': 0}
+        last_id = None
+
+        while True:
+            users = User.objects.order_by('id')
+            if last_id is not None:
+                users = users.filter(id__gt=last_id)
+            user_ids = list(users.values_list('id', flat=True)[:chunk_size])
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            actual = dict(
+                Notification.objects.filter(user_id__in=user_ids, is_read=False)
+                .values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+            )
+            counters = dict(UnreadCounter.objects.filter(user_id__in=user_ids).values_list('user_id', 'unread_count'))
+
+            missing = []
+            fixed = []
+            for user_id in user_ids:
+                count = actual.get(user_id, 0)
+                stored = counters.get(user_id)
+                if stored is None:
+                    if count:
+                        missing.append(UnreadCounter(user_id=user_id, unread_count=count))
+                elif stored != count:
+                    if UnreadCounter.objects.filter(user_id=user_id, unread_count=stored).update(unread_count=count):
+                        fixed.append(user_id)
+
+            UnreadCounter.objects.bulk_create(missing, ignore_conflicts=True)
+            if fixed:
+                cls.cache().delete_many([cls.cache_key(user_id) for user_id in fixed])
+
+            totals['fixed'] += len(fixed)
+
+            totals['checked'] += len(user_ids)
+            totals['created'] += len(missing)
+
+        if totals['fixed']:
+            logger.warning(f"Unread counters drifted and were fixed: {totals}")
+        return totals
@@ -1,3 +1,462 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.businesses.models import Business
+from apps.orders.models import Order
+from apps.outbox.models import OutboxEvent
+from apps.users.models import User, Address
+from .models import CoalescedNotification, Notification, FCMToken, UnreadCounter
+from .services import push_transport
+from .services.coalescer import NotificationCoalescer, FLUSH_EVENT
+from .services.feed import MAX_FEED_LIMIT
+from .services.notification_service import NotificationService
+from .services.notification_stats import NotificationStats
+from .services.order_notifier import OrderNotifier
+from .services.push_transport import FakePushBackend, PushTransport, FCM_MULTICAST_LIMIT
+from .services.retention import NotificationPurger
+from .services.unread_counter import UnreadCounts
+
+
+def create_user(index, user_type='client'):
+    return User.objects.create_user(
+        username=f'usuario-{index}', password=None, phone=f'6100000{index}', user_type=user_type
+    )
+
+
+def create_order(status='pending'):
+    customer = create_user(1)
+    driver = create_user(2, 'driver')
+    owner = create_user(3, 'business')
+    business = Business.objects.create(
+        owner=owner, name='Negocio', description='-', service_type='food', phone='61000003',
+        address='-', latitude=Decimal('9.0'), longitude=Decimal('-79.5')
+    )
+    address = Address.objects.create(
+        user=customer, title='Casa', address_line='-', latitude=Decimal('9.05'), longitude=Decimal('-79.45')
+    )
+    return Order.objects.create(
+        customer=customer, business=business, driver=driver, order_type='delivery', status=status,
+        delivery_address=address, subtotal=Decimal('10'), total=Decimal('12'), delivery_fee=Decimal('2')
+    )
+
+
+class RecordingPushBackend(FakePushBackend):
+    """Guarda (tokens, mensaje) de cada multicast"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send_multicast(self, tokens, title, message, data, collapse_key=None):
+        self.sent.append((list(tokens), message))
+        return super().send_multicast(tokens, title, message, data, collapse_key=collapse_key)
+
+
+class FailingPushBackend(FakePushBackend):
+    def send_multicast(self, tokens, title, message, data, collapse_key=None):
+        raise Exception('FCM unavailable')
+
+
+@override_settings(PUSH_BACKEND='fake')
+class BulkPushTests(TestCase):
+    def setUp(self):
+        self.accepted = create_user(1)
+        self.rejected = create_user(2)
+        self.without_tokens = create_user(3)
+        FCMToken.objects.create(user=self.accepted, token='token-1')
+        FCMToken.objects.create(user=self.accepted, token='invalid-1')
+        FCMToken.objects.create(user=self.rejected, token='invalid-2')
+
+    def send(self, backend):
+        with mock.patch.object(push_transport, '_backend', backend):
+            return NotificationService().send_bulk_notification(
+                [self.accepted.id, self.rejected.id, self.without_tokens.id], 'Aviso', 'Mensaje'
+            )
+
+    def sent_users(self):
+        return set(Notification.objects.filter(is_sent=True).values_list('user_id', flat=True))
+
+    def test_only_recipients_with_an_accepted_token_are_marked_sent(self):
+        results = self.send(FakePushBackend())
+
+        self.assertEqual((results['success_count'], results['push_sent_count']), (3, 1))
+        self.assertEqual(self.sent_users(), {self.accepted.id})
+        self.assertFalse(FCMToken.objects.filter(token__startswith='invalid', is_active=True).exists())
+
+    def test_failed_multicast_marks_nothing_sent(self):
+        results = self.send(FailingPushBackend())
+
+        self.assertEqual(results['push_sent_count'], 0)
+        self.assertEqual(results['errors'], ['FCM unavailable'])
+        self.assertEqual(self.sent_users(), set())
+
+
+class PushTransportTests(TestCase):
+    def setUp(self):
+        self.user = create_user(1)
+        self.tokens = ['token-1', 'invalid-1', 'token-2', 'token-3', 'invalid-2']
+        for token in self.tokens:
+            FCMToken.objects.create(user=self.user, token=token)
+        self.backend = RecordingPushBackend()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_tokens_are_sent_in_multicast_chunks(self):
+        transport = PushTransport(backend=self.backend, batch_size=2, executor=self.executor)
+
+        result = transport.send(self.tokens, 'Aviso', 'Mensaje', {'order_id': 1})
+
+        self.assertEqual(sorted(len(tokens) for tokens, _ in self.backend.sent), [1, 2, 2])
+        self.assertEqual(sorted(token for tokens, _ in self.backend.sent for token in tokens), sorted(self.tokens))
+        self.assertEqual((result.sent, result.failed), (3, 2))
+        self.assertEqual(sorted(result.accepted_tokens), ['token-1', 'token-2', 'token-3'])
+        self.assertEqual(
+            set(FCMToken.objects.filter(is_active=False).values_list('token', flat=True)), {'invalid-1', 'invalid-2'}
+        )
+
+    def test_chunk_size_is_capped_by_the_backend(self):
+        self.assertEqual(PushTransport(backend=self.backend, batch_size=10000).batch_size, FCM_MULTICAST_LIMIT)
+
+
+@override_settings(NOTIFICATION_UNREAD_CACHE_TTL=60)
+class UnreadCountTests(TestCase):
+    def setUp(self):
+        self.user = create_user(1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        UnreadCounts.cache().clear()
+
+    def notify(self, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                NotificationService().send_notification(self.user, 'Aviso', 'Mensaje')
+
+    def post(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url)
+
+    def unread_count(self):
+        response = self.client.get('/api/notifications/unread_count/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['unread_count']
+
+    def assertCount(self, expected):
+        self.assertEqual(Notification.objects.filter(user=self.user, is_read=False).count(), expected)
+        self.assertEqual(self.unread_count(), expected)
+
+    def test_counter_follows_create_read_and_purge(self):
+        self.notify(3)
+        self.assertCount(3)
+
+        notification = Notification.objects.filter(user=self.user).first()
+        self.post(f'/api/notifications/{notification.id}/mark_as_read/')
+        self.post(f'/api/notifications/{notification.id}/mark_as_read/')
+        self.assertCount(2)
+
+        Notification.objects.filter(user=self.user, is_read=False).update(created_at=timezone.now() - timedelta(days=400))
+        self.notify()
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationPurger(pause=0).run()
+        self.assertCount(1)
+
+        self.post('/api/notifications/mark_all_read/')
+        self.assertCount(0)
+
+    def test_cached_count_is_written_through(self):
+        self.notify(2)
+        self.assertEqual(UnreadCounts.get(self.user.id), 2)
+
+        self.notify()
+        with self.assertNumQueries(0):
+            self.assertEqual(UnreadCounts.get(self.user.id), 3)
+
+        self.post('/api/notifications/mark_all_read/')
+        with self.assertNumQueries(0):
+            self.assertEqual(UnreadCounts.get(self.user.id), 0)
+
+    def test_first_notification_counts_earlier_unread_rows(self):
+        # Notificaciones anteriores al contador (sin fila de UnreadCounter)
+        Notification.objects.bulk_create([
+            Notification(user=self.user, title='Aviso', message='Mensaje', notification_type='promotion')
+            for _ in range(2)
+        ])
+
+        self.notify()
+
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread_count, 3)
+        self.assertCount(3)
+
+    def test_read_without_a_counter_row_counts_once(self):
+        Notification.objects.bulk_create([
+            Notification(user=self.user, title='Aviso', message='Mensaje', notification_type='promotion')
+            for _ in range(2)
+        ])
+
+        self.post('/api/notifications/mark_all_read/')
+
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread_count, 0)
+        self.assertCount(0)
+
+    def test_read_without_a_row_does_not_write(self):
+        Notification.objects.create(user=self.user, title='Aviso', message='Mensaje', notification_type='promotion')
+
+        self.assertEqual(UnreadCounts.get(self.user.id), 1)
+        self.assertFalse(UnreadCounter.objects.filter(user=self.user).exists())
+
+        self.assertEqual(UnreadCounts.reconcile()['created'], 1)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread_count, 1)
+
+    def test_reconcile_fixes_a_drifted_row(self):
+        self.notify(2)
+        self.assertEqual(UnreadCounts.get(self.user.id), 2)
+        UnreadCounter.objects.filter(user=self.user).update(unread_count=7)
+        UnreadCounts.cache().set(UnreadCounts.cache_key(self.user.id), 7)
+
+        self.assertEqual(UnreadCounts.reconcile()['fixed'], 1)
+        self.assertCount(2)
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS=90, NOTIFICATION_READ_PROMOTION_RETENTION_DAYS=14,
+                   NOTIFICATION_UNREAD_CACHE_TTL=60)
+class NotificationPurgeTests(TestCase):
+    def setUp(self):
+        self.user = create_user(1)
+        UnreadCounts.cache().clear()
+        self.kept = set()
+        for days, notification_type, is_read, keep in [
+            (400, 'payment', False, False), (400, 'payment', False, False), (400, 'promotion', False, False),
+            (400, 'payment', True, False), (400, 'promotion', True, False),
+            (30, 'promotion', True, False), (30, 'promotion', True, False),
+            (30, 'promotion', False, True), (1, 'promotion', True, True), (1, 'payment', False, True),
+        ]:
+            notification = Notification.objects.create(
+                user=self.user, title='Aviso', message='-', notification_type=notification_type, is_read=is_read
+            )
+            Notification.objects.filter(id=notification.id).update(created_at=timezone.now() - timedelta(days=days))
+            if keep:
+                self.kept.add(notification.id)
+        UnreadCounts.reconcile()
+        self.assertEqual(UnreadCounts.get(self.user.id), 5)
+
+    def test_purge_keeps_unread_and_recent_rows_and_the_counter(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_run = NotificationPurger(batch_size=2, pause=0).run()
+
+        self.assertEqual(set(Notification.objects.values_list('id', flat=True)), self.kept)
+        self.assertEqual(
+            (purge_run.status, purge_run.expired_deleted, purge_run.promotions_deleted, purge_run.unread_deleted),
+            ('completed', 5, 2, 3)
+        )
+        # Lotes de a lo sumo 2 filas: 2 + 2 + 1 vencidas y 2 promociones
+        self.assertEqual(purge_run.batches, 4)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread_count, 2)
+        self.assertEqual(UnreadCounts.get(self.user.id), 2)
+
+    def test_max_batches_stops_the_run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_run = NotificationPurger(batch_size=2, pause=0).run(max_batches=1)
+
+        self.assertEqual((purge_run.batches, purge_run.expired_deleted), (1, 2))
+        self.assertEqual(Notification.objects.count(), 8)
+        self.assertEqual(UnreadCounts.get(self.user.id),
+                         Notification.objects.filter(user=self.user, is_read=False).count())
+
+
+@override_settings(PUSH_BACKEND='fake', NOTIFICATION_COALESCE_SECONDS=20, OUTBOX_INLINE_DISPATCH=False)
+class CoalescerTests(TestCase):
+    def setUp(self):
+        self.order = create_order()
+        for user in (self.order.customer, self.order.driver, self.order.business.owner):
+            FCMToken.objects.create(user=user, token=f'token-{user.username}')
+        self.backend = RecordingPushBackend()
+        patcher = mock.patch.object(push_transport, '_backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def notify(self, *statuses):
+        OrderNotifier().notify([
+            {'order_id': str(self.order.id), 'status': status} for status in statuses
+        ])
+
+    def flush(self):
+        CoalescedNotification.objects.update(flush_after=timezone.now() - timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            return NotificationCoalescer().flush_due()
+
+    def test_burst_for_one_order_is_one_row_and_one_push_per_user(self):
+        for status in ('confirmed', 'preparing', 'on_the_way'):
+            self.notify(status)
+
+        customer = self.order.customer
+        self.assertEqual(CoalescedNotification.objects.filter(user=customer).count(), 1)
+        self.flush()
+
+        pushes = [message for tokens, message in self.backend.sent if 'token-usuario-1' in tokens]
+        self.assertEqual(pushes, [f'La orden #{self.order.order_number} va en camino'])
+        self.assertEqual(Notification.objects.filter(user=customer).count(), 1)
+        self.assertFalse(CoalescedNotification.objects.exists())
+
+    def test_same_update_for_several_recipients_is_one_multicast(self):
+        self.notify('cancelled')
+
+        self.assertEqual(self.flush()['push_sent'], 3)
+
+        self.assertEqual(len(self.backend.sent), 1)
+        self.assertEqual(len(self.backend.sent[0][0]), 3)
+        self.assertEqual(Notification.objects.filter(is_sent=True).count(), 3)
+
+    def test_delivery_waits_for_the_commit(self):
+        self.notify('confirmed')
+        CoalescedNotification.objects.update(flush_after=timezone.now() - timedelta(seconds=1))
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertEqual(NotificationCoalescer().flush_due()['flushed'], 2)
+
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(self.backend.sent, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_failed_delivery_is_requeued(self):
+        self.notify('confirmed')
+
+        with mock.patch.object(NotificationCoalescer, '_deliver', side_effect=Exception('db down')):
+            self.flush()
+
+        self.assertEqual(CoalescedNotification.objects.count(), 2)
+        self.assertTrue(OutboxEvent.objects.filter(event_type=FLUSH_EVENT, status='pending').exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+class NotificationFeedTests(TestCase):
+    def setUp(self):
+        self.user = create_user(1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now()
+
+    def create_notifications(self, count, offset=0, notification_type='promotion'):
+        notifications = Notification.objects.bulk_create([
+            Notification(user=self.user, title=f'Aviso {offset + index}', message='-',
+                         notification_type=notification_type)
+            for index in range(count)
+        ])
+        for index, notification in enumerate(notifications):
+            Notification.objects.filter(id=notification.id).update(
+                created_at=self.now - timedelta(hours=1) + timedelta(seconds=offset + index)
+            )
+        return notifications
+
+    def get(self, url, **params):
+        return self.client.get(url, params)
+
+    def titles(self, response):
+        return [item['title'] for item in response.data['results']]
+
+    def test_cursor_pages_from_newest_to_oldest(self):
+        self.create_notifications(5)
+
+        first = self.get('/api/notifications/feed/', limit=2)
+        second = self.get('/api/notifications/feed/', limit=2, cursor=first.data['next_cursor'])
+        third = self.get('/api/notifications/feed/', limit=2, cursor=second.data['next_cursor'])
+
+        self.assertEqual(self.titles(first) + self.titles(second) + self.titles(third),
+                         [f'Aviso {index}' for index in range(4, -1, -1)])
+        self.assertEqual((first.data['has_more'], third.data['has_more']), (True, False))
+        self.assertIsNone(third.data['next_cursor'])
+
+    def test_since_returns_only_newer_rows(self):
+        self.create_notifications(3)
+        latest = self.get('/api/notifications/feed/').data['latest_cursor']
+        self.create_notifications(2, offset=10)
+
+        response = self.get('/api/notifications/feed/', since=latest)
+
+        self.assertEqual(self.titles(response), ['Aviso 10', 'Aviso 11'])
+        self.assertFalse(response.data['has_more'])
+
+    def test_limit_is_capped(self):
+        self.create_notifications(MAX_FEED_LIMIT + 1)
+
+        response = self.get('/api/notifications/feed/', limit=1000)
+
+        self.assertEqual(len(response.data['results']), MAX_FEED_LIMIT)
+        self.assertTrue(response.data['has_more'])
+
+    def test_bad_cursor_is_rejected(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'since': 'bm9wZQ'}, {'limit': 'many'}):
+            response = self.get('/api/notifications/feed/', **params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['error'], 'Parámetros inválidos')
+
+    def test_list_and_by_type_are_paginated(self):
+        self.create_notifications(3)
+        self.create_notifications(3, offset=10, notification_type='payment')
+
+        listed = self.get('/api/notifications/', limit=2)
+        by_type = self.get('/api/notifications/by_type/', type='payment', limit=2)
+        rest = self.client.get(by_type.data['next'])
+
+        self.assertEqual(self.titles(listed), ['Aviso 12', 'Aviso 11'])
+        self.assertIsNotNone(listed.data['next'])
+        self.assertEqual(self.titles(by_type) + self.titles(rest), ['Aviso 12', 'Aviso 11', 'Aviso 10'])
+        self.assertIsNone(rest.data['next'])
+
+
+@override_settings(NOTIFICATION_STATS_CACHE_TTL=60)
+class NotificationStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [create_user(index) for index in range(1, 4)]
+        FCMToken.objects.create(user=self.users[0], token='token-1', platform='android')
+        FCMToken.objects.create(user=self.users[0], token='token-2', platform='ios')
+        FCMToken.objects.create(user=self.users[1], token='token-3', platform='android', is_active=False)
+        for index, (notification_type, is_sent) in enumerate([
+            ('promotion', True), ('promotion', False), ('payment', True), ('order_update', True),
+        ]):
+            Notification.objects.create(user=self.users[index % 3], title='Aviso', message='-',
+                                        notification_type=notification_type, is_sent=is_sent)
+        self.client = APIClient()
+
+    def stats(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get('/api/notifications/tokens/stats/')
+
+    def test_totals_match_the_previous_counts_in_three_queries(self):
+        with self.assertNumQueries(3):
+            stats = NotificationStats().compute()
+
+        self.assertEqual(stats['total_users'], User.objects.count())
+        self.assertEqual(stats['users_with_tokens'],
+                         FCMToken.objects.filter(is_active=True).values('user').distinct().count())
+        self.assertEqual(stats['total_active_tokens'], FCMToken.objects.filter(is_active=True).count())
+        self.assertEqual(stats['total_notifications_sent'], Notification.objects.count())
+        self.assertEqual(
+            {key: count for key, count in stats['notifications_by_type'].items() if count},
+            {row['notification_type']: row['count']
+             for row in Notification.objects.values('notification_type').annotate(count=Count('notification_type'))}
+        )
+        self.assertEqual((stats['push']['sent'], stats['push']['not_sent']), (3, 1))
+        self.assertEqual(stats['tokens_by_platform']['android'], 1)
+
+    def test_cached_stats_are_only_served_to_admins(self):
+        admin = User.objects.create_user(username='admin', password=None, phone='61000009', user_type='admin')
+        other_admin = User.objects.create_user(username='admin-2', password=None, phone='61000010', user_type='admin')
+        owner = create_user(4, 'business')
+
+        self.assertEqual(self.stats(admin).data['total_notifications_sent'], 4)
+        Notification.objects.create(user=self.users[0], title='Aviso', message='-', notification_type='promotion')
+
+        # Las estadísticas son globales: otro administrador recibe la misma copia
+        with self.assertNumQueries(0):
+            self.assertEqual(self.stats(other_admin).data['total_notifications_sent'], 4)
+        self.assertEqual(self.stats(owner).status_code, 403)
+        self.assertEqual(self.stats(self.users[0]).status_code, 403)
@@ -1,27 +1,40 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.utils import timezone
 import logging
 
 from .models import Notification, FCMToken
 from .serializers import NotificationSerializer, FCMTokenSerializer
+from .services.feed import NotificationFeed, DEFAULT_FEED_LIMIT, MAX_FEED_LIMIT
 from .services.notification_service import NotificationService
+from .services.notification_stats import NotificationStats
+from .services.unread_counter import UnreadCounts
 
 logger = logging.getLogger(__name__)
 
+class NotificationCursorPagination(CursorPagination):
+    """Páginas por cursor sobre el índice (user, -created_at, -id), sin OFFSET ni COUNT"""
+    ordering = ('-created_at', '-id')
+    page_size = DEFAULT_FEED_LIMIT
+    page_size_query_param = 'limit'
+    max_page_size = MAX_FEED_LIMIT
+
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['notification_type', 'is_read']
+    pagination_class = NotificationCursorPagination
     
     def get_queryset(self):
         return Notification.objects.filter(
             user=self.request.user
-        ).order_by('-created_at')
+        ).order_by('-created_at', '-id')
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
@@ -33,9 +46,16 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
                 'error': 'No puedes marcar esta notificación'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        notification.is_read = True
-        notification.read_at = timezone.now()
-        notification.save()
+        if not notification.is_read:
+            notification.is_read = True
+            notification.read_at = timezone.now()
+            # Solo descuenta quien efectivamente la marcó
+            with transaction.atomic():
+                marked = Notification.objects.filter(id=notification.id, is_read=False).update(
+                    is_read=True,
+                    read_at=notification.read_at
+                )
+                UnreadCounts.decrement(request.user.id, marked)
         
         serializer = NotificationSerializer(notification)
         return Response(serializer.data)
@@ -43,13 +63,15 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Marcar todas las notificaciones como leídas"""
-        updated = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).update(
-            is_read=True,
-            read_at=timezone.now()
-        )
+        with transaction.atomic():
+            updated = Notification.objects.filter(
+                user=request.user,
+                is_read=False
+            ).update(
+                is_read=True,
+                read_at=timezone.now()
+            )
+            UnreadCounts.decrement(request.user.id, updated)
         
         return Response({
             'message': f'{updated} notificaciones marcadas como leídas'
@@ -58,12 +80,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Obtener cantidad de notificaciones no leídas"""
-        count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
-        
-        return Response({'unread_count': count})
+        return Response({'unread_count': UnreadCounts.get(request.user.id)})
     
     @action(detail=False, methods=['delete'])
     def clear_old(self, request):
@@ -71,15 +88,50 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         from datetime import timedelta
         
         old_date = timezone.now() - timedelta(days=30)
-        deleted_count, _ = Notification.objects.filter(
+        old_notifications = Notification.objects.filter(
             user=request.user,
             created_at__lt=old_date
-        ).delete()
+        )
+        with transaction.atomic():
+            # Las no leídas por separado para descontarlas del contador
+            unread_deleted, _ = old_notifications.filter(is_read=False).delete()
+            read_deleted, _ = old_notifications.filter(is_read=True).delete()
+            UnreadCounts.decrement(request.user.id, unread_deleted)
+        deleted_count = unread_deleted + read_deleted
         
         return Response({
             'message': f'{deleted_count} notificaciones antiguas eliminadas'
         })
     
+    @action(detail=False, methods=['get'])
+    def feed(self, request):
+        """
+        Feed paginado por cursor
+
+        Parámetros: cursor (página siguiente), since (solo lo nuevo desde un
+        latest_cursor), limit (máx. 100), type y unread=true.
+        """
+        params = request.query_params
+        try:
+            limit = NotificationFeed.parse_limit(params.get('limit'))
+            feed = NotificationFeed(
+                request.user,
+                notification_type=params.get('type'),
+                unread_only=params.get('unread') in ('1', 'true')
+            )
+            if params.get('since'):
+                page = feed.since(params['since'], limit)
+            else:
+                page = feed.page(params.get('cursor'), limit)
+        except ValueError as e:
+            return Response({
+                'error': 'Parámetros inválidos',
+                'details': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = NotificationSerializer(page.pop('items'), many=True, context={'now': timezone.now()})
+        return Response({'results': serializer.data, **page})
+    
     @action(detail=False, methods=['get'])
     def by_type(self, request):
         """Obtener notificaciones agrupadas por tipo"""
@@ -94,8 +146,9 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
             notification_type=notification_type
         )
         
-        serializer = NotificationSerializer(notifications, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(notifications)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class FCMTokenViewSet(viewsets.ModelViewSet):
     serializer_class = FCMTokenSerializer
@@ -248,23 +301,6 @@ class FCMTokenViewSet(viewsets.ModelViewSet):
                 'error': 'Solo administradores pueden ver estadísticas'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        from apps.users.models import User
-        
-        stats = {
-            'total_users': User.objects.count(),
-            'users_with_tokens': FCMToken.objects.filter(is_active=True).values('user').distinct().count(),
-            'total_active_tokens': FCMToken.objects.filter(is_active=True).count(),
-            'total_notifications_sent': Notification.objects.count(),
-            'notifications_by_type': {},
-            'tokens_by_platform': {}
-        }
-        
-        # Notificaciones por tipo
-        from django.db.models import Count
-        notification_types = Notification.objects.values('notification_type').annotate(
-            count=Count('notification_type')
-        )
-        for item in notification_types:
-            stats['notifications_by_type'][item['notification_type']] = item['count']
+        stats = NotificationStats().get()
         
         return Response(stats)
\ No newline at end of file
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ('confirmed', 'preparing', 'ready', 'assigned', 'picked_up', 'on_the_way'))), fields=['customer', 'status'], name='order_customer_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ('confirmed', 'preparing', 'ready', 'assigned', 'picked_up', 'on_the_way'))), fields=['driver', 'status'], name='order_driver_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ('confirmed', 'preparing', 'ready', 'assigned', 'picked_up', 'on_the_way'))), fields=['business', 'status'], name='order_business_active_idx'),
+        ),
+    ]
@@ -6,6 +6,9 @@ from apps.users.models import User, Address
 from apps.businesses.models import Business, Product
 import uuid
 
+# Estados en los que una orden sigue en curso
+ACTIVE_ORDER_STATUSES = ('confirmed', 'preparing', 'ready', 'assigned', 'picked_up', 'on_the_way')
+
 class Order(models.Model):
     ORDER_TYPES = (
         ('delivery', 'Delivery'),
@@ -52,6 +55,23 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # Índices parciales: solo cubren órdenes en curso
+        indexes = [
+            models.Index(
+                fields=['customer', 'status'], name='order_customer_active_idx',
+                condition=models.Q(status__in=ACTIVE_ORDER_STATUSES)
+            ),
+            models.Index(
+                fields=['driver', 'status'], name='order_driver_active_idx',
+                condition=models.Q(status__in=ACTIVE_ORDER_STATUSES)
+            ),
+            models.Index(
+                fields=['business', 'status'], name='order_business_active_idx',
+                condition=models.Q(status__in=ACTIVE_ORDER_STATUSES)
+            ),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.order_number:
             self.order_number = self.generate_order_number()
@@ -0,0 +1,9 @@
+from apps.notifications.services.order_notifier import OrderNotifier
+from apps.outbox.services.registry import outbox_handler
+from .services.order_events import ORDER_STATUS_CHANGED
+
+
+@outbox_handler(ORDER_STATUS_CHANGED, batch=True)
+def notify_order_status_changes(events):
+    """Todas las transiciones del lote del dispatcher con una sola consulta de destinatarios"""
+    OrderNotifier().notify([event.payload for event in events])
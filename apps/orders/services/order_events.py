@@ -0,0 +1,28 @@
+from apps.outbox.models import OutboxEvent
+from apps.outbox.services.publisher import build_event
+
+ORDER_STATUS_CHANGED = 'order.status_changed'
+
+# action_type de la orden que sigue pendiente después de expirar su pago
+PAYMENT_RETRY_ACTION = 'payment_retry'
+
+
+def order_status_event(order_id, status: str, previous_status: str = None, changed_by_id=None,
+                       action_type: str = None) -> OutboxEvent:
+    """
+    Evento 'order.status_changed' para publish_many
+
+    Se publica en la misma transacción que el cambio de estado; las
+    notificaciones las arma en lote el handler de orders/outbox_handlers.py.
+    changed_by_id es quien hizo el cambio, que no se notifica a sí mismo.
+    action_type elige un aviso distinto al del estado (ver OrderNotifier).
+    """
+    payload = {
+        'order_id': str(order_id),
+        'status': status,
+        'previous_status': previous_status,
+        'changed_by_id': str(changed_by_id) if changed_by_id else None,
+    }
+    if action_type:
+        payload['action_type'] = action_type
+    return build_event(ORDER_STATUS_CHANGED, 'order', order_id, payload)
@@ -1,3 +1,84 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from apps.businesses.models import Business
+from apps.notifications.models import FCMToken, Notification
+from apps.notifications.services import push_transport
+from apps.notifications.services.order_notifier import OrderNotifier
+from apps.notifications.services.push_transport import FakePushBackend
+from apps.outbox.models import OutboxEvent
+from apps.outbox.services.dispatcher import OutboxDispatcher
+from apps.outbox.services.publisher import publish_many
+from apps.users.models import User, Address
+from .models import Order
+from .services.order_events import order_status_event
+
+
+class RecordingPushBackend(FakePushBackend):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send_multicast(self, tokens, title, message, data, collapse_key=None):
+        self.sent.append(sorted(tokens))
+        return super().send_multicast(tokens, title, message, data, collapse_key=collapse_key)
+
+
+@override_settings(PUSH_BACKEND='fake', NOTIFICATION_COALESCE_SECONDS=0, OUTBOX_INLINE_DISPATCH=False)
+class OrderStatusEventTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='cliente', password=None, phone='60000001', user_type='client')
+        self.driver = User.objects.create_user(username='conductor', password=None, phone='60000002', user_type='driver')
+        self.owner = User.objects.create_user(username='negocio', password=None, phone='60000003', user_type='business')
+        self.business = Business.objects.create(
+            owner=self.owner, name='Negocio', description='-', service_type='food', phone='60000003',
+            address='-', latitude=Decimal('9.0'), longitude=Decimal('-79.5')
+        )
+        self.address = Address.objects.create(
+            user=self.customer, title='Casa', address_line='-', latitude=Decimal('9.05'), longitude=Decimal('-79.45')
+        )
+        for user in (self.customer, self.driver, self.owner):
+            FCMToken.objects.create(user=user, token=f'token-{user.username}')
+
+        self.backend = RecordingPushBackend()
+        patcher = mock.patch.object(push_transport, '_backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_order(self, status='on_the_way'):
+        return Order.objects.create(
+            customer=self.customer, business=self.business, driver=self.driver, order_type='delivery',
+            status=status, delivery_address=self.address,
+            subtotal=Decimal('10'), total=Decimal('12'), delivery_fee=Decimal('2')
+        )
+
+    def publish(self, *events):
+        with self.captureOnCommitCallbacks(execute=True):
+            publish_many(list(events))
+
+    def test_status_change_notifies_customer_business_and_driver_in_one_batch(self):
+        order = self.create_order()
+        self.publish(order_status_event(order.id, 'delivered', 'on_the_way'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(OutboxDispatcher().drain()['done'], 1)
+
+        self.assertEqual(
+            set(Notification.objects.filter(data__order_id=str(order.id)).values_list('user_id', flat=True)),
+            {self.customer.id, self.driver.id, self.owner.id}
+        )
+        self.assertEqual(self.backend.sent, [['token-cliente', 'token-conductor', 'token-negocio']])
+        self.assertEqual(Notification.objects.filter(is_sent=True).count(), 3)
+        self.assertFalse(OutboxEvent.objects.exclude(status='done').exists())
+
+    def test_events_of_one_batch_reach_the_notifier_together(self):
+        orders = [self.create_order(), self.create_order()]
+        self.publish(*[order_status_event(order.id, 'delivered', 'on_the_way') for order in orders])
+
+        with mock.patch.object(OrderNotifier, 'notify', autospec=True, return_value=0) as notify:
+            self.assertEqual(OutboxDispatcher().drain()['done'], 2)
+
+        notify.assert_called_once()
+        self.assertEqual({update['order_id'] for update in notify.call_args.args[1]},
+                         {str(order.id) for order in orders})
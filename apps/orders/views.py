@@ -2,12 +2,17 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Order, Rating
 from .serializers import (
     OrderListSerializer, OrderDetailSerializer, OrderCreateSerializer, RatingSerializer
 )
-from apps.payments.services.tilopay_service import TilopayService
+from .services.order_events import order_status_event
+from apps.outbox.services.publisher import publish_many
+from apps.payments.models import Payment
+from apps.payments.services.attempt_recorder import client_info
+from apps.payments.services.checkout import CheckoutService
 from decimal import Decimal
 import logging
 
@@ -54,7 +59,9 @@ class OrderViewSet(viewsets.ModelViewSet):
                 # Procesar pago si no es efectivo
                 payment_method = serializer.validated_data['payment_method']
                 if payment_method != 'cash':
-                    payment_response = self._process_payment(order, payment_method, serializer.validated_data)
+                    payment_response = self._process_payment(
+                        order, payment_method, serializer.validated_data, client=client_info(request)
+                    )
                     
                     response_serializer = OrderDetailSerializer(order)
                     response_data = response_serializer.data
@@ -63,8 +70,10 @@ class OrderViewSet(viewsets.ModelViewSet):
                     return Response(response_data, status=status.HTTP_201_CREATED)
                 
                 # Para efectivo, confirmar orden directamente
-                order.status = 'confirmed'
-                order.save()
+                with transaction.atomic():
+                    order.status = 'confirmed'
+                    order.save()
+                    publish_many([order_status_event(order.id, 'confirmed', 'pending', request.user.id)])
                 
                 response_serializer = OrderDetailSerializer(order)
                 return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -122,43 +131,27 @@ class OrderViewSet(viewsets.ModelViewSet):
         for item_data in items_data:
             OrderItem.objects.create(
                 order=order,
-                product_id=item_data['product'],
+                product=item_data['product'],  # El serializer ya resuelve el Product
                 quantity=item_data['quantity'],
                 unit_price=item_data['unit_price']
             )
     
-    def _process_payment(self, order, payment_method, validated_data):
-        """Procesar pago con Tilopay"""
-        tilopay_service = TilopayService()
+    def _process_payment(self, order, payment_method, validated_data, client=None):
+        """Procesar pago con Tilopay (en segundo plano si CHECKOUT_ASYNC)"""
+        payment = Payment.objects.create(
+            order=order,
+            customer=order.customer,
+            payment_method=payment_method,
+            amount=order.total,
+            status='pending',
+            expires_at=CheckoutService.payment_expiry()
+        )
         
         try:
-            if payment_method == 'tilopay_yappy':
-                yappy_phone = validated_data.get('yappy_phone')
-                payment_response = tilopay_service.create_yappy_payment(order, yappy_phone)
-            else:  # tilopay_card
-                payment_response = tilopay_service.create_card_payment(order)
-            
-            # Crear registro de pago
-            from apps.payments.models import Payment
-            Payment.objects.create(
-                order=order,
-                customer=order.customer,
-                payment_method=payment_method,
-                amount=order.total,
-                tilopay_order_id=payment_response.get('order_id'),
-                tilopay_payment_url=payment_response.get('payment_url'),
-                status='pending'
-            )
-            
-            return {
-                'payment_url': payment_response.get('payment_url'),
-                'order_id': payment_response.get('order_id'),
-                'expires_at': payment_response.get('expires_at')
-            }
-            
+            return CheckoutService().start(payment, validated_data.get('yappy_phone'), client=client)
         except Exception as e:
             logger.error(f"Payment processing failed for order {order.id}: {e}")
-            raise Exception(f"Error al procesar pago: {e}")
+            raise
     
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -181,17 +174,21 @@ class OrderViewSet(viewsets.ModelViewSet):
         try:
             # Actualizar estado
             old_status = order.status
-            order.status = new_status
-            order.save()
-            
-            # Registrar historial
-            from .models import OrderStatusHistory
-            OrderStatusHistory.objects.create(
-                order=order,
-                status=new_status,
-                changed_by=request.user,
-                notes=notes
-            )
+            with transaction.atomic():
+                order.status = new_status
+                order.save()
+                
+                # Registrar historial
+                from .models import OrderStatusHistory
+                OrderStatusHistory.objects.create(
+                    order=order,
+                    status=new_status,
+                    changed_by=request.user,
+                    notes=notes
+                )
+                
+                # Las notificaciones salen del outbox, fuera del request
+                publish_many([order_status_event(order.id, new_status, old_status, request.user.id)])
             
             logger.info(f"Order {order.id} status updated from {old_status} to {new_status}")
             
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import OutboxEvent
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('event_type', 'aggregate_type', 'aggregate_id', 'status', 'attempts', 'available_at', 'processed_at')
+    list_filter = ('event_type', 'status', 'created_at')
+    search_fields = ('aggregate_id', 'event_type')
+    readonly_fields = ('created_at', 'processed_at', 'locked_by', 'locked_until')
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class OutboxConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.outbox'
+
+    def ready(self):
+        # Cada app registra sus handlers en <app>/outbox_handlers.py
+        autodiscover_modules('outbox_handlers')
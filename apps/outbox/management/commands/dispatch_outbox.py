@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+
+from apps.outbox.services.dispatcher import OutboxDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los handlers de los eventos pendientes del outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Eventos por lote (por defecto OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir despachando indefinidamente')
+        parser.add_argument('--interval', type=float, default=2,
+                            help='Segundos de espera entre pasadas con --loop')
+
+    def handle(self, *args, **options):
+        dispatcher = OutboxDispatcher(batch_size=options['batch_size'])
+
+        while True:
+            totals = dispatcher.drain()
+            if any(totals.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    f"{totals['done']} procesados, {totals['retry']} reintentos, {totals['failed']} fallidos"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
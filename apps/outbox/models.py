@@ -0,0 +1,39 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxEvent(models.Model):
+    """Efecto secundario pendiente, escrito en la misma transacción que el cambio que lo origina"""
+    EVENT_STATUS = (
+        ('pending', 'Pendiente'),
+        ('processing', 'En proceso'),
+        ('done', 'Procesado'),
+        ('failed', 'Fallido'),
+    )
+
+    event_type = models.CharField(max_length=100)  # p. ej. 'payment.completed'
+    aggregate_type = models.CharField(max_length=30)  # 'order', 'payment'
+    aggregate_id = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    status = models.CharField(max_length=20, choices=EVENT_STATUS, default='pending')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+
+    # Lease del dispatcher que lo tomó; vencido, otro dispatcher puede retomarlo
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+            models.Index(fields=['aggregate_type', 'aggregate_id'], name='outbox_aggregate_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_type}:{self.aggregate_id} - {self.status}"
@@ -0,0 +1,168 @@
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import OutboxEvent
+from .registry import get_handlers, get_batch_handlers
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 3600
+
+
+class OutboxDispatcher:
+    """
+    Ejecuta los handlers de los OutboxEvent pendientes
+
+    Los eventos se toman por lotes con un lease (locked_by + locked_until):
+    en PostgreSQL con SELECT ... FOR UPDATE SKIP LOCKED y en SQLite con un
+    UPDATE condicional. El lease se libera al terminar; si el proceso muere,
+    otro dispatcher retoma el evento cuando el lease vence. Los handlers
+    corren fuera de la transacción del claim, uno por evento con su propia
+    transacción; los registrados con batch=True reciben de una vez todos los
+    eventos de su tipo del lote.
+    """
+
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.max_attempts = settings.OUTBOX_MAX_ATTEMPTS
+        self.lease = timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def drain(self, max_batches: int = None) -> Dict[str, int]:
+        """Despachar lotes hasta vaciar lo disponible (o hasta max_batches)"""
+        totals = {'done': 0, 'retry': 0, 'failed': 0}
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            result = self.dispatch_batch()
+            batches += 1
+            for key, value in result.items():
+                totals[key] += value
+            if sum(result.values()) < self.batch_size:
+                break
+
+        return totals
+
+    def next_available_at(self):
+        """Vencimiento del próximo evento pendiente diferido (o en reintento), None si no hay"""
+        return OutboxEvent.objects.filter(
+            status='pending', available_at__gt=timezone.now()
+        ).order_by('available_at').values_list('available_at', flat=True).first()
+
+    def dispatch_batch(self) -> Dict[str, int]:
+        result = {'done': 0, 'retry': 0, 'failed': 0}
+        events = self.claim()
+        if not events:
+            return result
+
+        errors = self._run_batch_handlers(events)
+
+        done = []
+        retry = []
+        for event in events:
+            event.attempts += 1
+            try:
+                if event.id in errors:
+                    raise errors[event.id]
+                self._handle(event)
+                done.append(event.id)
+            except Exception as e:
+                logger.error(f"Outbox event {event.id} ({event.event_type}) failed: {e}")
+                event.last_error = str(e)
+                retry.append(event)
+
+        self._finish(done, retry)
+        result['done'] = len(done)
+        result['failed'] = sum(1 for event in retry if event.status == 'failed')
+        result['retry'] = len(retry) - result['failed']
+
+        logger.info(f"Outbox batch dispatched: {result}")
+        return result
+
+    def claim(self) -> List[OutboxEvent]:
+        """Tomar hasta batch_size eventos disponibles con un lease de este dispatcher"""
+        now = timezone.now()
+        claimable = (
+            Q(status='pending', available_at__lte=now)
+            | Q(status='processing', locked_until__lt=now)  # Lease vencido
+        )
+        fields = {'status': 'processing', 'locked_by': self.worker_id, 'locked_until': now + self.lease}
+
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                ids = list(
+                    OutboxEvent.objects.select_for_update(skip_locked=True).filter(claimable)
+                    .order_by('available_at', 'id').values_list('id', flat=True)[:self.batch_size]
+                )
+                OutboxEvent.objects.filter(id__in=ids).update(**fields)
+        else:
+            # Sin SKIP LOCKED: el UPDATE vuelve a evaluar la condición, así dos
+            # dispatchers nunca toman el mismo evento
+            candidates = list(
+                OutboxEvent.objects.filter(claimable)
+                .order_by('available_at', 'id').values_list('id', flat=True)[:self.batch_size]
+            )
+            OutboxEvent.objects.filter(claimable, id__in=candidates).update(**fields)
+
+        return list(
+            OutboxEvent.objects.filter(
+                status='processing', locked_by=self.worker_id, locked_until=fields['locked_until']
+            ).order_by('available_at', 'id')
+        )
+
+    def _run_batch_handlers(self, events: List[OutboxEvent]) -> Dict[int, Exception]:
+        """Handlers con batch=True: una llamada por tipo con todos sus eventos del lote"""
+        by_type = defaultdict(list)
+        for event in events:
+            by_type[event.event_type].append(event)
+
+        errors = {}
+        for event_type, typed_events in by_type.items():
+            for handler in get_batch_handlers(event_type):
+                try:
+                    with transaction.atomic():
+                        handler(typed_events)
+                except Exception as e:
+                    # Se reintentan todos los eventos del grupo
+                    errors.update({event.id: e for event in typed_events})
+        return errors
+
+    def _handle(self, event: OutboxEvent):
+        handlers = get_handlers(event.event_type)
+        with transaction.atomic():
+            for handler in handlers:
+                handler(event)
+
+    def _finish(self, done: List[int], retry: List[OutboxEvent]):
+        now = timezone.now()
+
+        # Solo si el lease sigue siendo nuestro
+        OutboxEvent.objects.filter(id__in=done, locked_by=self.worker_id).update(
+            status='done', attempts=F('attempts') + 1, processed_at=now,
+            locked_by='', locked_until=None, last_error=''
+        )
+
+        for event in retry:
+            if event.attempts >= self.max_attempts:
+                event.status = 'failed'
+                event.processed_at = now
+            else:
+                event.status = 'pending'
+                delay = min(RETRY_BASE_SECONDS * 2 ** (event.attempts - 1), RETRY_MAX_SECONDS)
+                event.available_at = now + timedelta(seconds=delay)
+            event.locked_by = ''
+            event.locked_until = None
+
+        OutboxEvent.objects.bulk_update(
+            retry, ['status', 'attempts', 'last_error', 'available_at', 'processed_at', 'locked_by', 'locked_until']
+        )
@@ -0,0 +1,131 @@
+import logging
+import threading
+from datetime import timedelta
+from typing import Dict, Any, Iterable, List
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+_dispatch_lock = threading.Lock()
+_state_lock = threading.Lock()
+_dispatch_requested = False
+_wakeup = None  # (available_at, Timer) del próximo evento diferido de este proceso
+
+
+def build_event(event_type: str, aggregate_type: str, aggregate_id, payload: Dict[str, Any] = None,
+                delay: timedelta = None) -> OutboxEvent:
+    """OutboxEvent sin guardar, para publish_many"""
+    return OutboxEvent(
+        event_type=event_type,
+        aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id),
+        payload=payload or {},
+        available_at=timezone.now() + delay if delay else timezone.now()
+    )
+
+
+def publish(event_type: str, aggregate_type: str, aggregate_id, payload: Dict[str, Any] = None,
+            delay: timedelta = None) -> OutboxEvent:
+    """
+    Guardar un evento en la transacción actual
+
+    Si la transacción se revierte el evento desaparece con ella; los
+    handlers corren después en el dispatcher, nunca en el request.
+    """
+    return publish_many([build_event(event_type, aggregate_type, aggregate_id, payload, delay)])[0]
+
+
+def publish_many(events: Iterable[OutboxEvent]) -> List[OutboxEvent]:
+    events = OutboxEvent.objects.bulk_create(list(events))
+    if events:
+        schedule_dispatch(min(event.available_at for event in events))
+    return events
+
+
+def schedule_dispatch(available_at=None):
+    """
+    Despachar en un hilo de fondo al confirmar la transacción
+
+    Un solo hilo por proceso. Los eventos diferidos (y los reintentos)
+    programan un Timer para cuando venzan. Es lo mejor posible dentro del
+    proceso: con OUTBOX_INLINE_DISPATCH=False, o si la instancia puede
+    quedarse sin CPU entre requests (Cloud Run sin CPU siempre asignada),
+    hay que correr `python manage.py dispatch_outbox --loop` aparte; también
+    cubre los leases vencidos.
+    """
+    if settings.OUTBOX_INLINE_DISPATCH:
+        transaction.on_commit(lambda: request_dispatch(available_at))
+
+
+def request_dispatch(available_at=None):
+    """Despachar ya o, si available_at es futuro, cuando llegue"""
+    delay = (available_at - timezone.now()).total_seconds() if available_at else 0
+    if delay > 0:
+        _schedule_wakeup(available_at, delay)
+    else:
+        _start_dispatch_thread()
+
+
+def _schedule_wakeup(available_at, delay: float):
+    """Un Timer por proceso, al vencimiento más próximo; el drain programa el siguiente"""
+    global _wakeup
+
+    with _state_lock:
+        if _wakeup is not None:
+            if _wakeup[0] <= available_at:
+                return
+            _wakeup[1].cancel()
+        timer = threading.Timer(delay, _on_wakeup)
+        timer.daemon = True
+        _wakeup = (available_at, timer)
+        timer.start()
+
+
+def _on_wakeup():
+    global _wakeup
+
+    with _state_lock:
+        if _wakeup is not None and _wakeup[1] is threading.current_thread():
+            _wakeup = None
+    _start_dispatch_thread()
+
+
+def _start_dispatch_thread():
+    global _dispatch_requested
+
+    with _state_lock:
+        _dispatch_requested = True
+    if not _dispatch_lock.acquire(blocking=False):
+        return  # El hilo en curso vuelve a drenar
+    threading.Thread(target=_dispatch_in_background, daemon=True).start()
+
+
+def _dispatch_in_background():
+    global _dispatch_requested
+    from .dispatcher import OutboxDispatcher
+
+    next_available_at = None
+    try:
+        dispatcher = OutboxDispatcher()
+        while True:
+            with _state_lock:
+                if not _dispatch_requested:
+                    break
+                _dispatch_requested = False
+            dispatcher.drain()
+        next_available_at = dispatcher.next_available_at()
+    except Exception as e:
+        logger.error(f"Background outbox dispatch failed: {e}")
+    finally:
+        connection.close()
+        _dispatch_lock.release()
+
+    if next_available_at:
+        request_dispatch(next_available_at)
+    # Pedido entre la última pasada y la liberación del lock
+    if _dispatch_requested:
+        _start_dispatch_thread()
@@ -0,0 +1,29 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+# event_type -> [(handler, batch)]
+_handlers: Dict[str, List[Tuple[Callable, bool]]] = defaultdict(list)
+
+
+def outbox_handler(event_type: str, batch: bool = False):
+    """
+    Registrar una función como handler de un tipo de evento
+
+    El handler recibe el OutboxEvent (o, con batch=True, la lista de eventos
+    de ese tipo del lote) y corre dentro de su propia transacción. La entrega
+    es al menos una vez: si falla se reintentan los eventos completos, así
+    que los handlers deben ser idempotentes.
+    """
+    def register(func: Callable) -> Callable:
+        if (func, batch) not in _handlers[event_type]:
+            _handlers[event_type].append((func, batch))
+        return func
+    return register
+
+
+def get_handlers(event_type: str) -> List[Callable]:
+    return [func for func, batch in _handlers.get(event_type, ()) if not batch]
+
+
+def get_batch_handlers(event_type: str) -> List[Callable]:
+    return [func for func, batch in _handlers.get(event_type, ()) if batch]
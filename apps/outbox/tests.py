@@ -0,0 +1,75 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .services import publisher
+from .services.dispatcher import OutboxDispatcher
+
+
+@override_settings(OUTBOX_INLINE_DISPATCH=True)
+class InlineDispatchTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.drained = threading.Semaphore(0)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.next_available_at = []
+
+        def drain(dispatcher, max_batches=None):
+            self.calls.append(timezone.now())
+            self.started.set()
+            self.release.wait(2)
+            self.drained.release()
+            return {'done': 0, 'retry': 0, 'failed': 0}
+
+        def next_available_at(dispatcher):
+            return self.next_available_at.pop(0) if self.next_available_at else None
+
+        for patcher in (
+            mock.patch.object(OutboxDispatcher, 'drain', drain),
+            mock.patch.object(OutboxDispatcher, 'next_available_at', next_available_at),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.cancel_wakeup)
+
+    def cancel_wakeup(self):
+        self.release.set()
+        with publisher._state_lock:
+            if publisher._wakeup is not None:
+                publisher._wakeup[1].cancel()
+                publisher._wakeup = None
+
+    def wait_drains(self, count):
+        for _ in range(count):
+            self.assertTrue(self.drained.acquire(timeout=2))
+
+    def test_delayed_event_is_dispatched_when_it_becomes_available(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            event = publisher.publish('test.delayed', 'test', 1, delay=timedelta(milliseconds=200))
+
+        self.assertFalse(self.drained.acquire(timeout=0.05))
+        self.wait_drains(1)
+        self.assertGreaterEqual(self.calls[0], event.available_at)
+
+    def test_request_during_a_drain_runs_another_pass(self):
+        self.release.clear()
+        publisher.request_dispatch()
+        self.assertTrue(self.started.wait(2))
+        # Llega mientras el hilo está drenando: no se crea otro hilo, pero no se pierde
+        publisher.request_dispatch()
+        self.release.set()
+
+        self.wait_drains(2)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_drain_schedules_the_next_delayed_event(self):
+        self.next_available_at = [timezone.now() + timedelta(milliseconds=200)]
+
+        publisher.request_dispatch()
+
+        self.wait_drains(2)
+        self.assertGreaterEqual(self.calls[1] - self.calls[0], timedelta(milliseconds=150))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, TilopaySubmerchant, Commission, PaymentAttempt
+from .models import Payment, TilopaySubmerchant, Commission, PaymentAttempt, WebhookEvent
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -22,6 +22,13 @@ class CommissionAdmin(admin.ModelAdmin):
 
 @admin.register(PaymentAttempt)
 class PaymentAttemptAdmin(admin.ModelAdmin):
-    list_display = ('payment', 'payment_method', 'status', 'created_at')
-    list_filter = ('payment_method', 'status', 'created_at')
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    list_display = ('payment', 'operation', 'payment_method', 'status', 'http_status', 'latency_ms', 'created_at')
+    list_filter = ('operation', 'payment_method', 'status', 'created_at')
+    readonly_fields = ('created_at',)
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'provider', 'tilopay_order_id', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('provider', 'status', 'received_at')
+    search_fields = ('event_id', 'tilopay_order_id')
+    readonly_fields = ('received_at', 'processed_at')
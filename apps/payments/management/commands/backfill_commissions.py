@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.payments.services.commission_ledger import CommissionLedger
+
+
+class Command(BaseCommand):
+    help = 'Genera las comisiones de los pagos completados que aún no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Pagos por bloque')
+        parser.add_argument('--days', type=int, default=None,
+                            help='Solo pagos de los últimos N días')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days']:
+            since = timezone.now() - timedelta(days=options['days'])
+
+        created = CommissionLedger().backfill(chunk_size=options['chunk_size'], since=since)
+
+        self.stdout.write(self.style.SUCCESS(f"{created} comisiones generadas"))
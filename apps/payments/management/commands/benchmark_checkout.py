@@ -0,0 +1,228 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from apps.payments.simulator import TilopaySimulator, serve, SIGNATURE_HEADER
+
+BENCHMARK_SECRET = 'benchmark-secret'
+WEBHOOK_PATH = '/api/payments/webhooks/tilopay/webhook/'
+POLL_INTERVAL_SECONDS = 0.01
+SESSION_TIMEOUT_SECONDS = 30
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Mide el flujo de checkout de punta a punta (orden + pago con Tilopay + webhook) '
+            'contra el simulador, sobre una base de datos de prueba')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200,
+                            help='Número de checkouts a ejecutar')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Clientes simultáneos')
+        parser.add_argument('--latency-ms', type=float, default=50,
+                            help='Latencia simulada de Tilopay')
+        parser.add_argument('--jitter-ms', type=float, default=0)
+        parser.add_argument('--failure-rate', type=float, default=0,
+                            help='Probabilidad de 503 en el simulador')
+        parser.add_argument('--payment-method', choices=['tilopay_card', 'tilopay_yappy'], default='tilopay_card')
+        parser.add_argument('--async', dest='run_async', action='store_true',
+                            help='Usar CHECKOUT_ASYNC y medir también el tiempo hasta tener payment_url')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == 'sqlite':
+            # SQLite en memoria bloquea a los clientes concurrentes; usar archivo con espera
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'easydeals_benchmark.sqlite3')
+            connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        simulator = TilopaySimulator(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            failure_rate=options['failure_rate'],
+            secret_key=BENCHMARK_SECRET
+        )
+        server = serve(simulator, port=0)
+        simulator.public_url = f"http://127.0.0.1:{server.server_port}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            with override_settings(
+                TILOPAY_BASE_URL=simulator.public_url,
+                TILOPAY_SECRET_KEY=BENCHMARK_SECRET,
+                TILOPAY_WEBHOOK_VERIFY_SIGNATURE=True,
+                TILOPAY_WEBHOOK_INLINE_DRAIN=False,
+                OUTBOX_INLINE_DISPATCH=False,
+                CHECKOUT_ASYNC=options['run_async'],
+                ALLOWED_HOSTS=['*']
+            ):
+                self._run(simulator, options)
+        finally:
+            server.shutdown()
+            server.server_close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, simulator, options):
+        from apps.payments.models import Payment
+        from apps.payments.services.attempt_recorder import get_recorder
+        from apps.payments.services.webhook_processor import WebhookProcessor
+
+        fixtures = self._create_fixtures(options['concurrency'])
+        timings = {'checkout': [], 'session': [], 'webhook': []}
+        errors = {'checkout': 0, 'session': 0, 'webhook': 0}
+        lock = threading.Lock()
+        counter = iter(range(options['orders']))
+
+        def worker(customer, address):
+            from rest_framework.test import APIClient
+
+            client = APIClient()
+            client.force_authenticate(customer)
+            try:
+                while True:
+                    with lock:
+                        if next(counter, None) is None:
+                            return
+                    self._checkout(client, simulator, fixtures, address, options, timings, errors, lock)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(customer, address))
+            for customer, address in fixtures['customers']
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        request_elapsed = time.perf_counter() - started
+
+        process_started = time.perf_counter()
+        processed = WebhookProcessor().drain()
+        process_elapsed = time.perf_counter() - process_started
+        total_elapsed = time.perf_counter() - started
+        # Guardar los PaymentAttempt encolados antes de borrar la base de prueba
+        get_recorder().flush()
+
+        completed = Payment.objects.filter(status='completed').count()
+
+        mode = 'asíncrono' if options['run_async'] else 'síncrono'
+        self.stdout.write(f"Checkouts ({mode}): {options['orders']} con {options['concurrency']} clientes, "
+                          f"latencia simulada {options['latency_ms']:.0f} ms, "
+                          f"{simulator.request_count} llamadas a Tilopay")
+        for phase, values in timings.items():
+            self.stdout.write(
+                f"  {phase:<9} n={len(values):<5} errores={errors[phase]:<4} "
+                f"p50={percentile(values, 50):7.1f} ms  p95={percentile(values, 95):7.1f} ms  "
+                f"p99={percentile(values, 99):7.1f} ms  media={statistics.mean(values) if values else 0:7.1f} ms"
+            )
+        self.stdout.write(
+            f"  proceso   {processed['processed']} webhooks en {process_elapsed * 1000:.0f} ms "
+            f"({processed['processed'] / process_elapsed if process_elapsed else 0:.0f}/s)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Throughput: {len(timings['checkout']) / request_elapsed:.1f} checkouts/s; "
+            f"{completed} pagos completados en {total_elapsed:.2f} s"
+        ))
+
+    def _checkout(self, client, simulator, fixtures, address, options, timings, errors, lock):
+        payload = {
+            'order_type': 'delivery',
+            'business_id': str(fixtures['business'].id),
+            'delivery_address_id': str(address.id),
+            'items': [{'product': str(fixtures['product'].id), 'quantity': 2, 'unit_price': '7.50'}],
+            'payment_method': options['payment_method'],
+            'yappy_phone': '60000000',
+        }
+
+        started = time.perf_counter()
+        response = client.post('/api/orders/', payload, format='json')
+        elapsed = (time.perf_counter() - started) * 1000
+
+        payment = response.data.get('payment') if response.status_code == 201 else None
+        with lock:
+            if payment:
+                timings['checkout'].append(elapsed)
+            else:
+                errors['checkout'] += 1
+        if not payment:
+            return
+
+        # En modo asíncrono: consultar hasta que la sesión de Tilopay exista
+        deadline = started + SESSION_TIMEOUT_SECONDS
+        while payment['status'] == 'processing' and time.perf_counter() < deadline:
+            time.sleep(POLL_INTERVAL_SECONDS)
+            payment = client.get(f"/api/payments/{payment['id']}/checkout_status/").data
+        elapsed = (time.perf_counter() - started) * 1000
+
+        tilopay_order_id = payment['order_id'] if payment['status'] == 'pending' else None
+        with lock:
+            if tilopay_order_id:
+                timings['session'].append(elapsed)
+            else:
+                errors['session'] += 1
+        if not tilopay_order_id:
+            return
+
+        simulator.orders[tilopay_order_id]['status'] = 'completed'
+        body, headers = simulator.build_webhook(tilopay_order_id, 'completed')
+
+        started = time.perf_counter()
+        response = client.generic(
+            'POST', WEBHOOK_PATH, body,
+            content_type='application/json',
+            **{'HTTP_' + SIGNATURE_HEADER.upper().replace('-', '_'): headers[SIGNATURE_HEADER]}
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+
+        with lock:
+            if response.status_code == 200:
+                timings['webhook'].append(elapsed)
+            else:
+                errors['webhook'] += 1
+
+    def _create_fixtures(self, concurrency: int):
+        from apps.businesses.models import Business, Product
+        from apps.payments.models import TilopaySubmerchant
+        from apps.users.models import User, Address
+
+        owner = User.objects.create_user(username='bench-owner', password='x', phone='5000000', user_type='business')
+        business = Business.objects.create(
+            owner=owner, name='Benchmark', description='-', service_type='food', phone='5000000',
+            address='-', latitude=Decimal('8.98'), longitude=Decimal('-79.52'), delivery_fee=Decimal('2.50')
+        )
+        TilopaySubmerchant.objects.create(
+            user=owner, submerchant_key='SIM-SUB-BUSINESS', business_name='Benchmark',
+            business_email='bench@example.com', business_phone='5000000'
+        )
+        product = Product.objects.create(
+            business=business, name='Producto', description='-', price=Decimal('7.50'), category='bench'
+        )
+
+        customers = []
+        for index in range(concurrency):
+            customer = User.objects.create_user(
+                username=f'bench-customer-{index}', password='x', phone=f'6{index:07d}', user_type='client'
+            )
+            address = Address.objects.create(
+                user=customer, title='Casa', address_line='-', latitude=Decimal('9.00'), longitude=Decimal('-79.50')
+            )
+            customers.append((customer, address))
+
+        return {'business': business, 'product': product, 'customers': customers}
@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+
+from apps.payments.services.expiry import PaymentExpirySweeper
+
+
+class Command(BaseCommand):
+    help = 'Marca como expirados los pagos pendientes vencidos y libera sus órdenes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Pagos por lote (por defecto PAYMENT_EXPIRY_BATCH_SIZE)')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Máximo de lotes por pasada')
+        parser.add_argument('--order-action', choices=['cancel', 'reopen'], default=None,
+                            help='Qué hacer con la orden (por defecto PAYMENT_EXPIRED_ORDER_ACTION)')
+        parser.add_argument('--grace-seconds', type=int, default=None,
+                            help='Margen después de expires_at (por defecto PAYMENT_EXPIRY_GRACE_SECONDS)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir barriendo indefinidamente')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Segundos de espera entre pasadas con --loop')
+
+    def handle(self, *args, **options):
+        sweeper = PaymentExpirySweeper(
+            batch_size=options['batch_size'],
+            order_action=options['order_action'],
+            grace_seconds=options['grace_seconds']
+        )
+
+        while True:
+            totals = sweeper.sweep(max_batches=options['max_batches'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{totals['expired']} pagos expirados, {totals['orders_cancelled']} órdenes canceladas, "
+                f"{totals['orders_reopened']} pendientes de reintento"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+
+from apps.payments.services.webhook_processor import WebhookProcessor
+
+
+class Command(BaseCommand):
+    help = 'Procesa los webhooks de Tilopay pendientes en la bandeja de entrada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Eventos por lote (por defecto TILOPAY_WEBHOOK_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir procesando indefinidamente')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Segundos de espera entre pasadas con --loop')
+
+    def handle(self, *args, **options):
+        processor = WebhookProcessor(batch_size=options['batch_size'])
+
+        while True:
+            totals = processor.drain()
+            if any(totals.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    f"{totals['processed']} procesados, {totals['ignored']} ignorados, "
+                    f"{totals['retry']} reintentos, {totals['failed']} fallidos"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+
+from apps.payments.services.reconciliation import PaymentReconciler
+
+
+class Command(BaseCommand):
+    help = 'Concilia con Tilopay los pagos pendientes cuyo webhook no llegó'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-minutes', type=int, default=None,
+                            help='Solo pagos creados hace más de N minutos (por defecto TILOPAY_RECONCILE_AFTER_MINUTES)')
+        parser.add_argument('--limit', type=int, default=1000,
+                            help='Máximo de pagos a consultar por pasada')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Consultas simultáneas a Tilopay')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Máximo de consultas por segundo (0 = sin límite)')
+        parser.add_argument('--base-url', default=None,
+                            help='URL alternativa de Tilopay (p. ej. un simulador local)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir conciliando indefinidamente')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Segundos de espera entre pasadas con --loop')
+
+    def handle(self, *args, **options):
+        reconciler = PaymentReconciler(
+            base_url=options['base_url'],
+            workers=options['workers'],
+            rate=options['rate'],
+            older_than_minutes=options['older_than_minutes']
+        )
+
+        while True:
+            totals = reconciler.run(limit=options['limit'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{totals['checked']} consultados, {totals['updated']} actualizados, "
+                f"{totals['unchanged']} sin cambios, {totals['errors']} errores"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.payments.simulator import TilopaySimulator, serve
+
+
+class Command(BaseCommand):
+    help = 'Levanta un simulador local de Tilopay (usar con TILOPAY_BASE_URL=http://host:puerto)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=150,
+                            help='Latencia base de cada respuesta')
+        parser.add_argument('--jitter-ms', type=float, default=100,
+                            help='Variación aleatoria añadida a la latencia')
+        parser.add_argument('--failure-rate', type=float, default=0,
+                            help='Probabilidad (0-1) de responder 503')
+        parser.add_argument('--webhook-delay', type=float, default=None,
+                            help='Enviar el webhook "completed" N segundos después de crear cada orden')
+
+    def handle(self, *args, **options):
+        public_url = f"http://{options['host']}:{options['port']}"
+        simulator = TilopaySimulator(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            failure_rate=options['failure_rate'],
+            secret_key=settings.TILOPAY_SECRET_KEY,
+            auto_webhook_delay=options['webhook_delay'],
+            public_url=public_url
+        )
+        server = serve(simulator, options['host'], options['port'])
+
+        self.stdout.write(self.style.SUCCESS(f"Simulador de Tilopay escuchando en {public_url}"))
+        self.stdout.write("POST /v2/orders/<id>/complete|fail|cancel envía el webhook firmado")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
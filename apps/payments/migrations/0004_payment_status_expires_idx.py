@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'expires_at'], name='payment_status_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0004_payment_status_expires_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commission',
+            name='recipient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='received_commissions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='commission',
+            index=models.Index(fields=['recipient', 'status', 'created_at'], name='commission_recipient_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='commission',
+            constraint=models.UniqueConstraint(fields=('payment', 'commission_type'), name='commission_payment_type_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:07
+
+from django.db import migrations, models
+
+
+def empty_to_null(apps, schema_editor):
+    # Los pagos en efectivo y los que aún no tienen sesión compartían '' en un campo único
+    Payment = apps.get_model('payments', 'Payment')
+    Payment.objects.filter(tilopay_order_id='').update(tilopay_order_id=None)
+
+
+def null_to_empty(apps, schema_editor):
+    Payment = apps.get_model('payments', 'Payment')
+    Payment.objects.filter(tilopay_order_id__isnull=True).update(tilopay_order_id='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_commission_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='tilopay_order_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(empty_to_null, null_to_empty),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from apps.orders.models import Order
 from apps.users.models import User
 import uuid
@@ -30,7 +31,7 @@ class Payment(models.Model):
     
     # Tilopay specific fields
     tilopay_transaction_id = models.CharField(max_length=100, blank=True)
-    tilopay_order_id = models.CharField(max_length=100, blank=True, unique=True)
+    tilopay_order_id = models.CharField(max_length=100, blank=True, null=True, unique=True)  # None hasta crear la sesión
     tilopay_session_token = models.TextField(blank=True)
     tilopay_redirect_url = models.URLField(blank=True)
     tilopay_payment_url = models.URLField(blank=True)  # URL para redirigir al usuario
@@ -60,6 +61,14 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Conciliación de pagos pendientes antiguos
+            models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+            # Barrido de pagos pendientes vencidos
+            models.Index(fields=['status', 'expires_at'], name='payment_status_expires_idx'),
+        ]
+    
     def __str__(self):
         return f"Payment {self.get_payment_method_display()} for Order #{self.order.order_number}"
 
@@ -111,7 +120,7 @@ class Commission(models.Model):
     payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='commissions')
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payment_commissions')
     commission_type = models.CharField(max_length=20, choices=COMMISSION_TYPES)
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_commissions')
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_commissions', null=True, blank=True)  # None = plataforma
     
     amount = models.DecimalField(max_digits=8, decimal_places=2)
     percentage = models.DecimalField(max_digits=5, decimal_places=4)
@@ -128,19 +137,65 @@ class Commission(models.Model):
     paid_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        constraints = [
+            # Una fila por parte del split: permite regenerar el libro sin duplicar
+            models.UniqueConstraint(fields=['payment', 'commission_type'], name='commission_payment_type_uniq'),
+        ]
+        indexes = [
+            # Ganancias y pagos pendientes por destinatario
+            models.Index(fields=['recipient', 'status', 'created_at'], name='commission_recipient_idx'),
+        ]
+    
     def __str__(self):
         return f"Commission {self.commission_type} - {self.amount}"
 
 class PaymentAttempt(models.Model):
     """Registro de intentos de pago para análisis"""
-    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='attempts')
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='attempts', null=True, blank=True)
+    operation = models.CharField(max_length=30, blank=True)  # create, status, refund, submerchant
     payment_method = models.CharField(max_length=20)
     status = models.CharField(max_length=20)
+    http_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
     error_message = models.TextField(blank=True)
+    request_data = models.JSONField(default=dict, blank=True)
     tilopay_response = models.JSONField(default=dict, blank=True)
     user_agent = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"Attempt {self.payment_method} - {self.status}"
\ No newline at end of file
+        return f"Attempt {self.payment_method} - {self.status}"
+
+class WebhookEvent(models.Model):
+    """Bandeja de entrada de webhooks: se guardan crudos y se procesan en segundo plano"""
+    EVENT_STATUS = (
+        ('pending', 'Pendiente'),
+        ('processed', 'Procesado'),
+        ('ignored', 'Ignorado'),
+        ('failed', 'Fallido'),
+    )
+    
+    provider = models.CharField(max_length=20, default='tilopay')
+    event_id = models.CharField(max_length=100)  # ID del proveedor o hash del cuerpo
+    tilopay_order_id = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    signature = models.CharField(max_length=255, blank=True)
+    
+    status = models.CharField(max_length=20, choices=EVENT_STATUS, default='pending')
+    attempts = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('provider', 'event_id')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"Webhook {self.provider} {self.event_id} - {self.status}"
@@ -0,0 +1,49 @@
+from apps.notifications.services.notification_service import NotificationService
+from apps.outbox.services.registry import outbox_handler
+from apps.users.models import User
+
+
+def _notify_customer(event, title: str, message: str):
+    customer = User.objects.filter(id=event.payload['customer_id']).first()
+    if customer is None:
+        return
+
+    result = NotificationService().send_notification(
+        user=customer,
+        title=title,
+        message=message,
+        notification_type='payment',
+        data={'order_id': event.payload['order_id'], 'payment_status': event.event_type.split('.', 1)[1]}
+    )
+    if not result.get('database_saved'):
+        # Que el dispatcher lo reintente
+        raise Exception(result.get('error', 'Notification not saved'))
+
+
+@outbox_handler('payment.completed')
+def notify_payment_completed(event):
+    _notify_customer(
+        event, 'Pago confirmado',
+        f"El pago de tu orden #{event.payload['order_number']} fue confirmado"
+    )
+
+
+@outbox_handler('payment.failed')
+def notify_payment_failed(event):
+    _notify_customer(
+        event, 'Pago rechazado',
+        f"El pago de tu orden #{event.payload['order_number']} no se pudo completar. Puedes intentarlo de nuevo"
+    )
+
+
+@outbox_handler('payment.expired')
+def notify_payment_expired(event):
+    if event.payload.get('order_reopened'):
+        return  # El aviso de reintentar lo envía 'order.status_changed'
+
+    order_number = event.payload['order_number']
+    if event.payload.get('order_cancelled'):
+        message = f'El pago de tu orden #{order_number} expiró y la orden fue cancelada'
+    else:
+        message = f'El pago de tu orden #{order_number} expiró. Puedes intentarlo de nuevo'
+    _notify_customer(event, 'Pago expirado', message)
@@ -0,0 +1,182 @@
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+
+from ..models import Payment, PaymentAttempt
+
+logger = logging.getLogger(__name__)
+
+# Datos del pago y del cliente que acompañan a las llamadas a Tilopay del contexto actual
+_attempt_context = contextvars.ContextVar('payment_attempt_context', default={})
+
+_recorder = None
+_recorder_pid = None
+_recorder_lock = threading.Lock()
+
+
+@contextmanager
+def attempt_context(**values):
+    """Asociar payment_id, payment_method, user_agent o ip_address a las llamadas dentro del bloque"""
+    token = _attempt_context.set({**_attempt_context.get(), **values})
+    try:
+        yield
+    finally:
+        _attempt_context.reset(token)
+
+
+def client_info(request) -> Dict[str, str]:
+    """User agent e IP del cliente (primera IP de X-Forwarded-For detrás del proxy)"""
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    ip_address = forwarded.split(',')[0].strip() if forwarded else request.META.get('REMOTE_ADDR')
+    return {
+        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+        'ip_address': ip_address or None,
+    }
+
+
+def get_recorder() -> 'AttemptRecorder':
+    """Recorder del proceso (se recrea tras un fork)"""
+    global _recorder, _recorder_pid
+
+    pid = os.getpid()
+    if _recorder is None or _recorder_pid != pid:
+        with _recorder_lock:
+            if _recorder is None or _recorder_pid != pid:
+                _recorder = AttemptRecorder()
+                _recorder_pid = pid
+    return _recorder
+
+
+class AttemptRecorder:
+    """
+    Registro de PaymentAttempt fuera del camino del request
+
+    record() solo encola en memoria; un hilo de fondo vacía la cola cada
+    PAYMENT_ATTEMPT_FLUSH_INTERVAL segundos (o al llegar a un lote completo)
+    con un bulk_create. Si la cola se llena los intentos se descartan.
+    """
+
+    def __init__(self):
+        self.enabled = settings.PAYMENT_ATTEMPTS_ENABLED
+        self.batch_size = settings.PAYMENT_ATTEMPT_BATCH_SIZE
+        self.flush_interval = settings.PAYMENT_ATTEMPT_FLUSH_INTERVAL
+        self.queue = queue.Queue(maxsize=settings.PAYMENT_ATTEMPT_QUEUE_SIZE)
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.dropped = 0
+        self.thread = None
+
+    def record(self, **values):
+        if not self.enabled:
+            return
+
+        entry = {**_attempt_context.get(), **values}
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Payment attempt queue full, {self.dropped} attempts dropped")
+            return
+
+        self._ensure_thread()
+        if self.queue.qsize() >= self.batch_size:
+            self.wakeup.set()
+
+    def flush(self) -> int:
+        """Guardar todo lo encolado; devuelve el número de filas creadas"""
+        created = 0
+        with self.flush_lock:
+            while True:
+                entries = self._take(self.batch_size)
+                if not entries:
+                    return created
+                try:
+                    created += self._write(entries)
+                except Exception as e:
+                    logger.error(f"Failed to write {len(entries)} payment attempts: {e}")
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            with _recorder_lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self._run, name='payment-attempts', daemon=True)
+                    self.thread.start()
+
+    def _run(self):
+        while True:
+            # Despertar antes si ya hay un lote completo
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            if self.queue.empty():
+                continue
+            close_old_connections()
+            self.flush()
+
+    def _take(self, limit: int) -> List[Dict[str, Any]]:
+        entries = []
+        while len(entries) < limit:
+            try:
+                entries.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return entries
+
+    def _write(self, entries: List[Dict[str, Any]]) -> int:
+        self._resolve_payments(entries)
+        PaymentAttempt.objects.bulk_create([
+            PaymentAttempt(
+                payment_id=entry.get('payment_id'),
+                operation=entry.get('operation', ''),
+                payment_method=entry.get('payment_method', ''),
+                status=entry.get('status', ''),
+                http_status=entry.get('http_status'),
+                latency_ms=entry.get('latency_ms'),
+                error_message=entry.get('error_message', ''),
+                request_data=entry.get('request_data', {}),
+                tilopay_response=entry.get('response', {}),
+                user_agent=entry.get('user_agent', ''),
+                ip_address=entry.get('ip_address')
+            )
+            for entry in entries
+        ])
+        return len(entries)
+
+    def _resolve_payments(self, entries: List[Dict[str, Any]]):
+        """Completar payment_id a partir de tilopay_order_id u order_id con una consulta"""
+        pending = [entry for entry in entries if not entry.get('payment_id')]
+        tilopay_ids = {entry['tilopay_order_id'] for entry in pending if entry.get('tilopay_order_id')}
+        order_ids = {entry['order_id'] for entry in pending if entry.get('order_id')}
+        if not tilopay_ids and not order_ids:
+            return
+
+        by_tilopay_id = {}
+        by_order_id = {}
+        for payment_id, tilopay_order_id, order_id in Payment.objects.filter(
+            Q(tilopay_order_id__in=tilopay_ids) | Q(order_id__in=order_ids)
+        ).values_list('id', 'tilopay_order_id', 'order_id'):
+            by_tilopay_id[tilopay_order_id] = payment_id
+            by_order_id[str(order_id)] = payment_id
+
+        for entry in pending:
+            entry['payment_id'] = (
+                by_tilopay_id.get(entry.get('tilopay_order_id'))
+                or by_order_id.get(str(entry.get('order_id')))
+            )
+
+
+@atexit.register
+def _flush_on_exit():
+    if _recorder is not None and _recorder_pid == os.getpid():
+        try:
+            _recorder.flush()
+        except Exception:
+            pass
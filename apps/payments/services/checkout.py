@@ -0,0 +1,165 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Any
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Payment
+from .attempt_recorder import attempt_context
+from .commission_ledger import split_snapshot
+from .tilopay_service import TilopayService
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+class CheckoutService:
+    """
+    Creación de la sesión de pago en Tilopay para un Payment
+
+    Con CHECKOUT_ASYNC el pago queda en 'processing' y la sesión se crea en
+    un pool de hilos acotado después del commit; el cliente consulta
+    checkout_status hasta obtener payment_url.
+    """
+
+    def __init__(self, run_async: bool = None):
+        self.run_async = settings.CHECKOUT_ASYNC if run_async is None else run_async
+
+    @staticmethod
+    def payment_expiry():
+        """Vencimiento de un pago con Tilopay creado ahora"""
+        return timezone.now() + timedelta(minutes=settings.PAYMENT_EXPIRY_MINUTES)
+
+    def start(self, payment: Payment, yappy_phone: str = None, client: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Iniciar el checkout de un pago con Tilopay y devolver su estado
+
+        client: user_agent e ip_address del request (ver attempt_recorder.client_info)
+        """
+        payment.yappy_phone = yappy_phone or ''
+
+        if self.run_async:
+            payment.status = 'processing'
+            payment.save(update_fields=['status', 'yappy_phone', 'updated_at'])
+            submit_checkout(payment.id, client)
+        else:
+            payment.save(update_fields=['yappy_phone', 'updated_at'])
+            with attempt_context(**(client or {})):
+                self.create_session(payment)
+
+        return self.state(payment)
+
+    def create_session(self, payment: Payment):
+        """Llamar a Tilopay y guardar la sesión; si falla el pago queda 'failed'"""
+        tilopay_service = TilopayService()
+        now = timezone.now()
+
+        try:
+            split = tilopay_service.compute_split(payment.order)
+            with attempt_context(payment_id=payment.id, payment_method=payment.payment_method):
+                if payment.payment_method == 'tilopay_yappy':
+                    payment_response = tilopay_service.create_yappy_payment(
+                        payment.order, payment.yappy_phone, expires_at=payment.expires_at, split=split
+                    )
+                else:
+                    payment_response = tilopay_service.create_card_payment(
+                        payment.order, expires_at=payment.expires_at, split=split
+                    )
+        except Exception as e:
+            logger.error(f"Checkout failed for payment {payment.id}: {e}")
+            payment.status = 'failed'
+            payment.payment_data = {'checkout_error': str(e)}
+            Payment.objects.filter(id=payment.id, status__in=('pending', 'processing')).update(
+                status=payment.status, payment_data=payment.payment_data, updated_at=now
+            )
+            raise Exception(f"Error al procesar pago: {e}")
+
+        payment.status = 'pending'
+        payment.tilopay_order_id = payment_response.get('order_id')
+        payment.tilopay_payment_url = payment_response.get('payment_url') or ''
+        payment.payment_initiated_at = now
+        payment.payment_data = {'tilopay_expires_at': payment_response.get('expires_at')}
+        # El libro de comisiones se arma con el split que recibió Tilopay
+        payment.split_payment_data = split_snapshot(split)
+
+        # Un pago que el barrido ya expiró no se reabre
+        Payment.objects.filter(id=payment.id, status__in=('pending', 'processing')).update(
+            status=payment.status,
+            tilopay_order_id=payment.tilopay_order_id,
+            tilopay_payment_url=payment.tilopay_payment_url,
+            payment_initiated_at=now,
+            payment_data=payment.payment_data,
+            split_payment_data=payment.split_payment_data,
+            updated_at=now
+        )
+
+    @staticmethod
+    def state(payment: Payment) -> Dict[str, Any]:
+        """Estado del checkout para la respuesta o el polling"""
+        return {
+            'id': str(payment.id),
+            'status': payment.status,
+            'payment_url': payment.tilopay_payment_url or None,
+            'order_id': payment.tilopay_order_id,
+            'expires_at': payment.expires_at.isoformat() if payment.expires_at else None,
+            'error': (payment.payment_data or {}).get('checkout_error')
+        }
+
+
+def submit_checkout(payment_id, client: Dict[str, Any] = None):
+    """Encolar la creación de la sesión cuando se confirme la transacción"""
+    transaction.on_commit(lambda: _submit(payment_id, client or {}))
+
+
+def _get_executor():
+    global _executor, _executor_pid, _slots
+
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.CHECKOUT_WORKERS,
+                    thread_name_prefix='checkout'
+                )
+                _slots = threading.BoundedSemaphore(settings.CHECKOUT_MAX_PENDING)
+                _executor_pid = pid
+    return _executor, _slots
+
+
+def _submit(payment_id, client):
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        # Cola llena: crear la sesión en el propio request en vez de acumular trabajo
+        logger.warning(f"Checkout queue full, creating session inline for payment {payment_id}")
+        _run_checkout(payment_id, client)
+        return
+    executor.submit(_run_in_background, payment_id, client, slots)
+
+
+def _run_in_background(payment_id, client, slots):
+    try:
+        _run_checkout(payment_id, client)
+    finally:
+        slots.release()
+        connection.close()
+
+
+def _run_checkout(payment_id, client):
+    try:
+        payment = Payment.objects.select_related('order__customer').get(id=payment_id, status='processing')
+    except Payment.DoesNotExist:
+        return
+    try:
+        with attempt_context(**client):
+            CheckoutService().create_session(payment)
+    except Exception:
+        pass  # Ya registrado y marcado como 'failed'
@@ -0,0 +1,143 @@
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from ..models import Payment, Commission
+from .tilopay_service import TilopayService
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_METHOD_USED = {
+    'tilopay_card': 'card',
+    'tilopay_yappy': 'yappy',
+    'cash': 'cash',
+}
+
+
+def split_snapshot(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Copia de compute_split para Payment.split_payment_data
+
+    sent indica si la parte viajó en el split de Tilopay (tiene subcomercio).
+    """
+    return {
+        'entries': [
+            {
+                'commission_type': entry['commission_type'],
+                'recipient_id': str(entry['recipient_id']) if entry['recipient_id'] else None,
+                'submerchant_id': entry['submerchant_id'],
+                'amount': str(entry['amount']),
+                'percentage': str(entry['percentage']),
+                'sent': entry['submerchant_key'] is not None,
+            }
+            for entry in entries
+        ]
+    }
+
+
+class CommissionLedger:
+    """
+    Genera las filas de Commission de los pagos completados a partir del
+    split guardado al crear la sesión de Tilopay (un bulk_create por lote).
+    """
+
+    def __init__(self):
+        self.tilopay_service = TilopayService()
+
+    def split_entries(self, payment) -> List[Dict[str, Any]]:
+        """
+        Partes del pago: las guardadas en split_payment_data o, para pagos en
+        efectivo o anteriores a la copia, el reparto actual sin partes enviadas
+        """
+        saved = (payment.split_payment_data or {}).get('entries')
+        if saved is not None:
+            return [
+                {**entry, 'amount': Decimal(entry['amount']), 'percentage': Decimal(entry['percentage'])}
+                for entry in saved
+            ]
+
+        return [
+            {**entry, 'sent': False}
+            for entry in self.tilopay_service.compute_split(payment.order)
+        ]
+
+    def build_commissions(self, payment) -> List[Commission]:
+        now = timezone.now()
+        commissions = []
+
+        for entry in self.split_entries(payment):
+            # Lo que Tilopay repartió en el split ya quedó pagado; el resto se liquida aparte
+            settled = payment.payment_method != 'cash' and entry['sent']
+            commissions.append(Commission(
+                payment=payment,
+                order=payment.order,
+                commission_type=entry['commission_type'],
+                recipient_id=entry['recipient_id'],
+                amount=entry['amount'],
+                percentage=entry['percentage'],
+                status='completed' if settled else 'pending',
+                tilopay_submerchant_id=entry['submerchant_id'],
+                payment_method_used=PAYMENT_METHOD_USED.get(payment.payment_method, ''),
+                paid_at=now if settled else None
+            ))
+
+        return commissions
+
+    def record_for_payments(self, payments: Iterable[Payment]) -> int:
+        """Crear las comisiones de los pagos dados; las que ya existen se ignoran"""
+        commissions = []
+        for payment in payments:
+            commissions.extend(self.build_commissions(payment))
+
+        Commission.objects.bulk_create(commissions, ignore_conflicts=True)
+        return len(commissions)
+
+    def record_for_payment_ids(self, payment_ids) -> int:
+        payments = Payment.objects.filter(
+            id__in=payment_ids, status='completed'
+        ).select_related('order')
+        return self.record_for_payments(payments)
+
+    def record_completed(self, payment_ids) -> int:
+        """
+        Registrar comisiones sin afectar la transacción que completó los pagos
+
+        Un error aquí solo se registra en el log; backfill_commissions
+        completa lo que falte.
+        """
+        if not payment_ids:
+            return 0
+        try:
+            with transaction.atomic():
+                return self.record_for_payment_ids(payment_ids)
+        except Exception as e:
+            logger.error(f"Commission ledger failed for payments {list(payment_ids)}: {e}")
+            return 0
+
+    def backfill(self, chunk_size: int = 500, since=None) -> int:
+        """Generar comisiones de pagos completados históricos, por bloques de chunk_size"""
+        queryset = Payment.objects.filter(status='completed').filter(
+            ~Exists(Commission.objects.filter(payment=OuterRef('pk')))
+        )
+        if since:
+            queryset = queryset.filter(created_at__gte=since)
+
+        created = 0
+        last_pk = None
+        while True:
+            chunk = queryset.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            payments = list(chunk.select_related('order')[:chunk_size])
+            if not payments:
+                break
+
+            with transaction.atomic():
+                created += self.record_for_payments(payments)
+            last_pk = payments[-1].pk
+            logger.info(f"Commission backfill: {created} rows created so far")
+
+        return created
@@ -0,0 +1,126 @@
+import logging
+from datetime import timedelta
+from typing import Dict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderStatusHistory
+from apps.orders.services.order_events import order_status_event, PAYMENT_RETRY_ACTION
+from apps.outbox.services.publisher import publish_many
+from apps.tracking.services.geofence_service import GeofenceService
+from ..models import Payment
+from .payment_events import payment_event
+
+logger = logging.getLogger(__name__)
+
+EXPIRED_ORDER_ACTIONS = ('cancel', 'reopen')
+
+# 'processing': checkouts asíncronos cuya sesión nunca se creó
+EXPIRABLE_PAYMENT_STATUSES = ('pending', 'processing')
+
+# Notas del historial; el webhook usa la de cancelación para reabrir la orden si Tilopay cobró tarde
+EXPIRY_CANCELLATION_NOTE = 'Cancelado automáticamente: el pago expiró'
+EXPIRY_REOPEN_NOTE = 'El pago expiró: la orden sigue pendiente para reintentar el pago'
+
+
+class PaymentExpirySweeper:
+    """
+    Marca como expirados los pagos pendientes o en proceso vencidos (índice status + expires_at)
+
+    Cada lote se resuelve con un UPDATE para los pagos, uno para las órdenes
+    y un bulk_create para el historial y otro para los eventos del outbox.
+    Tilopay recibe el mismo expires_at; el margen PAYMENT_EXPIRY_GRACE_SECONDS
+    deja llegar los webhooks de pagos cobrados justo antes del vencimiento.
+
+    order_action (PAYMENT_EXPIRED_ORDER_ACTION): 'cancel' cancela las órdenes
+    pendientes; 'reopen' las deja pendientes y avisa al cliente que puede
+    reintentar el pago. En ambos casos queda una fila de historial y un
+    evento 'order.status_changed'.
+    """
+
+    def __init__(self, batch_size: int = None, order_action: str = None, grace_seconds: int = None):
+        self.batch_size = batch_size or settings.PAYMENT_EXPIRY_BATCH_SIZE
+        self.grace = timedelta(seconds=(
+            settings.PAYMENT_EXPIRY_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        ))
+        self.order_action = order_action or settings.PAYMENT_EXPIRED_ORDER_ACTION
+        if self.order_action not in EXPIRED_ORDER_ACTIONS:
+            raise ValueError(f"Invalid expired order action: {self.order_action}")
+
+    def sweep(self, max_batches: int = None) -> Dict[str, int]:
+        totals = {'expired': 0, 'orders_cancelled': 0, 'orders_reopened': 0}
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            result = self.sweep_batch()
+            batches += 1
+            for key, value in result.items():
+                totals[key] += value
+            if result['expired'] < self.batch_size:
+                break
+
+        if totals['expired']:
+            logger.info(f"Payment expiry sweep finished: {totals}")
+        return totals
+
+    def sweep_batch(self) -> Dict[str, int]:
+        now = timezone.now()
+
+        with transaction.atomic():
+            rows = list(
+                Payment.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                    status__in=EXPIRABLE_PAYMENT_STATUSES,
+                    expires_at__lte=now - self.grace
+                ).order_by('expires_at').values_list(
+                    'id', 'order_id', 'customer_id', 'order__order_number'
+                )[:self.batch_size]
+            )
+            if not rows:
+                return {'expired': 0, 'orders_cancelled': 0, 'orders_reopened': 0}
+
+            expired = Payment.objects.filter(
+                id__in=[row[0] for row in rows]
+            ).update(status='expired', updated_at=now)
+
+            # Solo las órdenes que siguen esperando el pago
+            pending_ids = set(
+                Order.objects.select_for_update().filter(
+                    id__in=[row[1] for row in rows], status='pending'
+                ).values_list('id', flat=True)
+            )
+            affected = [row for row in rows if row[1] in pending_ids]
+
+            if self.order_action == 'cancel':
+                Order.objects.filter(id__in=pending_ids).update(status='cancelled', updated_at=now)
+                GeofenceService.invalidate_orders(pending_ids)
+                history_status, notes = 'cancelled', EXPIRY_CANCELLATION_NOTE
+                # El cliente es quien cancela: lo avisa 'payment.expired' y la
+                # orden solo notifica al negocio y al conductor
+                order_events = [
+                    order_status_event(order_id, 'cancelled', 'pending', changed_by_id=customer_id)
+                    for _, order_id, customer_id, _ in affected
+                ]
+            else:
+                Order.objects.filter(id__in=pending_ids).update(updated_at=now)
+                history_status, notes = 'pending', EXPIRY_REOPEN_NOTE
+                # El aviso de reintentar el pago sale con el evento de la orden
+                order_events = [
+                    order_status_event(order_id, 'pending', 'pending', action_type=PAYMENT_RETRY_ACTION)
+                    for _, order_id, _, _ in affected
+                ]
+
+            OrderStatusHistory.objects.bulk_create([
+                OrderStatusHistory(order_id=order_id, status=history_status, changed_by_id=customer_id, notes=notes)
+                for _, order_id, customer_id, _ in affected
+            ])
+
+            publish_many([
+                payment_event('expired', payment_id, order_id, customer_id, order_number,
+                              order_cancelled=self.order_action == 'cancel' and order_id in pending_ids,
+                              order_reopened=self.order_action == 'reopen' and order_id in pending_ids)
+                for payment_id, order_id, customer_id, order_number in rows
+            ] + order_events)
+
+        cancelled = len(pending_ids) if self.order_action == 'cancel' else 0
+        return {'expired': expired, 'orders_cancelled': cancelled, 'orders_reopened': len(pending_ids) - cancelled}
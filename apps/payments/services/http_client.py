@@ -0,0 +1,75 @@
+import logging
+import os
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Solo estos métodos se reintentan ante errores de lectura o 5xx.
+# Un POST solo se reintenta si la conexión nunca se estableció.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+class JitteredRetry(Retry):
+    """Retry con backoff exponencial y jitter completo"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+def get_session() -> requests.Session:
+    """
+    Sesión HTTP compartida por proceso (keep-alive + pool de conexiones)
+
+    Se crea una sola vez por worker; si el proceso hace fork se crea una
+    nueva para no compartir sockets con el padre.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+                logger.info(f"Tilopay HTTP session created (pool size {settings.TILOPAY_POOL_MAXSIZE})")
+    return _session
+
+
+def get_timeout():
+    """Timeouts separados (conexión, lectura) para las llamadas a Tilopay"""
+    return (settings.TILOPAY_CONNECT_TIMEOUT, settings.TILOPAY_READ_TIMEOUT)
+
+
+def _build_session() -> requests.Session:
+    retry = JitteredRetry(
+        total=settings.TILOPAY_MAX_RETRIES,
+        connect=settings.TILOPAY_MAX_RETRIES,
+        read=settings.TILOPAY_MAX_RETRIES,
+        status=settings.TILOPAY_MAX_RETRIES,
+        backoff_factor=settings.TILOPAY_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.TILOPAY_POOL_MAXSIZE,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
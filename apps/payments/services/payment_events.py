@@ -0,0 +1,16 @@
+from apps.outbox.models import OutboxEvent
+from apps.outbox.services.publisher import build_event
+
+# Cambios de estado de Payment que se publican en el outbox
+PUBLISHED_PAYMENT_STATUSES = ('completed', 'failed', 'cancelled', 'expired')
+
+
+def payment_event(status: str, payment_id, order_id, customer_id, order_number, **extra) -> OutboxEvent:
+    """Evento 'payment.<status>' con lo que necesitan los handlers sin volver a consultar"""
+    return build_event(f'payment.{status}', 'payment', payment_id, {
+        'payment_id': str(payment_id),
+        'order_id': str(order_id),
+        'customer_id': str(customer_id),
+        'order_number': order_number,
+        **extra
+    })
@@ -0,0 +1,105 @@
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Any, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from ..models import Payment
+
+logger = logging.getLogger(__name__)
+
+STATS_STATUSES = ('completed', 'pending', 'failed', 'refunded')
+
+
+def parse_stats_datetime(value: Optional[str], end_of_day: bool = False):
+    """
+    Convertir 'YYYY-MM-DD' o un datetime ISO a datetime con zona horaria
+
+    Con end_of_day una fecha sola se toma como el inicio del día siguiente
+    (límite exclusivo). Lanza ValueError si el valor no es válido.
+    """
+    if not value:
+        return None
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        if end_of_day:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class PaymentStats:
+    """
+    Estadísticas de pagos en una sola consulta agrupada por estado y método,
+    cacheadas por alcance (rol del usuario + filtros) durante unos segundos.
+    """
+
+    def __init__(self, queryset, scope: str):
+        self.queryset = queryset
+        self.scope = scope
+        self.ttl = settings.PAYMENT_STATS_CACHE_TTL
+
+    def get(self, date_from=None, date_to=None, business_id=None) -> Dict[str, Any]:
+        key = self.cache_key(date_from, date_to, business_id)
+        stats = cache.get(key)
+        if stats is None:
+            stats = self.compute(date_from, date_to, business_id)
+            if self.ttl:
+                cache.set(key, stats, self.ttl)
+        return stats
+
+    def cache_key(self, date_from, date_to, business_id) -> str:
+        start = date_from.isoformat() if date_from else ''
+        end = date_to.isoformat() if date_to else ''
+        return f"payment_stats:{self.scope}:{business_id or ''}:{start}:{end}"
+
+    def compute(self, date_from=None, date_to=None, business_id=None) -> Dict[str, Any]:
+        queryset = self.queryset
+        if date_from:
+            queryset = queryset.filter(created_at__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(created_at__lt=date_to)
+        if business_id:
+            queryset = queryset.filter(order__business_id=business_id)
+
+        rows = queryset.order_by().values('status', 'payment_method').annotate(
+            count=Count('id'),
+            amount=Sum('amount')
+        )
+
+        by_status = {value: {'count': 0, 'amount': Decimal('0')} for value, _ in Payment.PAYMENT_STATUS}
+        methods = {value: {'count': 0, 'amount': Decimal('0')} for value, _ in Payment.PAYMENT_METHODS}
+        total = 0
+
+        for row in rows:
+            amount = row['amount'] or Decimal('0')
+            total += row['count']
+
+            status_totals = by_status.setdefault(row['status'], {'count': 0, 'amount': Decimal('0')})
+            status_totals['count'] += row['count']
+            status_totals['amount'] += amount
+
+            # Por método solo cuentan los pagos completados
+            if row['status'] == 'completed':
+                method_totals = methods.setdefault(row['payment_method'], {'count': 0, 'amount': Decimal('0')})
+                method_totals['count'] += row['count']
+                method_totals['amount'] += amount
+
+        stats = {'total_payments': total}
+        for value in STATS_STATUSES:
+            stats[f'{value}_payments'] = by_status[value]['count']
+        stats['total_amount'] = by_status['completed']['amount']
+        stats['payment_methods'] = methods
+        stats['by_status'] = by_status
+        return stats
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Any, List, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.models import Order
+from apps.orders.services.order_events import order_status_event
+from apps.outbox.services.publisher import publish_many
+from apps.tracking.services.geofence_service import GeofenceService
+from ..models import Payment
+from .attempt_recorder import attempt_context
+from .commission_ledger import CommissionLedger
+from .payment_events import payment_event, PUBLISHED_PAYMENT_STATUSES
+from .tilopay_service import TilopayService
+from .webhook_processor import TILOPAY_STATUS_MAP
+
+logger = logging.getLogger(__name__)
+
+OPEN_PAYMENT_STATUSES = ('pending', 'processing')
+TILOPAY_METHODS = ('tilopay_card', 'tilopay_yappy')
+
+
+class RateLimiter:
+    """Token bucket compartido entre hilos (rate solicitudes por segundo)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class PaymentReconciler:
+    """
+    Concilia pagos pendientes cuyo webhook nunca llegó consultando a Tilopay.
+
+    Las consultas se hacen en paralelo con un pool acotado y limitadas por
+    segundo; los cambios se aplican en bloque (un UPDATE por estado) y cada
+    consulta queda registrada como PaymentAttempt por el AttemptRecorder.
+    """
+
+    def __init__(self, base_url: str = None, workers: int = None, rate: float = None,
+                 older_than_minutes: int = None, batch_size: int = None):
+        self.service = TilopayService(base_url=base_url)
+        self.workers = workers or settings.TILOPAY_RECONCILE_WORKERS
+        self.rate_limiter = RateLimiter(settings.TILOPAY_RECONCILE_RATE if rate is None else rate)
+        self.older_than = timedelta(minutes=(
+            settings.TILOPAY_RECONCILE_AFTER_MINUTES if older_than_minutes is None else older_than_minutes
+        ))
+        self.batch_size = batch_size or settings.TILOPAY_RECONCILE_BATCH_SIZE
+
+    def candidates(self, limit: int) -> List[Tuple]:
+        """(id, tilopay_order_id, payment_method) de los pagos abiertos más antiguos que el umbral"""
+        cutoff = timezone.now() - self.older_than
+        return list(
+            Payment.objects.filter(
+                status__in=OPEN_PAYMENT_STATUSES,
+                created_at__lt=cutoff,
+                payment_method__in=TILOPAY_METHODS,
+                tilopay_order_id__isnull=False
+            ).exclude(
+                tilopay_order_id=''
+            ).order_by('created_at').values_list(
+                'id', 'tilopay_order_id', 'payment_method'
+            )[:limit]
+        )
+
+    def run(self, limit: int = 1000) -> Dict[str, int]:
+        totals = {'checked': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        candidates = self.candidates(limit)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for start in range(0, len(candidates), self.batch_size):
+                batch = candidates[start:start + self.batch_size]
+                results = list(executor.map(self._fetch, batch))
+                for key, value in self._apply(batch, results).items():
+                    totals[key] += value
+
+        logger.info(f"Payment reconciliation finished: {totals}")
+        return totals
+
+    def _fetch(self, candidate: Tuple) -> Dict[str, Any]:
+        """Consultar un pago en Tilopay (se ejecuta en los hilos del pool, sin acceso a la BD)"""
+        payment_id, tilopay_order_id, payment_method = candidate
+        self.rate_limiter.acquire()
+        try:
+            # El servicio registra la consulta como PaymentAttempt
+            with attempt_context(payment_id=payment_id, payment_method=payment_method):
+                return {'data': self.service.get_payment_status(tilopay_order_id), 'error': ''}
+        except Exception as e:
+            return {'data': {}, 'error': str(e)}
+
+    def _apply(self, batch: List[Tuple], results: List[Dict[str, Any]]) -> Dict[str, int]:
+        counts = {'checked': len(batch), 'updated': 0, 'unchanged': 0, 'errors': 0}
+        now = timezone.now()
+        transitions = {}
+
+        for (payment_id, tilopay_order_id, payment_method), result in zip(batch, results):
+            remote_status = result['data'].get('status', '')
+            if result['error']:
+                counts['errors'] += 1
+
+            new_status = TILOPAY_STATUS_MAP.get(remote_status)
+            if new_status:
+                transitions.setdefault(new_status, []).append(payment_id)
+
+        with transaction.atomic():
+            # Solo los que siguen abiertos: un webhook pudo llegar mientras tanto
+            still_open = {
+                row[0]: row
+                for row in Payment.objects.select_for_update(of=('self',)).filter(
+                    id__in=[payment_id for ids in transitions.values() for payment_id in ids],
+                    status__in=OPEN_PAYMENT_STATUSES
+                ).values_list('id', 'order_id', 'customer_id', 'order__order_number')
+            }
+            events = []
+
+            for new_status, ids in transitions.items():
+                ids = [payment_id for payment_id in ids if payment_id in still_open]
+                if not ids:
+                    continue
+
+                fields = {'status': new_status, 'updated_at': now}
+                if new_status == 'completed':
+                    fields['payment_completed_at'] = now
+                counts['updated'] += Payment.objects.filter(id__in=ids).update(**fields)
+
+                if new_status == 'completed':
+                    confirmed = list(
+                        Order.objects.filter(payment__id__in=ids, status='pending').values_list('id', flat=True)
+                    )
+                    Order.objects.filter(id__in=confirmed, status='pending').update(status='confirmed', updated_at=now)
+                    GeofenceService.invalidate_orders(confirmed)
+                    events += [order_status_event(order_id, 'confirmed', 'pending') for order_id in confirmed]
+                    CommissionLedger().record_completed(ids)
+
+                if new_status in PUBLISHED_PAYMENT_STATUSES:
+                    events += [payment_event(new_status, *still_open[payment_id]) for payment_id in ids]
+
+            publish_many(events)
+
+        counts['unchanged'] = counts['checked'] - counts['updated'] - counts['errors']
+        return counts
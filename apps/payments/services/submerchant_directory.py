@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional, Tuple
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+from apps.businesses.models import Business
+from apps.users.models import User
+
+# En memoria: Redis (compartida) o por proceso con TTL corto, ver settings
+SUBMERCHANT_CACHE_ALIAS = 'shared'
+
+
+@dataclass(frozen=True)
+class SplitParty:
+    """Destinatario de un split; los campos submerchant_* son None si no tiene subcomercio"""
+    user_id: object
+    submerchant_id: Optional[int] = None
+    submerchant_key: Optional[str] = None
+    commission_rate: Optional[Decimal] = None
+
+
+class SubmerchantDirectory:
+    """
+    Resuelve el subcomercio del dueño del negocio y del conductor de una orden
+    con una sola consulta, cacheada por negocio y por usuario.
+
+    La caché se invalida con las señales de TilopaySubmerchant y Business
+    (apps/payments/signals.py) al confirmar la transacción, para que otra
+    instancia no vuelva a cachear el valor anterior.
+    """
+
+    @staticmethod
+    def cache():
+        return caches[SUBMERCHANT_CACHE_ALIAS]
+
+    @staticmethod
+    def business_key(business_id) -> str:
+        return f"submerchant:business:{business_id}"
+
+    @staticmethod
+    def user_key(user_id) -> str:
+        return f"submerchant:user:{user_id}"
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        keys = [cls.user_key(user_id)]
+        keys += [
+            cls.business_key(business_id)
+            for business_id in Business.objects.filter(owner_id=user_id).values_list('id', flat=True)
+        ]
+        transaction.on_commit(lambda: cls.cache().delete_many(keys))
+
+    @classmethod
+    def invalidate_business(cls, business_id):
+        key = cls.business_key(business_id)
+        transaction.on_commit(lambda: cls.cache().delete(key))
+
+    def for_order(self, order) -> Tuple[Optional[SplitParty], Optional[SplitParty]]:
+        """(dueño del negocio, conductor) de la orden; None si la orden no tiene esa parte"""
+        keys = {}
+        if order.business_id:
+            keys['business'] = self.business_key(order.business_id)
+        if order.driver_id:
+            keys['driver'] = self.user_key(order.driver_id)
+
+        cache = self.cache()
+        cached = cache.get_many(keys.values())
+        parties = {role: cached.get(key) for role, key in keys.items()}
+
+        missing = [role for role in keys if parties[role] is None]
+        if missing:
+            loaded = self._load(
+                order.business_id if 'business' in missing else None,
+                order.driver_id if 'driver' in missing else None
+            )
+            parties.update(loaded)
+            cache.set_many(
+                {keys[role]: party for role, party in loaded.items() if party},
+                settings.SUBMERCHANT_CACHE_TTL
+            )
+
+        return parties.get('business'), parties.get('driver')
+
+    def _load(self, business_id, driver_id):
+        """Una consulta sobre User con LEFT JOIN al subcomercio"""
+        condition = Q()
+        if business_id:
+            condition |= Q(businesses__id=business_id)
+        if driver_id:
+            condition |= Q(id=driver_id)
+
+        rows = User.objects.filter(condition).values_list(
+            'id',
+            'businesses__id',
+            'tilopay_submerchant__id',
+            'tilopay_submerchant__submerchant_key',
+            'tilopay_submerchant__commission_percentage'
+        )
+
+        loaded = {}
+        for user_id, row_business_id, submerchant_id, key, rate in rows:
+            party = SplitParty(user_id, submerchant_id, key, rate)
+            if business_id and row_business_id == business_id:
+                loaded['business'] = party
+            if driver_id and user_id == driver_id:
+                loaded['driver'] = party
+
+        return loaded
@@ -2,28 +2,98 @@ import requests
 import hashlib
 import hmac
 import json
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django.conf import settings
+from django.utils import timezone
 from typing import Dict, Any, Optional
 import logging
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from .attempt_recorder import get_recorder
+from .http_client import get_session, get_timeout
+from .submerchant_directory import SubmerchantDirectory
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PLATFORM_COMMISSION_RATE = Decimal('0.15')  # 15% por defecto
+DRIVER_DELIVERY_FEE_SHARE = Decimal('0.80')  # 80% del delivery fee
+
+
+def _money(amount: Decimal) -> Decimal:
+    return amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+# Campos de la respuesta que se guardan en PaymentAttempt: nunca datos del
+# cliente, enlaces de pago ni el split completo
+RECORDED_RESPONSE_FIELDS = ('status', 'order_id', 'error', 'error_code', 'code', 'message')
+MAX_RECORDED_VALUE_LENGTH = 500
+
+
+def _response_summary(response) -> Dict[str, Any]:
+    """Estado, id de la orden en Tilopay y código o mensaje de error de la respuesta"""
+    if response is None:
+        return {}
+    try:
+        data = response.json()
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {
+        field: data[field][:MAX_RECORDED_VALUE_LENGTH] if isinstance(data[field], str) else data[field]
+        for field in RECORDED_RESPONSE_FIELDS
+        if field in data and isinstance(data[field], (str, int, float, bool, type(None)))
+    }
+
+
 class TilopayService:
-    def __init__(self):
-        self.base_url = settings.TILOPAY_BASE_URL
+    def __init__(self, base_url: str = None):
+        self.base_url = base_url or settings.TILOPAY_BASE_URL
         self.api_key = settings.TILOPAY_API_KEY
         self.secret_key = settings.TILOPAY_SECRET_KEY
         self.platform_key = settings.TILOPAY_PLATFORM_KEY
+        self.session = get_session()
+        self.timeout = get_timeout()
+    
+    def _send(self, operation: str, method: str, path: str, attempt: Dict[str, Any] = None, **kwargs):
+        """Llamada HTTP a Tilopay; queda registrada como PaymentAttempt en segundo plano"""
+        started = time.monotonic()
+        response = None
+        error_message = ''
+        
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            if not response.ok:
+                error_message = f"HTTP {response.status_code}"
+            return response
+        except requests.exceptions.RequestException as e:
+            error_message = str(e)
+            raise
+        finally:
+            get_recorder().record(
+                operation=operation,
+                status='error' if error_message else 'success',
+                http_status=response.status_code if response is not None else None,
+                latency_ms=int((time.monotonic() - started) * 1000),
+                error_message=error_message,
+                request_data={'method': method, 'path': path},
+                response=_response_summary(response),
+                **(attempt or {})
+            )
     
-    def create_split_payment(self, order, payment_method: str, customer_phone: str = None) -> Dict[str, Any]:
+    def create_split_payment(self, order, payment_method: str, customer_phone: str = None,
+                             expires_at=None, split: list = None) -> Dict[str, Any]:
         """
         Crear pago con split usando Tilopay (Card o Yappy)
         payment_method: 'tilopay_card' o 'tilopay_yappy'
+        expires_at: vencimiento del Payment local, para que Tilopay no acepte el pago después
+        split: entradas de compute_split ya calculadas (las que se guardan en el Payment)
         """
         try:
+            expires_at = expires_at or timezone.now() + timedelta(minutes=settings.PAYMENT_EXPIRY_MINUTES)
             payment_amount = float(order.total)
-            split_data = self.calculate_split_amounts(order)
+            split_data = self.calculate_split_amounts(order, split)
             
             # Configurar método de pago específico
             payment_config = self._get_payment_method_config(payment_method, customer_phone)
@@ -35,7 +105,7 @@ class TilopayService:
                 "orderId": str(order.id),
                 "redirect_url": f"{settings.FRONTEND_URL}/payment/success?order_id={order.id}",
                 "cancel_url": f"{settings.FRONTEND_URL}/payment/cancel?order_id={order.id}",
-                "webhook_url": f"{settings.BACKEND_URL}/api/payments/tilopay/webhook/",
+                "webhook_url": f"{settings.BACKEND_URL}/api/payments/webhooks/tilopay/webhook/",
                 "capture": True,
                 "split": split_data,
                 "customer": {
@@ -43,7 +113,7 @@ class TilopayService:
                     "email": order.customer.email,
                     "phone": order.customer.phone
                 },
-                "expires_at": (datetime.now() + timedelta(hours=1)).isoformat(),  # Expira en 1 hora
+                "expires_at": expires_at.isoformat(),
                 **payment_config  # Agregar configuración específica del método de pago
             }
             
@@ -53,11 +123,11 @@ class TilopayService:
                 'X-Platform-Key': self.platform_key
             }
             
-            response = requests.post(
-                f"{self.base_url}/v2/orders",
+            response = self._send(
+                'create', 'POST', '/v2/orders',
+                attempt={'payment_method': payment_method, 'order_id': str(order.id)},
                 json=payload,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             response.raise_for_status()
@@ -95,13 +165,13 @@ class TilopayService:
         
         return config
     
-    def create_yappy_payment(self, order, customer_phone: str) -> Dict[str, Any]:
+    def create_yappy_payment(self, order, customer_phone: str, expires_at=None, split: list = None) -> Dict[str, Any]:
         """Crear pago específico para Yappy"""
-        return self.create_split_payment(order, 'tilopay_yappy', customer_phone)
+        return self.create_split_payment(order, 'tilopay_yappy', customer_phone, expires_at=expires_at, split=split)
     
-    def create_card_payment(self, order) -> Dict[str, Any]:
+    def create_card_payment(self, order, expires_at=None, split: list = None) -> Dict[str, Any]:
         """Crear pago específico para tarjetas"""
-        return self.create_split_payment(order, 'tilopay_card')
+        return self.create_split_payment(order, 'tilopay_card', expires_at=expires_at, split=split)
     
     def verify_webhook_signature(self, payload: str, signature: str) -> bool:
         """Verificar firma del webhook de Tilopay"""
@@ -125,10 +195,10 @@ class TilopayService:
                 'X-Platform-Key': self.platform_key
             }
             
-            response = requests.get(
-                f"{self.base_url}/v2/orders/{tilopay_order_id}",
-                headers=headers,
-                timeout=30
+            response = self._send(
+                'status', 'GET', f"/v2/orders/{tilopay_order_id}",
+                attempt={'tilopay_order_id': tilopay_order_id},
+                headers=headers
             )
             
             response.raise_for_status()
@@ -154,11 +224,11 @@ class TilopayService:
                 'X-Platform-Key': self.platform_key
             }
             
-            response = requests.post(
-                f"{self.base_url}/v2/orders/{tilopay_order_id}/refund",
+            response = self._send(
+                'refund', 'POST', f"/v2/orders/{tilopay_order_id}/refund",
+                attempt={'tilopay_order_id': tilopay_order_id},
                 json=payload,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             response.raise_for_status()
@@ -168,52 +238,91 @@ class TilopayService:
             logger.error(f"Failed to refund payment {tilopay_order_id}: {e}")
             raise Exception(f"Failed to refund payment: {e}")
     
-    def calculate_split_amounts(self, order) -> list:
+    def calculate_split_amounts(self, order, entries: list = None) -> list:
         """
         Calcular montos para split payment con soporte para diferentes comisiones
+
+        entries: resultado de compute_split si ya se calculó
         """
-        total_amount = float(order.total)
-        split_data = []
+        if entries is None:
+            entries = self.compute_split(order)
+
+        split_data = [
+            {
+                "submerchant_key": entry['submerchant_key'],
+                "amount": float(entry['amount']),
+                "description": entry['description']
+            }
+            for entry in entries
+            if entry['submerchant_key'] is not None
+        ]
+        
+        logger.info(f"Split calculation for order {order.id}: {split_data}")
+        return split_data
+    
+    def compute_split(self, order) -> list:
+        """
+        Reparto de una orden entre negocio, conductor y plataforma
+        
+        Es la fuente del split enviado a Tilopay; el checkout guarda una copia
+        en Payment.split_payment_data y el libro de comisiones se arma con
+        ella (ver commission_ledger.split_snapshot). Cada entrada trae commission_type, recipient_id,
+        submerchant_id, submerchant_key, amount, percentage y description;
+        submerchant_key es None si la parte no tiene subcomercio en Tilopay.
+        """
+        total_amount = Decimal(order.total)
+        entries = []
+        
+        business_party, driver_party = SubmerchantDirectory().for_order(order)
         
         # Comisión base de la plataforma (configurable por negocio)
-        if order.business and hasattr(order.business.owner, 'tilopay_submerchant'):
-            submerchant = order.business.owner.tilopay_submerchant
-            platform_commission_rate = float(submerchant.commission_percentage)
+        if business_party and business_party.submerchant_id:
+            platform_commission_rate = Decimal(business_party.commission_rate)
         else:
-            platform_commission_rate = 0.15  # 15% por defecto
+            platform_commission_rate = DEFAULT_PLATFORM_COMMISSION_RATE
         
-        platform_commission = total_amount * platform_commission_rate
+        platform_commission = _money(total_amount * platform_commission_rate)
         business_amount = total_amount - platform_commission
         
-        # Split para el negocio (recibe el monto menos la comisión de plataforma)
-        if order.business and hasattr(order.business.owner, 'tilopay_submerchant'):
-            split_data.append({
-                "submerchant_key": order.business.owner.tilopay_submerchant.submerchant_key,
-                "amount": round(business_amount, 2),
-                "description": f"Venta - Pedido #{order.order_number}"
+        # El negocio recibe el monto menos la comisión de plataforma
+        if business_party:
+            entries.append({
+                'commission_type': 'business',
+                'recipient_id': business_party.user_id,
+                'submerchant_id': business_party.submerchant_id,
+                'submerchant_key': business_party.submerchant_key,
+                'amount': business_amount,
+                'percentage': 1 - platform_commission_rate,
+                'description': f"Venta - Pedido #{order.order_number}"
             })
         
         # Si hay conductor, calcular su comisión del delivery fee
-        driver_commission = 0
-        if order.driver and hasattr(order.driver, 'tilopay_submerchant') and order.delivery_fee > 0:
-            driver_commission = float(order.delivery_fee) * 0.80  # 80% del delivery fee
+        if driver_party and driver_party.submerchant_id and order.delivery_fee > 0:
+            driver_commission = _money(Decimal(order.delivery_fee) * DRIVER_DELIVERY_FEE_SHARE)
             platform_commission -= driver_commission  # Reducir comisión de plataforma
             
-            split_data.append({
-                "submerchant_key": order.driver.tilopay_submerchant.submerchant_key,
-                "amount": round(driver_commission, 2),
-                "description": f"Delivery - Pedido #{order.order_number}"
+            entries.append({
+                'commission_type': 'driver',
+                'recipient_id': driver_party.user_id,
+                'submerchant_id': driver_party.submerchant_id,
+                'submerchant_key': driver_party.submerchant_key,
+                'amount': driver_commission,
+                'percentage': DRIVER_DELIVERY_FEE_SHARE,
+                'description': f"Delivery - Pedido #{order.order_number}"
             })
         
-        # Split para la plataforma (comisión restante)
-        split_data.append({
-            "submerchant_key": settings.TILOPAY_PLATFORM_SUBMERCHANT_KEY,
-            "amount": round(platform_commission, 2),
-            "description": f"Comisión plataforma - Pedido #{order.order_number}"
+        # Comisión restante para la plataforma
+        entries.append({
+            'commission_type': 'platform',
+            'recipient_id': None,
+            'submerchant_id': None,
+            'submerchant_key': settings.TILOPAY_PLATFORM_SUBMERCHANT_KEY,
+            'amount': platform_commission,
+            'percentage': platform_commission_rate,
+            'description': f"Comisión plataforma - Pedido #{order.order_number}"
         })
         
-        logger.info(f"Split calculation for order {order.id}: {split_data}")
-        return split_data
+        return entries
     
     def create_submerchant(self, user, business_data: Dict[str, Any]) -> Dict[str, Any]:
         """Crear submerchant en Tilopay"""
@@ -234,11 +343,10 @@ class TilopayService:
                 'X-Platform-Key': self.platform_key
             }
             
-            response = requests.post(
-                f"{self.base_url}/v2/submerchants",
+            response = self._send(
+                'submerchant', 'POST', '/v2/submerchants',
                 json=payload,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             response.raise_for_status()
@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+from typing import Dict, Any
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Payment, WebhookEvent
+from apps.orders.models import OrderStatusHistory
+from apps.outbox.services.publisher import publish_many
+from .commission_ledger import CommissionLedger
+from .expiry import EXPIRY_CANCELLATION_NOTE
+from .payment_events import payment_event, PUBLISHED_PAYMENT_STATUSES
+from apps.orders.services.order_events import order_status_event
+
+logger = logging.getLogger(__name__)
+
+# Estados de Tilopay -> estados locales de Payment
+TILOPAY_STATUS_MAP = {
+    'completed': 'completed',
+    'failed': 'failed',
+    'cancelled': 'cancelled',
+    'expired': 'expired',
+}
+
+# Un pago en estos estados ya no cambia por webhook
+FINAL_PAYMENT_STATUSES = ('completed', 'failed', 'refunded', 'cancelled', 'expired')
+
+RETRY_BASE_SECONDS = 30
+
+_drain_lock = threading.Lock()
+
+
+def webhook_event_id(webhook_data: Dict[str, Any], raw_body: bytes) -> str:
+    """ID para deduplicar: el del proveedor o un hash del cuerpo recibido"""
+    event_id = webhook_data.get('event_id') or webhook_data.get('id')
+    if event_id:
+        return str(event_id)[:100]
+    return hashlib.sha256(raw_body).hexdigest()
+
+
+def schedule_drain():
+    """
+    Procesar la bandeja en un hilo de fondo al confirmar la transacción
+
+    Si ya hay un hilo drenando no se crea otro. El comando
+    process_tilopay_webhooks cubre lo que quede pendiente.
+    """
+    if settings.TILOPAY_WEBHOOK_INLINE_DRAIN:
+        transaction.on_commit(_start_drain_thread)
+
+
+def _start_drain_thread():
+    if not _drain_lock.acquire(blocking=False):
+        return
+    threading.Thread(target=_drain_in_background, daemon=True).start()
+
+
+def _drain_in_background():
+    try:
+        WebhookProcessor().drain()
+    except Exception as e:
+        logger.error(f"Background webhook drain failed: {e}")
+    finally:
+        connection.close()
+        _drain_lock.release()
+
+
+class WebhookProcessor:
+    """Aplica los eventos de WebhookEvent a Payment/Order de forma idempotente"""
+
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size or settings.TILOPAY_WEBHOOK_BATCH_SIZE
+        self.max_attempts = settings.TILOPAY_WEBHOOK_MAX_ATTEMPTS
+
+    def drain(self, max_batches: int = None) -> Dict[str, int]:
+        """Procesar lotes hasta vaciar la bandeja (o hasta max_batches)"""
+        totals = {'processed': 0, 'ignored': 0, 'failed': 0, 'retry': 0}
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            result = self.process_batch()
+            batches += 1
+            for key, value in result.items():
+                totals[key] += value
+            if sum(result.values()) < self.batch_size:
+                break
+
+        return totals
+
+    def process_batch(self) -> Dict[str, int]:
+        """Procesar un lote bloqueando los eventos (SKIP LOCKED) y sus pagos"""
+        result = {'processed': 0, 'ignored': 0, 'failed': 0, 'retry': 0}
+        now = timezone.now()
+
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True).filter(
+                    status='pending',
+                    next_attempt_at__lte=now
+                ).order_by('next_attempt_at')[:self.batch_size]
+            )
+            if not events:
+                return result
+
+            payments = {
+                payment.tilopay_order_id: payment
+                for payment in Payment.objects.select_for_update().select_related('order').filter(
+                    tilopay_order_id__in={event.tilopay_order_id for event in events}
+                )
+            }
+            previous_status = {payment.id: payment.status for payment in payments.values()}
+            previous_order_status = {payment.id: payment.order.status for payment in payments.values()}
+
+            for event in events:
+                event.attempts += 1
+                try:
+                    outcome = self._apply(event, payments.get(event.tilopay_order_id), now)
+                except Exception as e:
+                    logger.error(f"Webhook event {event.id} failed: {e}")
+                    event.error_message = str(e)
+                    outcome = 'retry'
+
+                if outcome == 'retry':
+                    if event.attempts >= self.max_attempts:
+                        event.status = 'failed'
+                        outcome = 'failed'
+                    else:
+                        event.next_attempt_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (event.attempts - 1))
+                else:
+                    event.status = outcome
+                    event.processed_at = now
+                result[outcome] += 1
+
+            WebhookEvent.objects.bulk_update(
+                events, ['status', 'attempts', 'error_message', 'next_attempt_at', 'processed_at']
+            )
+
+            CommissionLedger().record_completed([
+                payment.id for payment in payments.values()
+                if payment.status == 'completed' and payment.payment_completed_at == now
+            ])
+
+            publish_many([
+                payment_event(payment.status, payment.id, payment.order_id, payment.customer_id,
+                              payment.order.order_number)
+                for payment in payments.values()
+                if payment.status != previous_status[payment.id] and payment.status in PUBLISHED_PAYMENT_STATUSES
+            ] + [
+                order_status_event(payment.order_id, payment.order.status, previous_order_status[payment.id])
+                for payment in payments.values()
+                if payment.order.status != previous_order_status[payment.id]
+            ])
+
+        logger.info(f"Webhook batch processed: {result}")
+        return result
+
+    def _apply(self, event: WebhookEvent, payment, now) -> str:
+        """Aplicar un evento; devuelve 'processed', 'ignored' o 'retry'"""
+        if payment is None:
+            # El pago puede no tener aún el ID de Tilopay: reintentar más tarde
+            event.error_message = 'Payment not found'
+            return 'retry'
+
+        new_status = TILOPAY_STATUS_MAP.get(event.payload.get('status'))
+        if not new_status:
+            event.error_message = f"Unhandled status: {event.payload.get('status')}"
+            return 'ignored'
+
+        if payment.status == new_status:
+            return 'processed'  # Reintento de Tilopay ya aplicado
+
+        # Tilopay cobró un pago que el barrido ya había expirado: el cobro manda
+        late_capture = payment.status == 'expired' and new_status == 'completed'
+        if payment.status in FINAL_PAYMENT_STATUSES and not late_capture:
+            event.error_message = f"Payment already {payment.status}"
+            return 'ignored'
+
+        payment.status = new_status
+        payment.webhook_received = True
+        payment.webhook_data = event.payload
+        payment.webhook_attempts += 1
+        update_fields = ['status', 'webhook_received', 'webhook_data', 'webhook_attempts', 'updated_at']
+
+        if new_status == 'completed':
+            payment.payment_completed_at = now
+            update_fields.append('payment_completed_at')
+
+        payment.save(update_fields=update_fields)
+
+        if new_status == 'completed' and payment.order.status == 'pending':
+            payment.order.status = 'confirmed'
+            payment.order.save(update_fields=['status', 'updated_at'])
+        elif late_capture and payment.order.status == 'cancelled':
+            self._reopen_cancelled_order(payment)
+
+        logger.info(f"Payment {payment.id} {new_status} via webhook")
+        return 'processed'
+
+    def _reopen_cancelled_order(self, payment):
+        """
+        Reabrir la orden cancelada por la expiración del pago
+
+        Si la canceló otra persona no se reabre: el pago queda marcado con
+        refund_required para reembolsarlo.
+        """
+        order = payment.order
+        last_change = order.status_history.order_by('-timestamp', '-id').first()
+
+        if last_change is None or last_change.notes != EXPIRY_CANCELLATION_NOTE:
+            payment.payment_data = {**(payment.payment_data or {}), 'refund_required': True}
+            payment.save(update_fields=['payment_data', 'updated_at'])
+            logger.warning(f"Payment {payment.id} completed for cancelled order {order.id}: refund required")
+            return
+
+        order.status = 'confirmed'
+        order.save(update_fields=['status', 'updated_at'])
+        OrderStatusHistory.objects.create(
+            order=order,
+            status='confirmed',
+            changed_by_id=payment.customer_id,
+            notes='Reabierto: Tilopay confirmó el pago después de expirar'
+        )
+        logger.info(f"Order {order.id} reopened: payment {payment.id} completed after expiring")
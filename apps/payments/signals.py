@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.businesses.models import Business
+from .models import TilopaySubmerchant
+from .services.submerchant_directory import SubmerchantDirectory
+
+
+@receiver([post_save, post_delete], sender=TilopaySubmerchant)
+def invalidate_submerchant(sender, instance, **kwargs):
+    """Descartar el subcomercio cacheado del usuario y de sus negocios"""
+    SubmerchantDirectory.invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Business)
+def invalidate_business_submerchant(sender, instance, **kwargs):
+    """El negocio pudo cambiar de dueño"""
+    SubmerchantDirectory.invalidate_business(instance.id)
@@ -0,0 +1,224 @@
+"""
+Simulador local de Tilopay para pruebas de carga y desarrollo
+
+Aplicación WSGI que implementa los endpoints que usa TilopayService
+(/v2/orders, estado, reembolso y /v2/submerchants) con latencia y tasa de
+fallos configurables, y que puede enviar webhooks firmados de vuelta a
+TilopayWebhookView. Se levanta con el comando run_tilopay_simulator.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import timedelta
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+
+import requests
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Tilopay-Signature'
+
+ROUTES = (
+    ('POST', re.compile(r'^/v2/orders/?$'), 'create_order'),
+    ('GET', re.compile(r'^/v2/orders/(?P<order_id>[^/]+)/?$'), 'get_order'),
+    ('POST', re.compile(r'^/v2/orders/(?P<order_id>[^/]+)/refund/?$'), 'refund_order'),
+    ('POST', re.compile(r'^/v2/orders/(?P<order_id>[^/]+)/(?P<status>complete|fail|cancel)/?$'), 'resolve_order'),
+    ('POST', re.compile(r'^/v2/submerchants/?$'), 'create_submerchant'),
+)
+
+RESOLVE_STATUSES = {'complete': 'completed', 'fail': 'failed', 'cancel': 'cancelled'}
+
+
+def sign_payload(secret_key: str, body: bytes) -> str:
+    """Firma HMAC-SHA256 (hex) del cuerpo, igual que verify_webhook_signature"""
+    return hmac.new(secret_key.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+class TilopaySimulator:
+    """
+    Estado en memoria de las órdenes simuladas
+
+    Args:
+        latency_ms: latencia base de cada respuesta
+        jitter_ms: variación aleatoria añadida a la latencia
+        failure_rate: probabilidad (0-1) de responder 503
+        secret_key: clave para firmar los webhooks
+        auto_webhook_delay: si no es None, segundos tras los que se envía
+            el webhook 'completed' de cada orden creada
+        webhook_sender: callable(url, body, headers); por defecto un POST HTTP
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, failure_rate: float = 0,
+                 secret_key: str = '', auto_webhook_delay=None, webhook_sender=None,
+                 public_url: str = 'http://localhost:8765'):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.secret_key = secret_key
+        self.auto_webhook_delay = auto_webhook_delay
+        self.webhook_sender = webhook_sender or self._post_webhook
+        self.public_url = public_url.rstrip('/')
+        self.orders = {}
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    # WSGI
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '')
+
+        with self.lock:
+            self.request_count += 1
+
+        self._sleep()
+        if self.failure_rate and random.random() < self.failure_rate:
+            return self._respond(start_response, 503, {'error': 'Simulated failure'})
+
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(path)
+            if match and method == route_method:
+                payload = self._read_json(environ)
+                status, body = getattr(self, handler)(payload, **match.groupdict())
+                return self._respond(start_response, status, body)
+
+        return self._respond(start_response, 404, {'error': 'Not found'})
+
+    def _sleep(self):
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    @staticmethod
+    def _read_json(environ):
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if not length:
+            return {}
+        try:
+            return json.loads(environ['wsgi.input'].read(length))
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def _respond(start_response, status, body):
+        data = json.dumps(body).encode('utf-8')
+        reason = {200: 'OK', 201: 'Created', 404: 'Not Found', 503: 'Service Unavailable'}.get(status, '')
+        start_response(f'{status} {reason}', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(data))),
+        ])
+        return [data]
+
+    # Endpoints
+
+    def create_order(self, payload):
+        order_id = f"SIM-{uuid.uuid4().hex[:16]}"
+        order = {
+            'order_id': order_id,
+            'reference': payload.get('orderId'),
+            'amount': payload.get('amount'),
+            'currency': payload.get('currency', 'USD'),
+            'split': payload.get('split', []),
+            'webhook_url': payload.get('webhook_url', ''),
+            'status': 'pending',
+            'payment_url': f"{self.public_url}/pay/{order_id}",
+            'expires_at': payload.get('expires_at') or (timezone.now() + timedelta(hours=1)).isoformat(),
+        }
+        with self.lock:
+            self.orders[order_id] = order
+
+        if self.auto_webhook_delay is not None:
+            timer = threading.Timer(self.auto_webhook_delay, self.resolve, args=(order_id, 'completed'))
+            timer.daemon = True
+            timer.start()
+
+        return 201, dict(order)
+
+    def get_order(self, payload, order_id):
+        order = self.orders.get(order_id)
+        if not order:
+            return 404, {'error': 'Order not found'}
+        return 200, dict(order)
+
+    def refund_order(self, payload, order_id):
+        order = self.orders.get(order_id)
+        if not order:
+            return 404, {'error': 'Order not found'}
+        order['status'] = 'refunded'
+        return 200, {
+            'refund_id': f"REF-{uuid.uuid4().hex[:12]}",
+            'order_id': order_id,
+            'amount': payload.get('amount', order['amount']),
+            'status': 'refunded'
+        }
+
+    def resolve_order(self, payload, order_id, status):
+        """Completar/fallar/cancelar una orden manualmente y enviar su webhook"""
+        if order_id not in self.orders:
+            return 404, {'error': 'Order not found'}
+        return 200, self.resolve(order_id, RESOLVE_STATUSES[status])
+
+    def create_submerchant(self, payload):
+        return 201, {
+            'submerchant_key': f"SIM-SUB-{uuid.uuid4().hex[:12]}",
+            'name': payload.get('name'),
+            'status': 'verified'
+        }
+
+    # Webhooks
+
+    def resolve(self, order_id: str, status: str) -> dict:
+        """Cambiar el estado de la orden y enviar el webhook firmado"""
+        order = self.orders[order_id]
+        order['status'] = status
+        body, headers = self.build_webhook(order_id, status)
+        if order['webhook_url']:
+            try:
+                self.webhook_sender(order['webhook_url'], body, headers)
+            except Exception as e:
+                logger.error(f"Simulated webhook for {order_id} failed: {e}")
+        return dict(order)
+
+    def build_webhook(self, order_id: str, status: str):
+        """(cuerpo, cabeceras) de un webhook firmado para la orden"""
+        body = json.dumps({
+            'event_id': f"EVT-{uuid.uuid4().hex}",
+            'order_id': order_id,
+            'status': status,
+            'amount': self.orders.get(order_id, {}).get('amount'),
+            'timestamp': timezone.now().isoformat(),
+        }).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            SIGNATURE_HEADER: sign_payload(self.secret_key, body),
+        }
+        return body, headers
+
+    @staticmethod
+    def _post_webhook(url, body, headers):
+        requests.post(url, data=body, headers=headers, timeout=10)
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def serve(simulator: TilopaySimulator, host: str = '127.0.0.1', port: int = 8765):
+    """Crear el servidor HTTP multihilo del simulador (port=0 elige uno libre)"""
+    return make_server(host, port, simulator, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
@@ -1,3 +1,637 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.businesses.models import Business
+from apps.orders.models import Order, OrderStatusHistory
+from apps.outbox.models import OutboxEvent
+from apps.users.models import User, Address
+from .models import Commission, Payment, PaymentAttempt, TilopaySubmerchant, WebhookEvent
+from .services import attempt_recorder, checkout, http_client
+from .services.checkout import CheckoutService
+from .services.expiry import PaymentExpirySweeper, EXPIRY_REOPEN_NOTE
+from .services.payment_stats import PaymentStats
+from .services.reconciliation import PaymentReconciler
+from .services.submerchant_directory import SubmerchantDirectory, SUBMERCHANT_CACHE_ALIAS
+from .services.tilopay_service import TilopayService
+from .services.webhook_processor import WebhookProcessor
+from .simulator import TilopaySimulator, serve
+
+WEBHOOK_URL = '/api/payments/webhooks/tilopay/webhook/'
+
+
+class PaymentFixtures:
+    """Cliente, negocio y órdenes pendientes con su pago de Tilopay"""
+
+    def setUp(self):
+        self.customer = User.objects.create_user(username='cliente', password=None, phone='60000001', user_type='client')
+        owner = User.objects.create_user(username='negocio', password=None, phone='60000002', user_type='business')
+        self.business = Business.objects.create(
+            owner=owner, name='Negocio', description='-', service_type='food', phone='60000002',
+            address='-', latitude=Decimal('9.0'), longitude=Decimal('-79.5')
+        )
+        self.address = Address.objects.create(
+            user=self.customer, title='Casa', address_line='-', latitude=Decimal('9.05'), longitude=Decimal('-79.45')
+        )
+
+    def create_payment(self, tilopay_order_id, status='pending', age=timedelta(hours=1), **fields):
+        order = Order.objects.create(
+            customer=self.customer, business=self.business, order_type='delivery', status='pending',
+            delivery_address=self.address, subtotal=Decimal('10'), total=Decimal('12'), delivery_fee=Decimal('2')
+        )
+        payment = Payment.objects.create(
+            order=order, customer=self.customer, payment_method='tilopay_card', amount=Decimal('12'),
+            status=status, tilopay_order_id=tilopay_order_id, **fields
+        )
+        Payment.objects.filter(id=payment.id).update(created_at=timezone.now() - age)
+        return payment
+
+    def post_webhook(self, tilopay_order_id, status, event_id):
+        body = {'event_id': event_id, 'order_id': tilopay_order_id, 'status': status}
+        return self.client.post(WEBHOOK_URL, json.dumps(body), content_type='application/json')
+
+
+@override_settings(TILOPAY_WEBHOOK_INLINE_DRAIN=False, TILOPAY_WEBHOOK_VERIFY_SIGNATURE=False,
+                   OUTBOX_INLINE_DISPATCH=False)
+class WebhookProcessorTests(PaymentFixtures, TestCase):
+    def test_duplicate_deliveries_are_applied_once(self):
+        payment = self.create_payment('T-1')
+        for _ in range(3):
+            self.assertEqual(self.post_webhook('T-1', 'completed', 'EVT-1').status_code, 200)
+
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(WebhookProcessor().drain()['processed'], 1)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.webhook_attempts, 1)
+        self.assertEqual(payment.order.status, 'confirmed')
+        self.assertEqual(OutboxEvent.objects.filter(event_type='payment.completed').count(), 1)
+
+    def test_redelivered_status_is_a_no_op(self):
+        payment = self.create_payment('T-1')
+        self.post_webhook('T-1', 'completed', 'EVT-1')
+        WebhookProcessor().drain()
+
+        self.post_webhook('T-1', 'completed', 'EVT-2')
+        self.assertEqual(WebhookProcessor().drain()['processed'], 1)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.webhook_attempts, 1)
+        self.assertEqual(OutboxEvent.objects.filter(event_type='payment.completed').count(), 1)
+
+    def test_finalized_payment_ignores_a_later_status(self):
+        payment = self.create_payment('T-1')
+        self.post_webhook('T-1', 'completed', 'EVT-1')
+        self.post_webhook('T-1', 'failed', 'EVT-2')
+
+        self.assertEqual(WebhookProcessor().drain(), {'processed': 1, 'ignored': 1, 'failed': 0, 'retry': 0})
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        event = WebhookEvent.objects.get(event_id='EVT-2')
+        self.assertEqual((event.status, event.error_message), ('ignored', 'Payment already completed'))
+
+    def test_unknown_payment_is_retried(self):
+        self.post_webhook('T-404', 'completed', 'EVT-1')
+
+        self.assertEqual(WebhookProcessor().drain()['retry'], 1)
+        event = WebhookEvent.objects.get(event_id='EVT-1')
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+
+
+class TilopayStubMixin:
+    """TilopaySimulator local en un puerto libre"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.simulator = TilopaySimulator()
+        cls.server = serve(cls.simulator, port=0)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def remote(self, tilopay_order_id, status):
+        self.simulator.orders[tilopay_order_id] = {'order_id': tilopay_order_id, 'status': status}
+
+
+@override_settings(OUTBOX_INLINE_DISPATCH=False, PAYMENT_ATTEMPTS_ENABLED=True,
+                   PAYMENT_ATTEMPT_FLUSH_INTERVAL=3600, PAYMENT_ATTEMPT_BATCH_SIZE=1000)
+class PaymentReconcilerTests(TilopayStubMixin, PaymentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Recorder propio: los intentos se guardan con flush() en este hilo
+        self.recorder = attempt_recorder.AttemptRecorder()
+        patcher = mock.patch.multiple(attempt_recorder, _recorder=self.recorder, _recorder_pid=attempt_recorder.os.getpid())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reconciler(self):
+        return PaymentReconciler(base_url=self.base_url, workers=2, rate=0, older_than_minutes=15)
+
+    def test_applies_remote_statuses_and_records_each_check(self):
+        completed = self.create_payment('SIM-1')
+        failed = self.create_payment('SIM-2')
+        open_payment = self.create_payment('SIM-3')
+        recent = self.create_payment('SIM-4', age=timedelta(minutes=1))
+        self.remote('SIM-1', 'completed')
+        self.remote('SIM-2', 'failed')
+        self.remote('SIM-3', 'pending')
+        self.remote('SIM-4', 'completed')
+
+        self.assertEqual(
+            self.reconciler().run(),
+            {'checked': 3, 'updated': 2, 'unchanged': 1, 'errors': 0}
+        )
+
+        statuses = dict(Payment.objects.values_list('tilopay_order_id', 'status'))
+        self.assertEqual(statuses, {'SIM-1': 'completed', 'SIM-2': 'failed', 'SIM-3': 'pending', 'SIM-4': 'pending'})
+        completed.order.refresh_from_db()
+        self.assertEqual(completed.order.status, 'confirmed')
+
+        self.recorder.flush()
+        checks = PaymentAttempt.objects.filter(operation='status')
+        self.assertEqual(
+            set(checks.values_list('payment_id', flat=True)),
+            {completed.id, failed.id, open_payment.id}
+        )
+        self.assertNotIn(recent.id, set(checks.values_list('payment_id', flat=True)))
+
+    def test_payment_finalized_by_webhook_during_the_check_is_kept(self):
+        payment = self.create_payment('SIM-1')
+        self.remote('SIM-1', 'completed')
+        apply = PaymentReconciler._apply
+
+        def webhook_first(reconciler, batch, results):
+            # El webhook llega entre la consulta a Tilopay y la escritura
+            Payment.objects.filter(id=payment.id).update(status='cancelled')
+            return apply(reconciler, batch, results)
+
+        with mock.patch.object(PaymentReconciler, '_apply', webhook_first):
+            result = self.reconciler().run()
+
+        self.assertEqual(result['updated'], 0)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'cancelled')
+        self.assertEqual(payment.order.status, 'pending')
+        self.assertFalse(OutboxEvent.objects.filter(event_type='payment.completed').exists())
+
+    def test_unreachable_order_counts_as_error(self):
+        self.create_payment('SIM-404')
+
+        result = self.reconciler().run()
+
+        self.assertEqual(result['errors'], 1)
+        self.assertEqual(Payment.objects.get().status, 'pending')
+
+
+@override_settings(TILOPAY_MAX_RETRIES=2, TILOPAY_RETRY_BACKOFF=0)
+class HttpClientTests(TilopayStubMixin, TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(http_client, _session=None, _session_pid=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_session_is_reused_until_the_process_forks(self):
+        session = http_client.get_session()
+        self.assertIs(http_client.get_session(), session)
+        self.assertIs(TilopayService(base_url=self.base_url).session, session)
+
+        with mock.patch.object(http_client.os, 'getpid', return_value=-1):
+            self.assertIsNot(http_client.get_session(), session)
+
+    def test_only_idempotent_methods_are_retried(self):
+        retry = http_client.get_session().get_adapter(self.base_url).max_retries
+
+        self.assertEqual(retry.allowed_methods, http_client.IDEMPOTENT_METHODS)
+        self.assertTrue(retry.is_retry('GET', 503))
+        self.assertFalse(retry.is_retry('POST', 503))
+
+    def test_failed_get_is_retried_and_post_is_not(self):
+        session = http_client.get_session()
+
+        with mock.patch.object(self.simulator, 'failure_rate', 1):
+            before = self.simulator.request_count
+            self.assertEqual(session.get(f'{self.base_url}/v2/orders/SIM-1').status_code, 503)
+            self.assertEqual(self.simulator.request_count - before, 3)
+
+            before = self.simulator.request_count
+            self.assertEqual(session.post(f'{self.base_url}/v2/orders', json={}).status_code, 503)
+            self.assertEqual(self.simulator.request_count - before, 1)
+
+
+@override_settings(PAYMENT_ATTEMPTS_ENABLED=True, PAYMENT_ATTEMPT_FLUSH_INTERVAL=3600, PAYMENT_ATTEMPT_BATCH_SIZE=1000)
+class AttemptRecorderTests(TilopayStubMixin, PaymentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.recorder = attempt_recorder.AttemptRecorder()
+        patcher = mock.patch.multiple(attempt_recorder, _recorder=self.recorder, _recorder_pid=attempt_recorder.os.getpid())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_context_is_attached_to_the_calls_inside_the_block(self):
+        payment = self.create_payment('SIM-1')
+        self.remote('SIM-1', 'pending')
+
+        with attempt_recorder.attempt_context(user_agent='app/1.0', ip_address='10.0.0.1'):
+            with attempt_recorder.attempt_context(payment_id=payment.id, payment_method='tilopay_card'):
+                TilopayService(base_url=self.base_url).get_payment_status('SIM-1')
+            TilopayService(base_url=self.base_url).get_payment_status('SIM-1')
+        TilopayService(base_url=self.base_url).get_payment_status('SIM-1')
+
+        self.assertEqual(self.recorder.flush(), 3)
+        self.assertEqual(
+            list(PaymentAttempt.objects.order_by('id').values_list('payment_method', 'user_agent', 'ip_address')),
+            [('tilopay_card', 'app/1.0', '10.0.0.1'), ('', 'app/1.0', '10.0.0.1'), ('', '', None)]
+        )
+        # Sin payment_id en el contexto se resuelve por tilopay_order_id
+        self.assertEqual(set(PaymentAttempt.objects.values_list('payment_id', flat=True)), {payment.id})
+
+    def test_only_whitelisted_response_fields_are_stored(self):
+        self.simulator.orders['SIM-1'] = {
+            'order_id': 'SIM-1', 'status': 'pending', 'payment_url': 'https://pay/SIM-1',
+            'customer': {'email': 'cliente@example.com'}, 'split': [{'amount': 10}]
+        }
+
+        TilopayService(base_url=self.base_url).get_payment_status('SIM-1')
+        with self.assertRaises(Exception):
+            TilopayService(base_url=self.base_url).get_payment_status('SIM-404')
+        self.recorder.flush()
+
+        self.assertEqual(
+            [attempt.tilopay_response for attempt in PaymentAttempt.objects.order_by('id')],
+            [{'order_id': 'SIM-1', 'status': 'pending'}, {'error': 'Order not found'}]
+        )
+
+    @override_settings(PAYMENT_ATTEMPT_FLUSH_INTERVAL=0.05)
+    def test_background_thread_flushes_the_queue(self):
+        recorder = attempt_recorder.AttemptRecorder()
+        written = threading.Event()
+        entries = []
+
+        def write(batch):
+            entries.extend(batch)
+            written.set()
+            return len(batch)
+
+        with mock.patch.object(recorder, '_write', side_effect=write):
+            recorder.record(operation='status', status='success')
+            self.assertTrue(written.wait(2))
+
+        self.assertEqual([entry['operation'] for entry in entries], ['status'])
+        self.assertTrue(recorder.queue.empty())
+
+    def test_shutdown_drains_the_queue(self):
+        for _ in range(3):
+            self.recorder.record(operation='create', status='error', error_message='HTTP 503')
+        self.assertFalse(PaymentAttempt.objects.exists())
+
+        attempt_recorder._flush_on_exit()
+
+        self.assertEqual(PaymentAttempt.objects.filter(operation='create').count(), 3)
+        self.assertTrue(self.recorder.queue.empty())
+
+
+@override_settings(TILOPAY_WEBHOOK_INLINE_DRAIN=False, TILOPAY_WEBHOOK_VERIFY_SIGNATURE=False,
+                   OUTBOX_INLINE_DISPATCH=False, PAYMENT_EXPIRY_GRACE_SECONDS=300,
+                   PAYMENT_EXPIRED_ORDER_ACTION='cancel')
+class PaymentExpiryTests(PaymentFixtures, TestCase):
+    def expiring_payment(self, tilopay_order_id, expired_for):
+        return self.create_payment(tilopay_order_id, expires_at=timezone.now() - expired_for)
+
+    def test_payment_within_the_grace_margin_is_kept(self):
+        recent = self.expiring_payment('T-1', timedelta(minutes=1))
+        overdue = self.expiring_payment('T-2', timedelta(minutes=10))
+
+        self.assertEqual(PaymentExpirySweeper().sweep(), {'expired': 1, 'orders_cancelled': 1, 'orders_reopened': 0})
+
+        self.assertEqual(Payment.objects.get(id=recent.id).status, 'pending')
+        self.assertEqual(Payment.objects.get(id=overdue.id).status, 'expired')
+        self.assertEqual(Order.objects.get(id=overdue.order_id).status, 'cancelled')
+
+    def test_cancelled_order_publishes_its_status_change(self):
+        payment = self.expiring_payment('T-1', timedelta(minutes=10))
+
+        PaymentExpirySweeper().sweep()
+
+        event = OutboxEvent.objects.get(event_type='order.status_changed')
+        self.assertEqual(event.payload, {
+            'order_id': str(payment.order_id), 'status': 'cancelled', 'previous_status': 'pending',
+            'changed_by_id': str(self.customer.id)
+        })
+        self.assertTrue(OutboxEvent.objects.filter(event_type='payment.expired').exists())
+
+    @override_settings(PAYMENT_EXPIRED_ORDER_ACTION='reopen')
+    def test_reopen_keeps_the_order_pending_for_a_retry(self):
+        payment = self.expiring_payment('T-1', timedelta(minutes=10))
+
+        self.assertEqual(PaymentExpirySweeper().sweep(), {'expired': 1, 'orders_cancelled': 0, 'orders_reopened': 1})
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.order.status), ('expired', 'pending'))
+        history = OrderStatusHistory.objects.get(order=payment.order)
+        self.assertEqual((history.status, history.notes), ('pending', EXPIRY_REOPEN_NOTE))
+        event = OutboxEvent.objects.get(event_type='order.status_changed')
+        self.assertEqual(event.payload, {
+            'order_id': str(payment.order_id), 'status': 'pending', 'previous_status': 'pending',
+            'changed_by_id': None, 'action_type': 'payment_retry'
+        })
+        self.assertTrue(OutboxEvent.objects.get(event_type='payment.expired').payload['order_reopened'])
+
+    def test_webhook_completed_before_the_sweep_wins(self):
+        payment = self.expiring_payment('T-1', timedelta(minutes=10))
+        self.post_webhook('T-1', 'completed', 'EVT-1')
+        WebhookProcessor().drain()
+
+        self.assertEqual(PaymentExpirySweeper().sweep()['expired'], 0)
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.order.status), ('completed', 'confirmed'))
+
+    def test_late_completed_webhook_reopens_the_expired_order(self):
+        payment = self.expiring_payment('T-1', timedelta(minutes=10))
+        PaymentExpirySweeper().sweep()
+
+        self.post_webhook('T-1', 'completed', 'EVT-1')
+        self.assertEqual(WebhookProcessor().drain()['processed'], 1)
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.order.status), ('completed', 'confirmed'))
+        self.assertNotIn('refund_required', payment.payment_data or {})
+        self.assertEqual(
+            list(OrderStatusHistory.objects.filter(order=payment.order).order_by('id').values_list('status', flat=True)),
+            ['cancelled', 'confirmed']
+        )
+        self.assertEqual(
+            list(OutboxEvent.objects.filter(event_type='order.status_changed').order_by('created_at')
+                 .values_list('payload__status', flat=True)),
+            ['cancelled', 'confirmed']
+        )
+        self.assertTrue(OutboxEvent.objects.filter(event_type='payment.completed').exists())
+
+    def test_late_completed_webhook_for_an_order_cancelled_by_hand_flags_a_refund(self):
+        payment = self.expiring_payment('T-1', timedelta(minutes=10))
+        PaymentExpirySweeper().sweep()
+        OrderStatusHistory.objects.create(order=payment.order, status='cancelled', changed_by=self.customer,
+                                          notes='Cancelado por el cliente')
+
+        self.post_webhook('T-1', 'completed', 'EVT-1')
+        WebhookProcessor().drain()
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.order.status), ('completed', 'cancelled'))
+        self.assertTrue(payment.payment_data['refund_required'])
+
+    def test_late_failed_webhook_is_ignored(self):
+        payment = self.expiring_payment('T-1', timedelta(minutes=10))
+        PaymentExpirySweeper().sweep()
+
+        self.post_webhook('T-1', 'failed', 'EVT-1')
+
+        self.assertEqual(WebhookProcessor().drain()['ignored'], 1)
+        self.assertEqual(Payment.objects.get(id=payment.id).status, 'expired')
+
+
+@override_settings(PAYMENT_ATTEMPTS_ENABLED=False)
+class CheckoutExpiryTests(TilopayStubMixin, PaymentFixtures, TestCase):
+    def test_tilopay_session_uses_the_payment_expiry(self):
+        expires_at = timezone.now() + timedelta(minutes=42)
+        payment = self.create_payment(None, status='processing', expires_at=expires_at)
+
+        with override_settings(TILOPAY_BASE_URL=self.base_url):
+            CheckoutService(run_async=False).create_session(payment)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'pending')
+        self.assertEqual(self.simulator.orders[payment.tilopay_order_id]['expires_at'], expires_at.isoformat())
+
+
+@override_settings(PAYMENT_ATTEMPTS_ENABLED=False)
+class AsyncCheckoutTests(TilopayStubMixin, PaymentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.payment = self.create_payment(None, expires_at=timezone.now() + timedelta(minutes=30))
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        patcher = override_settings(TILOPAY_BASE_URL=self.base_url)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def start(self):
+        with mock.patch.object(checkout, '_submit') as submit:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                state = CheckoutService(run_async=True).start(self.payment, client={'user_agent': 'app/1.0'})
+            self.assertFalse(submit.called)
+            for callback in callbacks:
+                callback()
+        submit.assert_called_once_with(self.payment.id, {'user_agent': 'app/1.0'})
+        return state
+
+    def checkout_status(self):
+        response = self.client.get(f'/api/payments/{self.payment.id}/checkout_status/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_session_is_submitted_after_the_commit(self):
+        state = self.start()
+
+        self.assertEqual((state['status'], state['payment_url']), ('processing', None))
+        self.assertEqual(Payment.objects.get(id=self.payment.id).status, 'processing')
+
+    def test_processing_payment_becomes_pending_with_its_payment_url(self):
+        self.start()
+        self.assertEqual(self.checkout_status()['status'], 'processing')
+
+        checkout._run_checkout(self.payment.id, {})
+
+        state = self.checkout_status()
+        self.assertEqual(state['status'], 'pending')
+        self.assertIn(state['order_id'], self.simulator.orders)
+        self.assertEqual(state['payment_url'], self.simulator.orders[state['order_id']]['payment_url'])
+        self.assertIsNone(state['error'])
+
+    def test_tilopay_failure_marks_the_payment_failed(self):
+        self.start()
+
+        with mock.patch.object(self.simulator, 'failure_rate', 1):
+            checkout._run_checkout(self.payment.id, {})
+
+        state = self.checkout_status()
+        self.assertEqual((state['status'], state['payment_url']), ('failed', None))
+        self.assertIn('503', state['error'])
+
+    def test_only_processing_payments_are_checked_out(self):
+        requests_before = self.simulator.request_count
+
+        checkout._run_checkout(self.payment.id, {})
+
+        self.assertEqual(self.checkout_status()['status'], 'pending')
+        self.assertEqual(self.simulator.request_count, requests_before)
+
+
+@override_settings(PAYMENT_ATTEMPTS_ENABLED=False, TILOPAY_WEBHOOK_INLINE_DRAIN=False,
+                   TILOPAY_WEBHOOK_VERIFY_SIGNATURE=False, OUTBOX_INLINE_DISPATCH=False)
+class CommissionLedgerTests(TilopayStubMixin, PaymentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches[SUBMERCHANT_CACHE_ALIAS].clear()
+        self.submerchant = TilopaySubmerchant.objects.create(
+            user=self.business.owner, submerchant_key='SUB-1', business_name='Negocio',
+            business_email='negocio@example.com', business_phone='60000002', commission_percentage=Decimal('0.10')
+        )
+
+    def complete(self, payment):
+        self.post_webhook(payment.tilopay_order_id, 'completed', f'EVT-{payment.id}')
+        WebhookProcessor().drain()
+        return {commission.commission_type: commission for commission in Commission.objects.filter(payment=payment)}
+
+    def test_ledger_follows_the_split_sent_to_tilopay(self):
+        payment = self.create_payment(None, status='processing', expires_at=timezone.now() + timedelta(hours=1))
+        with override_settings(TILOPAY_BASE_URL=self.base_url):
+            CheckoutService(run_async=False).create_session(payment)
+
+        # La comisión cambia entre la sesión y el webhook
+        self.submerchant.commission_percentage = Decimal('0.20')
+        self.submerchant.save()
+        payment.refresh_from_db()
+
+        commissions = self.complete(payment)
+
+        business = commissions['business']
+        self.assertEqual((business.amount, business.status), (Decimal('10.80'), 'completed'))
+        self.assertIsNotNone(business.paid_at)
+        self.assertEqual(commissions['platform'].amount, Decimal('1.20'))
+        sent = self.simulator.orders[payment.tilopay_order_id]['split']
+        self.assertEqual([part['amount'] for part in sent], [10.8, 1.2])
+
+    def test_lines_without_a_saved_split_stay_pending(self):
+        payment = self.create_payment('T-1')
+
+        commissions = self.complete(payment)
+
+        self.assertEqual(set(commissions), {'business', 'platform'})
+        for commission in commissions.values():
+            self.assertEqual((commission.status, commission.paid_at), ('pending', None))
+
+
+class SubmerchantDirectoryTests(PaymentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches[SUBMERCHANT_CACHE_ALIAS].clear()
+        self.order = self.create_payment('T-1').order
+
+    def business_key(self):
+        business, _ = SubmerchantDirectory().for_order(self.order)
+        return business.submerchant_key
+
+    def test_changed_key_is_seen_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            submerchant = TilopaySubmerchant.objects.create(
+                user=self.business.owner, submerchant_key='SUB-1', business_name='Negocio',
+                business_email='negocio@example.com', business_phone='60000002'
+            )
+        self.assertEqual(self.business_key(), 'SUB-1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            submerchant.submerchant_key = 'SUB-2'
+            submerchant.save()
+
+        self.assertEqual(self.business_key(), 'SUB-2')
+
+    def test_cache_is_kept_until_the_change_commits(self):
+        submerchant = TilopaySubmerchant.objects.create(
+            user=self.business.owner, submerchant_key='SUB-1', business_name='Negocio',
+            business_email='negocio@example.com', business_phone='60000002'
+        )
+        self.assertEqual(self.business_key(), 'SUB-1')
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            submerchant.delete()
+
+        self.assertEqual(self.business_key(), 'SUB-1')
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(self.business_key())
+
+
+@override_settings(PAYMENT_STATS_CACHE_TTL=60)
+class PaymentStatsTests(PaymentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for index, (payment_status, method) in enumerate([
+            ('completed', 'tilopay_card'), ('completed', 'cash'), ('completed', 'tilopay_yappy'),
+            ('pending', 'tilopay_card'), ('failed', 'tilopay_card'), ('refunded', 'cash'), ('expired', 'tilopay_card'),
+        ]):
+            payment = self.create_payment(f'T-{index}', status=payment_status)
+            Payment.objects.filter(id=payment.id).update(payment_method=method)
+
+        owner = User.objects.create_user(username='negocio-2', password=None, phone='60000003', user_type='business')
+        self.other_business = Business.objects.create(
+            owner=owner, name='Otro', description='-', service_type='food', phone='60000003',
+            address='-', latitude=Decimal('9.0'), longitude=Decimal('-79.5')
+        )
+        other = self.create_payment('T-other', status='completed')
+        Order.objects.filter(id=other.order_id).update(business=self.other_business)
+
+        self.admin = User.objects.create_user(username='admin', password=None, phone='60000004', user_type='admin')
+        self.client = APIClient()
+
+    def stats(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/payments/stats/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def per_status_counts(self, queryset):
+        """Las cuentas de la versión anterior: una consulta por estado y por método"""
+        stats = {
+            'total_payments': queryset.count(),
+            'completed_payments': queryset.filter(status='completed').count(),
+            'pending_payments': queryset.filter(status='pending').count(),
+            'failed_payments': queryset.filter(status='failed').count(),
+            'refunded_payments': queryset.filter(status='refunded').count(),
+            'total_amount': sum(p.amount for p in queryset.filter(status='completed')),
+            'payment_methods': {},
+        }
+        for method, _ in Payment.PAYMENT_METHODS:
+            method_payments = queryset.filter(payment_method=method, status='completed')
+            stats['payment_methods'][method] = {
+                'count': method_payments.count(),
+                'amount': sum((p.amount for p in method_payments), Decimal('0')),
+            }
+        return stats
+
+    def test_totals_match_the_per_status_counts_in_one_query(self):
+        queryset = Payment.objects.all()
+
+        with self.assertNumQueries(1):
+            stats = PaymentStats(queryset, 'admin').compute()
+
+        stats.pop('by_status')
+        self.assertEqual(stats, self.per_status_counts(queryset))
+
+    def test_cache_is_scoped_per_role_and_business(self):
+        self.assertEqual(self.stats(self.admin)['total_payments'], 8)
+        self.assertEqual(self.stats(self.business.owner)['total_payments'], 7)
+        self.assertEqual(self.stats(self.other_business.owner)['total_payments'], 1)
+
+        self.create_payment('T-new', status='completed')
+
+        # Cada alcance sigue con su copia; la de un negocio no se sirve a otro
+        self.assertEqual(self.stats(self.business.owner)['total_payments'], 7)
+        self.assertEqual(self.stats(self.other_business.owner)['total_payments'], 1)
+        self.assertEqual(self.stats(self.admin, business_id=str(self.other_business.id))['total_payments'], 1)
+        cache.clear()
+        self.assertEqual(self.stats(self.business.owner)['total_payments'], 8)
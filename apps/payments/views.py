@@ -4,14 +4,27 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 import logging
 import json
+import uuid
 
-from .models import Payment
+from .models import Payment, WebhookEvent
 from .serializers import PaymentSerializer, PaymentCreateSerializer
 from .services.tilopay_service import TilopayService
+from .services.webhook_processor import schedule_drain, webhook_event_id
+from .services.attempt_recorder import attempt_context, client_info
+from .services.checkout import CheckoutService
+from .services.commission_ledger import CommissionLedger
+from .services.payment_stats import PaymentStats, parse_stats_datetime
+from apps.orders.services.order_events import order_status_event
+from apps.outbox.services.publisher import publish_many
+
+# Estados de un pago que se puede reintentar sobre la misma orden
+RETRYABLE_PAYMENT_STATUSES = ('expired', 'failed', 'cancelled')
 
 logger = logging.getLogger(__name__)
 
@@ -55,14 +68,32 @@ class PaymentViewSet(viewsets.ModelViewSet):
                         'error': 'Esta orden ya fue pagada'
                     }, status=status.HTTP_400_BAD_REQUEST)
                 
-                # Crear pago
-                payment = Payment.objects.create(
-                    order=order,
-                    customer=request.user,
-                    payment_method=payment_method,
-                    amount=order.total,
-                    status='pending'
-                )
+                # Los pagos con Tilopay vencen si no se completan a tiempo
+                expires_at = None
+                if payment_method != 'cash':
+                    expires_at = CheckoutService.payment_expiry()
+                
+                # Reutilizar el pago de un intento anterior que expiró o falló
+                payment = Payment.objects.filter(order=order, status__in=RETRYABLE_PAYMENT_STATUSES).first()
+                if payment:
+                    payment.customer = request.user
+                    payment.payment_method = payment_method
+                    payment.amount = order.total
+                    payment.status = 'pending'
+                    payment.expires_at = expires_at
+                    payment.payment_completed_at = None
+                    payment.webhook_received = False
+                    payment.webhook_data = {}
+                    payment.save()
+                else:
+                    payment = Payment.objects.create(
+                        order=order,
+                        customer=request.user,
+                        payment_method=payment_method,
+                        amount=order.total,
+                        status='pending',
+                        expires_at=expires_at
+                    )
                 
                 # Procesar pago según método
                 if payment_method == 'cash':
@@ -70,33 +101,28 @@ class PaymentViewSet(viewsets.ModelViewSet):
                     payment.save()
                     
                     # Actualizar orden
-                    order.status = 'confirmed'
-                    order.save()
+                    with transaction.atomic():
+                        previous_status = order.status
+                        order.status = 'confirmed'
+                        order.save()
+                        publish_many([order_status_event(order.id, 'confirmed', previous_status, request.user.id)])
                     
-                elif payment_method in ['tilopay_card', 'tilopay_yappy']:
-                    # Procesar con Tilopay
-                    tilopay_service = TilopayService()
+                    CommissionLedger().record_completed([payment.id])
                     
-                    if payment_method == 'tilopay_yappy':
-                        yappy_phone = serializer.validated_data.get('yappy_phone')
-                        if not yappy_phone:
-                            return Response({
-                                'error': 'Número de Yappy requerido'
-                            }, status=status.HTTP_400_BAD_REQUEST)
-                        
-                        payment_response = tilopay_service.create_yappy_payment(order, yappy_phone)
-                    else:
-                        payment_response = tilopay_service.create_card_payment(order)
+                elif payment_method in ['tilopay_card', 'tilopay_yappy']:
+                    yappy_phone = serializer.validated_data.get('yappy_phone')
+                    if payment_method == 'tilopay_yappy' and not yappy_phone:
+                        return Response({
+                            'error': 'Número de Yappy requerido'
+                        }, status=status.HTTP_400_BAD_REQUEST)
                     
-                    # Actualizar pago con datos de Tilopay
-                    payment.tilopay_order_id = payment_response.get('order_id')
-                    payment.tilopay_payment_url = payment_response.get('payment_url')
-                    payment.save()
+                    # Procesar con Tilopay (en segundo plano si CHECKOUT_ASYNC)
+                    checkout = CheckoutService().start(payment, yappy_phone, client=client_info(request))
                     
-                    # Retornar URL de pago
+                    # Retornar URL de pago (None mientras el pago está en 'processing')
                     response_data = PaymentSerializer(payment).data
-                    response_data['payment_url'] = payment_response.get('payment_url')
-                    response_data['expires_at'] = payment_response.get('expires_at')
+                    response_data['payment_url'] = checkout['payment_url']
+                    response_data['expires_at'] = checkout['expires_at']
                     
                     return Response(response_data, status=status.HTTP_201_CREATED)
                 
@@ -131,7 +157,8 @@ class PaymentViewSet(viewsets.ModelViewSet):
             # Si es pago de Tilopay, procesar reembolso
             if payment.payment_method in ['tilopay_card', 'tilopay_yappy']:
                 tilopay_service = TilopayService()
-                refund_response = tilopay_service.refund_payment(payment)
+                with attempt_context(payment_id=payment.id, payment_method=payment.payment_method, **client_info(request)):
+                    refund_response = tilopay_service.refund_payment(payment.tilopay_order_id)
                 
                 payment.status = 'refunded'
                 payment.save()
@@ -156,6 +183,12 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 'details': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['get'])
+    def checkout_status(self, request, pk=None):
+        """Estado del checkout: el cliente consulta hasta recibir payment_url"""
+        payment = self.get_object()
+        return Response(CheckoutService.state(payment))
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Estadísticas de pagos"""
@@ -164,25 +197,23 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 'error': 'No tienes permisos para ver estadísticas'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        queryset = self.get_queryset()
-        
-        stats = {
-            'total_payments': queryset.count(),
-            'completed_payments': queryset.filter(status='completed').count(),
-            'pending_payments': queryset.filter(status='pending').count(),
-            'failed_payments': queryset.filter(status='failed').count(),
-            'refunded_payments': queryset.filter(status='refunded').count(),
-            'total_amount': sum(p.amount for p in queryset.filter(status='completed')),
-            'payment_methods': {}
-        }
+        try:
+            date_from = parse_stats_datetime(request.query_params.get('date_from'))
+            date_to = parse_stats_datetime(request.query_params.get('date_to'), end_of_day=True)
+            business_id = request.query_params.get('business_id')
+            business_id = uuid.UUID(business_id) if business_id else None
+        except ValueError:
+            return Response({
+                'error': 'Filtros inválidos',
+                'details': 'Usa fechas YYYY-MM-DD o ISO 8601 y un business_id válido'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Estadísticas por método de pago
-        for method in ['cash', 'tilopay_card', 'tilopay_yappy']:
-            method_payments = queryset.filter(payment_method=method, status='completed')
-            stats['payment_methods'][method] = {
-                'count': method_payments.count(),
-                'amount': sum(p.amount for p in method_payments)
-            }
+        scope = 'admin' if request.user.user_type == 'admin' else f'business:{request.user.id}'
+        stats = PaymentStats(self.get_queryset(), scope).get(
+            date_from=date_from,
+            date_to=date_to,
+            business_id=business_id
+        )
         
         return Response(stats)
 
@@ -193,11 +224,8 @@ class TilopayWebhookView(viewsets.ViewSet):
     
     @action(detail=False, methods=['post'])
     def webhook(self, request):
-        """Procesar webhook de Tilopay"""
+        """Recibir webhook de Tilopay: se guarda en la bandeja y se procesa en segundo plano"""
         try:
-            # Log del webhook recibido
-            logger.info(f"Tilopay webhook received: {request.body}")
-            
             # Parsear datos
             webhook_data = json.loads(request.body)
             order_id = webhook_data.get('order_id')
@@ -206,29 +234,27 @@ class TilopayWebhookView(viewsets.ViewSet):
             if not order_id or not status:
                 return HttpResponse("Missing required fields", status=400)
             
-            # Buscar pago
-            try:
-                payment = Payment.objects.get(tilopay_order_id=order_id)
-            except Payment.DoesNotExist:
-                logger.error(f"Payment not found for Tilopay order ID: {order_id}")
-                return HttpResponse("Payment not found", status=404)
+            signature = request.headers.get('X-Tilopay-Signature', '')
+            if settings.TILOPAY_WEBHOOK_VERIFY_SIGNATURE and not TilopayService().verify_webhook_signature(
+                request.body.decode('utf-8'), signature
+            ):
+                logger.warning(f"Tilopay webhook with invalid signature for order {order_id}")
+                return HttpResponse("Invalid signature", status=401)
             
-            # Actualizar estado del pago
-            if status == 'completed':
-                payment.status = 'completed'
-                payment.save()
-                
-                # Actualizar orden
-                payment.order.status = 'confirmed'
-                payment.order.save()
-                
-                logger.info(f"Payment {payment.id} completed via webhook")
-                
-            elif status == 'failed':
-                payment.status = 'failed'
-                payment.save()
-                
-                logger.info(f"Payment {payment.id} failed via webhook")
+            event, created = WebhookEvent.objects.get_or_create(
+                provider='tilopay',
+                event_id=webhook_event_id(webhook_data, request.body),
+                defaults={
+                    'tilopay_order_id': str(order_id),
+                    'payload': webhook_data,
+                    'signature': signature[:255]
+                }
+            )
+            
+            logger.info(f"Tilopay webhook {event.event_id} for order {order_id} ({status}) {'queued' if created else 'duplicate'}")
+            
+            if created:
+                schedule_drain()
             
             return HttpResponse("OK", status=200)
             
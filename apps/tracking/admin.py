@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DriverLocation, OrderTracking, LocationHistory
+from .models import DriverLocation, OrderTracking, LocationHistory, DriverSpeedProfile, LocationTrace
 
 @admin.register(DriverLocation)
 class DriverLocationAdmin(admin.ModelAdmin):
@@ -19,4 +19,21 @@ class LocationHistoryAdmin(admin.ModelAdmin):
     list_display = ('driver', 'order', 'latitude', 'longitude', 'timestamp')
     list_filter = ('timestamp',)
     search_fields = ('driver__username', 'order__order_number')
-    readonly_fields = ('timestamp',)
\ No newline at end of file
+    list_select_related = ('driver', 'order')
+    readonly_fields = ('timestamp',)
+
+@admin.register(DriverSpeedProfile)
+class DriverSpeedProfileAdmin(admin.ModelAdmin):
+    list_display = ('driver', 'hour_of_day', 'average_speed', 'sample_count', 'updated_at')
+    list_filter = ('hour_of_day',)
+    search_fields = ('driver__username',)
+    readonly_fields = ('updated_at',)
+
+@admin.register(LocationTrace)
+class LocationTraceAdmin(admin.ModelAdmin):
+    list_display = ('order', 'driver', 'point_count', 'started_at', 'ended_at')
+    list_filter = ('started_at',)
+    search_fields = ('driver__username', 'order__order_number')
+    list_select_related = ('order', 'driver')
+    exclude = ('data',)
+    readonly_fields = ('created_at',)
\ No newline at end of file
@@ -0,0 +1,28 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.tracking.services.trace_store import TraceStore
+
+
+class Command(BaseCommand):
+    help = 'Compacta el LocationHistory de órdenes terminadas en LocationTrace'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=int, default=24,
+                            help='Solo órdenes terminadas hace más de N horas')
+        parser.add_argument('--limit', type=int, default=500,
+                            help='Máximo de órdenes a archivar por ejecución')
+        parser.add_argument('--keep-raw', action='store_true',
+                            help='No eliminar las filas originales de LocationHistory')
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(hours=options['older_than_hours'])
+
+        archived = TraceStore().archive_completed_orders(
+            older_than,
+            limit=options['limit'],
+            delete_raw=not options['keep_raw']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"{archived} recorridos archivados"))
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tracking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverSpeedProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_of_day', models.PositiveSmallIntegerField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('average_speed', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='speed_profiles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('driver', 'hour_of_day')},
+            },
+        ),
+    ]
@@ -41,4 +41,43 @@ class LocationHistory(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-timestamp']
+
+class DriverSpeedProfile(models.Model):
+    """Velocidad histórica promedio del conductor por hora del día"""
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='speed_profiles')
+    hour_of_day = models.PositiveSmallIntegerField()  # 0-23, hora local
+    sample_count = models.PositiveIntegerField(default=0)
+    average_speed = models.DecimalField(max_digits=6, decimal_places=2, default=0)  # km/h
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('driver', 'hour_of_day')
+    
+    def __str__(self):
+        return f"{self.driver.username} - {self.hour_of_day}h"
+
+class LocationTrace(models.Model):
+    """Recorrido archivado de un conductor/orden en formato binario compacto"""
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='location_traces')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='location_traces', null=True, blank=True)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    point_count = models.PositiveIntegerField()
+    encoding_version = models.PositiveSmallIntegerField(default=1)
+    data = models.BinaryField()  # Ver services/trace_codec.py
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['started_at']
+        indexes = [
+            models.Index(fields=['order', 'started_at']),
+        ]
+    
+    def iter_points(self):
+        """Generar los puntos (timestamp, lat, lng) del recorrido"""
+        from .services.trace_codec import decode_trace
+        return decode_trace(self.data)
+    
+    def __str__(self):
+        return f"{self.driver.username} trace ({self.point_count} points)"
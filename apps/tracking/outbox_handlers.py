@@ -0,0 +1,36 @@
+from apps.notifications.services.notification_service import NotificationService
+from apps.orders.models import Order
+from apps.outbox.services.registry import outbox_handler
+
+
+@outbox_handler('order.geofence_entered')
+def notify_geofence_entered(event):
+    """Avisar al negocio (recogida) o al cliente (entrega) que llegó el conductor"""
+    order = Order.objects.select_related('customer', 'business__owner').filter(
+        id=event.payload['order_id']
+    ).first()
+    if order is None:
+        return
+
+    if event.payload['kind'] == 'pickup':
+        if not order.business_id:
+            return
+        recipient = order.business.owner
+        title = 'Conductor en el negocio'
+        message = f'El conductor llegó para recoger la orden #{order.order_number}'
+        notification_type = 'order_update'
+    else:
+        recipient = order.customer
+        title = 'Tu conductor llegó'
+        message = f'El conductor llegó con tu orden #{order.order_number}'
+        notification_type = 'delivery'
+
+    result = NotificationService().send_notification(
+        user=recipient,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        data={'order_id': str(order.id), 'geofence': event.payload['kind']}
+    )
+    if not result.get('database_saved'):
+        raise Exception(result.get('error', 'Notification not saved'))
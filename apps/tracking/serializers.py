@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import OrderTracking, DriverLocation
+from .models import OrderTracking, DriverLocation, LocationHistory
 from apps.orders.models import Order
 from apps.users.models import User
 
@@ -12,11 +12,85 @@ class OrderTrackingSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderTracking
         fields = [
-            'id', 'order_id', 'order_status', 'status', 
+            'id', 'order_id', 'order_status', 'estimated_distance',
+            'estimated_duration', 'estimated_arrival', 'pickup_time',
+            'actual_arrival', 'updated_at', 'customer_name', 'driver_name'
+        ]
+        read_only_fields = fields
+
+class TrackingSnapshotSerializer(serializers.ModelSerializer):
+    """Último snapshot de tracking de una orden (sin datos de la orden)"""
+    
+    class Meta:
+        model = OrderTracking
+        fields = [
+            'estimated_distance', 'estimated_duration', 'estimated_arrival',
+            'pickup_time', 'actual_arrival', 'updated_at'
+        ]
+        read_only_fields = fields
+
+class DriverPositionSerializer(serializers.ModelSerializer):
+    """Posición actual del conductor"""
+    
+    class Meta:
+        model = DriverLocation
+        fields = ['latitude', 'longitude', 'heading', 'speed', 'updated_at']
+        read_only_fields = fields
+
+class ActiveOrderTrackingSerializer(serializers.ModelSerializer):
+    """Orden activa con tracking y ubicación del conductor ya precargados"""
+    order_id = serializers.UUIDField(source='id', read_only=True)
+    order_status = serializers.CharField(source='status', read_only=True)
+    business_name = serializers.CharField(source='business.name', read_only=True, default=None)
+    customer_name = serializers.CharField(source='customer.get_full_name', read_only=True)
+    driver_name = serializers.CharField(source='driver.get_full_name', read_only=True, default=None)
+    tracking = serializers.SerializerMethodField()
+    driver_location = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Order
+        fields = [
+            'order_id', 'order_number', 'order_status', 'order_type',
+            'business_name', 'customer_name', 'driver_name',
+            'tracking', 'driver_location'
+        ]
+        read_only_fields = fields
+    
+    def get_tracking(self, obj):
+        try:
+            return TrackingSnapshotSerializer(obj.tracking).data
+        except OrderTracking.DoesNotExist:
+            return None
+    
+    def get_driver_location(self, obj):
+        if not obj.driver_id:
+            return None
+        try:
+            location = obj.driver.current_location
+        except DriverLocation.DoesNotExist:
+            return None
+        return DriverPositionSerializer(location).data
+
+class LocationPingSerializer(serializers.ModelSerializer):
+    """Punto registrado por update_location, con las claves de la respuesta original"""
+    order_id = serializers.UUIDField(source='order.id', read_only=True)
+    order_status = serializers.CharField(source='order.status', read_only=True)
+    status = serializers.CharField(source='order.status', read_only=True)
+    notes = serializers.SerializerMethodField()
+    customer_name = serializers.CharField(source='order.customer.get_full_name', read_only=True)
+    driver_name = serializers.CharField(source='driver.get_full_name', read_only=True)
+    
+    class Meta:
+        model = LocationHistory
+        fields = [
+            'id', 'order_id', 'order_status', 'status',
             'latitude', 'longitude', 'notes', 'timestamp',
             'customer_name', 'driver_name'
         ]
-        read_only_fields = ['id', 'timestamp']
+        read_only_fields = fields
+    
+    def get_notes(self, obj):
+        return 'Ubicación actualizada por conductor'
 
 class DriverLocationSerializer(serializers.ModelSerializer):
     driver_id = serializers.UUIDField(source='driver.id', read_only=True)
@@ -0,0 +1,261 @@
+import logging
+import math
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Any, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import OrderTracking, DriverSpeedProfile
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Estados en los que el conductor ya lleva el pedido
+PICKED_UP_STATUSES = ('picked_up', 'on_the_way')
+
+# El estado en caché expira si el conductor deja de reportar
+STATE_TTL = 60 * 60
+MAX_SAMPLE_GAP_SECONDS = 5 * 60
+# Copia en caché de DriverSpeedProfile
+PROFILE_CACHE_TTL = 10 * 60
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Distancia en línea recta (km) entre dos coordenadas"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class ETAService:
+    """
+    Estimación incremental de llegada para órdenes en curso.
+
+    Cada ping de ubicación actualiza en O(1) la velocidad suavizada (EWMA) del
+    conductor y su promedio histórico para la hora del día. El ETA solo se
+    escribe en OrderTracking cuando cambia más de ETA_MIN_CHANGE_SECONDS.
+    """
+
+    def __init__(self):
+        self.alpha = settings.ETA_SMOOTHING_ALPHA
+        self.default_speed = settings.ETA_DEFAULT_SPEED_KMH
+        self.min_speed = settings.ETA_MIN_SPEED_KMH
+        self.max_speed = settings.ETA_MAX_SPEED_KMH
+        self.recent_weight = settings.ETA_RECENT_WEIGHT
+        self.warmup_samples = settings.ETA_WARMUP_SAMPLES
+        self.route_factor = settings.ETA_ROUTE_FACTOR
+        self.min_change_seconds = settings.ETA_MIN_CHANGE_SECONDS
+        self.profile_min_samples = settings.ETA_PROFILE_MIN_SAMPLES
+        self.profile_flush_every = settings.ETA_PROFILE_FLUSH_EVERY
+
+    def ingest(
+        self,
+        order,
+        driver,
+        latitude: float,
+        longitude: float,
+        speed: Optional[float] = None,
+        timestamp=None
+    ) -> Dict[str, Any]:
+        """
+        Procesar un ping de ubicación y recalcular el ETA de la orden
+
+        Args:
+            order: Orden en curso (con delivery_address cargada)
+            driver: Conductor que reporta la ubicación
+            latitude, longitude: Posición reportada
+            speed: Velocidad reportada por el dispositivo (km/h), opcional
+            timestamp: Momento del ping (por defecto ahora)
+
+        Returns:
+            Dict con el ETA calculado y si se guardó en OrderTracking
+        """
+        now = timestamp or timezone.now()
+
+        sample = self._update_recent_speed(driver.id, latitude, longitude, speed, now)
+        hourly_speed, hourly_samples = self._update_hourly_speed(driver.id, sample, now)
+        effective_speed = self._blend_speed(sample['ewma'], sample['samples'], hourly_speed, hourly_samples)
+
+        distance_km = self._remaining_distance_km(order, latitude, longitude) * self.route_factor
+        duration_seconds = distance_km / effective_speed * 3600
+        estimated_arrival = now + timedelta(seconds=duration_seconds)
+
+        saved = self._write_back(order, driver, estimated_arrival, distance_km, duration_seconds, now)
+
+        return {
+            'order_id': str(order.id),
+            'estimated_arrival': estimated_arrival,
+            'estimated_distance': round(distance_km, 2),
+            'estimated_duration': math.ceil(duration_seconds / 60),
+            'speed_kmh': round(effective_speed, 2),
+            'saved': saved
+        }
+
+    def _update_recent_speed(self, driver_id, latitude, longitude, speed, now) -> Dict[str, Any]:
+        """Actualizar la velocidad suavizada (EWMA) del conductor"""
+        key = f"eta:driver:{driver_id}"
+        state = cache.get(key) or {'ewma': None, 'samples': 0}
+        ts = now.timestamp()
+
+        observed = None
+        if speed is not None:
+            observed = float(speed)
+        elif state.get('ts') is not None:
+            elapsed = ts - state['ts']
+            if 0 < elapsed <= MAX_SAMPLE_GAP_SECONDS:
+                moved = haversine_km(state['lat'], state['lng'], latitude, longitude)
+                observed = moved / elapsed * 3600
+
+        # Ignorar lecturas imposibles (saltos de GPS)
+        if observed is not None and 0 <= observed <= self.max_speed:
+            if state['ewma'] is None:
+                state['ewma'] = observed
+            else:
+                state['ewma'] = self.alpha * observed + (1 - self.alpha) * state['ewma']
+            state['samples'] += 1
+            state['observed'] = observed
+        else:
+            state['observed'] = None
+
+        state.update({'lat': latitude, 'lng': longitude, 'ts': ts})
+        cache.set(key, state, STATE_TTL)
+        return state
+
+    def _update_hourly_speed(self, driver_id, sample, now) -> Tuple[Optional[float], int]:
+        """
+        Actualizar el promedio histórico de velocidad para la hora actual
+
+        La base de datos manda: las muestras se acumulan en un buffer (conteo y
+        suma) y cada profile_flush_every se suman a DriverSpeedProfile con un
+        UPDATE atómico, así varios procesos pueden escribir el mismo perfil sin
+        pisarse. La caché solo guarda una copia de la fila con TTL.
+        """
+        hour = timezone.localtime(now).hour
+        pending_key = f"eta:profile_pending:{driver_id}:{hour}"
+        pending = cache.get(pending_key) or {'count': 0, 'sum': 0.0}
+
+        observed = sample.get('observed')
+        if observed is not None:
+            pending['count'] += 1
+            pending['sum'] += observed
+
+            if pending['count'] >= self.profile_flush_every:
+                self._flush_profile(driver_id, hour, pending)
+                pending = {'count': 0, 'sum': 0.0}
+
+            cache.set(pending_key, pending, STATE_TTL)
+
+        stored_count, stored_mean = self._stored_profile(driver_id, hour)
+        count = stored_count + pending['count']
+        if count == 0:
+            return None, 0
+        return (stored_mean * stored_count + pending['sum']) / count, count
+
+    def _stored_profile(self, driver_id, hour) -> Tuple[int, float]:
+        """(sample_count, average_speed) guardados, con copia en caché"""
+        key = f"eta:profile:{driver_id}:{hour}"
+        profile = cache.get(key)
+        if profile is None:
+            row = DriverSpeedProfile.objects.filter(
+                driver_id=driver_id, hour_of_day=hour
+            ).values_list('sample_count', 'average_speed').first()
+            profile = (row[0], float(row[1])) if row else (0, 0.0)
+            cache.set(key, profile, PROFILE_CACHE_TTL)
+        return profile
+
+    def _flush_profile(self, driver_id, hour, pending: Dict[str, Any]):
+        """Sumar las muestras pendientes a la fila: media ponderada en un solo UPDATE"""
+        count = pending['count']
+        total = Decimal(str(round(pending['sum'], 4)))
+        profile = DriverSpeedProfile.objects.filter(driver_id=driver_id, hour_of_day=hour)
+
+        updated = profile.update(
+            average_speed=(F('average_speed') * F('sample_count') + total) / (F('sample_count') + count),
+            sample_count=F('sample_count') + count,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    DriverSpeedProfile.objects.create(
+                        driver_id=driver_id,
+                        hour_of_day=hour,
+                        sample_count=count,
+                        average_speed=Decimal(str(round(pending['sum'] / count, 2)))
+                    )
+            except IntegrityError:
+                # Otro proceso creó la fila mientras tanto
+                self._flush_profile(driver_id, hour, pending)
+                return
+
+        cache.delete(f"eta:profile:{driver_id}:{hour}")
+
+    def _blend_speed(self, ewma, samples, hourly_speed, hourly_samples) -> float:
+        """Combinar velocidad reciente con la histórica (o la de referencia)"""
+        if hourly_speed is not None and hourly_samples >= self.profile_min_samples:
+            baseline = hourly_speed
+        else:
+            baseline = self.default_speed
+
+        if ewma is None:
+            blended = baseline
+        else:
+            weight = self.recent_weight * min(1.0, samples / self.warmup_samples)
+            blended = weight * ewma + (1 - weight) * baseline
+
+        return max(blended, self.min_speed)
+
+    def _remaining_distance_km(self, order, latitude, longitude) -> float:
+        """Distancia restante: pasando por el punto de recogida si aún no se recoge"""
+        destination = order.delivery_address
+        dest_lat, dest_lng = float(destination.latitude), float(destination.longitude)
+
+        pickup = self._pickup_point(order)
+        if pickup and order.status not in PICKED_UP_STATUSES:
+            return (
+                haversine_km(latitude, longitude, pickup[0], pickup[1]) +
+                haversine_km(pickup[0], pickup[1], dest_lat, dest_lng)
+            )
+
+        return haversine_km(latitude, longitude, dest_lat, dest_lng)
+
+    def _pickup_point(self, order) -> Optional[Tuple[float, float]]:
+        """Coordenadas de recogida: dirección de recogida o el negocio"""
+        if order.pickup_address_id:
+            return float(order.pickup_address.latitude), float(order.pickup_address.longitude)
+        if order.business_id:
+            return float(order.business.latitude), float(order.business.longitude)
+        return None
+
+    def _write_back(self, order, driver, estimated_arrival, distance_km, duration_seconds, now) -> bool:
+        """Guardar el ETA solo si cambió de forma significativa"""
+        key = f"eta:order:{order.id}"
+        last_written = cache.get(key)
+
+        if last_written is not None and abs(estimated_arrival.timestamp() - last_written) < self.min_change_seconds:
+            return False
+
+        values = {
+            'estimated_arrival': estimated_arrival,
+            'estimated_distance': Decimal(str(round(distance_km, 2))),
+            'estimated_duration': math.ceil(duration_seconds / 60),
+            'updated_at': now
+        }
+
+        updated = OrderTracking.objects.filter(order_id=order.id).update(**values)
+        if not updated:
+            values.pop('updated_at')
+            OrderTracking.objects.create(order=order, driver=driver, **values)
+
+        cache.set(key, estimated_arrival.timestamp(), STATE_TTL)
+        logger.info(f"ETA updated for order {order.id}: {estimated_arrival.isoformat()}")
+        return True
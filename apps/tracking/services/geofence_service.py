@@ -0,0 +1,222 @@
+import logging
+import math
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderStatusHistory, ACTIVE_ORDER_STATUSES
+from apps.orders.services.order_events import order_status_event
+from apps.outbox.services.publisher import publish, publish_many
+from ..models import OrderTracking
+from .eta_service import haversine_km, PICKED_UP_STATUSES
+
+logger = logging.getLogger(__name__)
+
+GRID_CELL_DEGREES = 0.01  # ~1.1 km por celda
+KM_PER_DEGREE = 111.32
+INDEX_TTL = 10 * 60
+
+# Transiciones automáticas al entrar a una geocerca (si GEOFENCE_AUTO_STATUS)
+AUTO_TRANSITIONS = {
+    'pickup': (('ready', 'assigned'), 'picked_up'),
+}
+
+
+class GeofenceIndex:
+    """
+    Índice espacial por rejilla: cada geocerca se registra en todas las celdas
+    que toca su círculo, así un punto solo consulta su propia celda.
+    """
+
+    def __init__(self, cells: Optional[Dict[str, list]] = None):
+        self.cells = cells or {}
+
+    @staticmethod
+    def cell_key(latitude: float, longitude: float) -> str:
+        return f"{math.floor(latitude / GRID_CELL_DEGREES)}:{math.floor(longitude / GRID_CELL_DEGREES)}"
+
+    def add(self, fence: Dict[str, Any]):
+        radius_km = fence['radius'] / 1000
+        d_lat = radius_km / KM_PER_DEGREE
+        d_lng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(fence['lat'])), 0.01))
+
+        min_x = math.floor((fence['lat'] - d_lat) / GRID_CELL_DEGREES)
+        max_x = math.floor((fence['lat'] + d_lat) / GRID_CELL_DEGREES)
+        min_y = math.floor((fence['lng'] - d_lng) / GRID_CELL_DEGREES)
+        max_y = math.floor((fence['lng'] + d_lng) / GRID_CELL_DEGREES)
+
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                self.cells.setdefault(f"{x}:{y}", []).append(fence)
+
+    def remove(self, order_id: str, kind: str):
+        for key in list(self.cells):
+            self.cells[key] = [
+                fence for fence in self.cells[key]
+                if not (fence['order_id'] == order_id and fence['kind'] == kind)
+            ]
+            if not self.cells[key]:
+                del self.cells[key]
+
+    def hits(self, latitude: float, longitude: float) -> List[Dict[str, Any]]:
+        """Geocercas que contienen el punto"""
+        return [
+            fence for fence in self.cells.get(self.cell_key(latitude, longitude), [])
+            if haversine_km(latitude, longitude, fence['lat'], fence['lng']) * 1000 <= fence['radius']
+        ]
+
+
+class GeofenceService:
+    """
+    Detección automática de llegada al punto de recogida y de entrega.
+
+    Las geocercas de las órdenes activas de cada conductor se mantienen en
+    caché como un GeofenceIndex; se reconstruyen con una consulta cuando no
+    están en caché o cuando cambia una orden del conductor.
+    """
+
+    def __init__(self):
+        self.pickup_radius = settings.GEOFENCE_PICKUP_RADIUS_METERS
+        self.delivery_radius = settings.GEOFENCE_DELIVERY_RADIUS_METERS
+        self.auto_status = settings.GEOFENCE_AUTO_STATUS
+        self.notify = settings.GEOFENCE_NOTIFY
+
+    @staticmethod
+    def cache_key(driver_id) -> str:
+        return f"geofence:driver:{driver_id}"
+
+    @classmethod
+    def invalidate(cls, *driver_ids):
+        """Descartar el índice de los conductores al confirmar (se reconstruye en el próximo ping)"""
+        keys = [cls.cache_key(driver_id) for driver_id in driver_ids if driver_id]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
+
+    @classmethod
+    def invalidate_orders(cls, order_ids):
+        """Para cambios hechos con QuerySet.update(), que no disparan post_save"""
+        cls.invalidate(*set(
+            Order.objects.filter(id__in=order_ids, driver__isnull=False).values_list('driver_id', flat=True)
+        ))
+
+    def check(self, driver, latitude: float, longitude: float, timestamp=None) -> List[Dict[str, Any]]:
+        """
+        Evaluar un punto contra las geocercas del conductor
+
+        Returns:
+            Lista de eventos disparados ({'order_id', 'kind'})
+        """
+        now = timestamp or timezone.now()
+        index = self._load_index(driver.id)
+
+        events = []
+        for fence in index.hits(latitude, longitude):
+            try:
+                self._fire(fence, driver, now)
+                events.append({'order_id': fence['order_id'], 'kind': fence['kind']})
+            except Exception as e:
+                logger.error(f"Geofence {fence['kind']} failed for order {fence['order_id']}: {e}")
+            # Cada geocerca se dispara una sola vez; tras la recogida se vigila la entrega
+            index.remove(fence['order_id'], fence['kind'])
+            if fence.get('then'):
+                index.add(fence['then'])
+
+        if events:
+            cache.set(self.cache_key(driver.id), index.cells, INDEX_TTL)
+
+        return events
+
+    def _load_index(self, driver_id) -> GeofenceIndex:
+        cells = cache.get(self.cache_key(driver_id))
+        if cells is not None:
+            return GeofenceIndex(cells)
+
+        index = self._build_index(driver_id)
+        cache.set(self.cache_key(driver_id), index.cells, INDEX_TTL)
+        return index
+
+    def _build_index(self, driver_id) -> GeofenceIndex:
+        """Registrar las geocercas de todas las órdenes activas del conductor"""
+        orders = Order.objects.filter(
+            driver_id=driver_id,
+            status__in=ACTIVE_ORDER_STATUSES
+        ).select_related('business', 'pickup_address', 'delivery_address', 'tracking')
+
+        index = GeofenceIndex()
+        for order in orders:
+            try:
+                tracking = order.tracking
+            except OrderTracking.DoesNotExist:
+                tracking = None
+
+            delivery = {
+                'order_id': str(order.id), 'kind': 'delivery',
+                'lat': float(order.delivery_address.latitude),
+                'lng': float(order.delivery_address.longitude),
+                'radius': self.delivery_radius
+            }
+            if tracking and tracking.actual_arrival:
+                continue
+
+            # La entrega solo se vigila con el pedido ya recogido: antes el
+            # conductor puede pasar cerca del cliente camino al negocio
+            if order.status in PICKED_UP_STATUSES or (tracking and tracking.pickup_time):
+                index.add(delivery)
+                continue
+
+            pickup = self._pickup_point(order)
+            if pickup:
+                index.add({
+                    'order_id': str(order.id), 'kind': 'pickup',
+                    'lat': pickup[0], 'lng': pickup[1], 'radius': self.pickup_radius,
+                    'then': delivery
+                })
+
+        return index
+
+    def _pickup_point(self, order):
+        if order.pickup_address_id:
+            return float(order.pickup_address.latitude), float(order.pickup_address.longitude)
+        if order.business_id:
+            return float(order.business.latitude), float(order.business.longitude)
+        return None
+
+    def _fire(self, fence: Dict[str, Any], driver, now):
+        """Registrar la llegada y, si aplica, cambiar estado y publicar la notificación"""
+        order_id = fence['order_id']
+        field = 'pickup_time' if fence['kind'] == 'pickup' else 'actual_arrival'
+
+        with transaction.atomic():
+            recorded = OrderTracking.objects.filter(
+                order_id=order_id, **{f'{field}__isnull': True}
+            ).update(**{field: now, 'updated_at': now})
+
+            if not recorded and not OrderTracking.objects.filter(order_id=order_id).exists():
+                OrderTracking.objects.create(order_id=order_id, driver=driver, **{field: now})
+                recorded = 1
+
+            transition = AUTO_TRANSITIONS.get(fence['kind'])
+            if self.auto_status and transition:
+                from_statuses, new_status = transition
+                changed = Order.objects.filter(
+                    id=order_id, driver=driver, status__in=from_statuses
+                ).update(status=new_status, updated_at=now)
+
+                if changed:
+                    OrderStatusHistory.objects.create(
+                        order_id=order_id,
+                        status=new_status,
+                        changed_by=driver,
+                        notes='Detectado automáticamente por geocerca'
+                    )
+                    publish_many([order_status_event(order_id, new_status, changed_by_id=driver.id)])
+
+            # La envía el handler de tracking/outbox_handlers.py después del commit
+            if self.notify and recorded:
+                publish('order.geofence_entered', 'order', order_id, {
+                    'order_id': order_id, 'kind': fence['kind'], 'driver_id': str(driver.id)
+                })
+
+        logger.info(f"Geofence {fence['kind']} entered by driver {driver.id} for order {order_id}")
@@ -0,0 +1,109 @@
+"""
+Formato binario compacto para recorridos GPS.
+
+Cada punto (tiempo, latitud, longitud) se guarda como enteros escalados
+(milisegundos y grados * 1e7), codificados como deltas respecto al punto
+anterior en varints zigzag y comprimidos con zlib. Un punto típico ocupa
+entre 3 y 6 bytes antes de comprimir.
+
+Layout v1 (antes de zlib):
+    versión (1 byte) | cantidad de puntos (varint) | puntos (varints zigzag)
+"""
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from typing import Iterable, Iterator, Tuple
+
+TRACE_FORMAT_VERSION = 1
+COORDINATE_SCALE = 10 ** 7  # ~1.1 cm de precisión
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+def _write_varint(buffer: bytearray, value: int):
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+class TraceEncoder:
+    """Codificador incremental: acepta puntos en orden cronológico"""
+
+    def __init__(self):
+        self._body = bytearray()
+        self._previous = (0, 0, 0)
+        self.point_count = 0
+        self.started_at = None
+        self.ended_at = None
+
+    def add(self, timestamp: datetime, latitude, longitude):
+        """Agregar un punto (latitude/longitude pueden ser Decimal o float)"""
+        point = (
+            round(timestamp.timestamp() * 1000),
+            round(float(latitude) * COORDINATE_SCALE),
+            round(float(longitude) * COORDINATE_SCALE),
+        )
+        for current, previous in zip(point, self._previous):
+            _write_varint(self._body, _zigzag(current - previous))
+
+        self._previous = point
+        self.point_count += 1
+        if self.started_at is None:
+            self.started_at = timestamp
+        self.ended_at = timestamp
+
+    def finish(self) -> bytes:
+        """Obtener el blob comprimido"""
+        header = bytearray([TRACE_FORMAT_VERSION])
+        _write_varint(header, self.point_count)
+        return zlib.compress(bytes(header + self._body), 9)
+
+
+def encode_trace(points: Iterable[Tuple[datetime, float, float]]) -> bytes:
+    """Codificar una secuencia de puntos (timestamp, lat, lng)"""
+    encoder = TraceEncoder()
+    for timestamp, latitude, longitude in points:
+        encoder.add(timestamp, latitude, longitude)
+    return encoder.finish()
+
+
+def decode_trace(blob: bytes) -> Iterator[Tuple[datetime, float, float]]:
+    """Decodificar un blob generando los puntos uno a uno"""
+    data = zlib.decompress(bytes(blob))
+    version = data[0]
+    if version != TRACE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported trace format version: {version}")
+
+    count, pos = _read_varint(data, 1)
+    t_ms = lat = lng = 0
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        t_ms += _unzigzag(delta)
+        delta, pos = _read_varint(data, pos)
+        lat += _unzigzag(delta)
+        delta, pos = _read_varint(data, pos)
+        lng += _unzigzag(delta)
+
+        yield (
+            datetime.fromtimestamp(t_ms / 1000, tz=dt_timezone.utc),
+            lat / COORDINATE_SCALE,
+            lng / COORDINATE_SCALE,
+        )
@@ -0,0 +1,133 @@
+import heapq
+import logging
+from typing import Iterator, List, Tuple
+from django.db import transaction
+
+from ..models import LocationHistory, LocationTrace
+from .trace_codec import TraceEncoder, TRACE_FORMAT_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Estados en los que el recorrido de la orden ya terminó
+COMPLETED_ORDER_STATUSES = ('delivered', 'cancelled')
+
+
+class TraceStore:
+    """Archivo de recorridos terminados: un blob comprimido por orden/conductor"""
+
+    def __init__(self, chunk_size: int = 2000):
+        self.chunk_size = chunk_size
+
+    def archive_order(self, order_id, delete_raw: bool = True) -> List[LocationTrace]:
+        """
+        Compactar los puntos de LocationHistory de una orden en LocationTrace
+
+        Se genera un segmento por conductor. Si delete_raw es True las filas
+        originales se eliminan en la misma transacción. Una orden ya archivada
+        no se vuelve a archivar (con delete_raw=False se duplicarían puntos).
+        """
+        from apps.orders.models import Order
+
+        points = LocationHistory.objects.filter(
+            order_id=order_id
+        ).order_by('driver_id', 'timestamp').values_list(
+            'driver_id', 'timestamp', 'latitude', 'longitude'
+        )
+
+        traces = []
+        encoder = None
+        current_driver = None
+
+        with transaction.atomic():
+            # Serializa archivados simultáneos de la misma orden
+            list(Order.objects.select_for_update().filter(id=order_id).values_list('id', flat=True))
+            if LocationTrace.objects.filter(order_id=order_id).exists():
+                logger.info(f"Order {order_id} already archived, skipping")
+                return []
+
+            for driver_id, timestamp, latitude, longitude in points.iterator(chunk_size=self.chunk_size):
+                if driver_id != current_driver:
+                    if encoder:
+                        traces.append(self._build_trace(order_id, current_driver, encoder))
+                    encoder = TraceEncoder()
+                    current_driver = driver_id
+                encoder.add(timestamp, latitude, longitude)
+
+            if encoder:
+                traces.append(self._build_trace(order_id, current_driver, encoder))
+
+            if not traces:
+                return []
+
+            LocationTrace.objects.bulk_create(traces)
+
+            if delete_raw:
+                LocationHistory.objects.filter(order_id=order_id).delete()
+
+        total_points = sum(trace.point_count for trace in traces)
+        total_bytes = sum(len(trace.data) for trace in traces)
+        logger.info(f"Archived {total_points} points for order {order_id} into {len(traces)} traces ({total_bytes} bytes)")
+        return traces
+
+    def archive_completed_orders(self, older_than, limit: int = 500, delete_raw: bool = True) -> int:
+        """Archivar recorridos de órdenes terminadas antes de 'older_than'"""
+        from apps.orders.models import Order
+
+        order_ids = list(
+            Order.objects.filter(
+                status__in=COMPLETED_ORDER_STATUSES,
+                updated_at__lt=older_than,
+                location_history__isnull=False
+            ).exclude(
+                location_traces__isnull=False
+            ).values_list('id', flat=True).distinct()[:limit]
+        )
+
+        archived = 0
+        for order_id in order_ids:
+            try:
+                if self.archive_order(order_id, delete_raw=delete_raw):
+                    archived += 1
+            except Exception as e:
+                logger.error(f"Failed to archive trace for order {order_id}: {e}")
+
+        return archived
+
+    def iter_order_points(self, order_id, start=None, end=None) -> Iterator[Tuple]:
+        """
+        Generar los puntos archivados de una orden en orden cronológico
+
+        Los segmentos se cargan con una sola lectura y se decodifican de forma
+        perezosa. Genera tuplas (timestamp, lat, lng, driver_id).
+        """
+        traces = LocationTrace.objects.filter(order_id=order_id)
+        if start:
+            traces = traces.filter(ended_at__gte=start)
+        if end:
+            traces = traces.filter(started_at__lte=end)
+
+        segments = [
+            self._iter_trace(trace, start, end)
+            for trace in traces.order_by('started_at')
+        ]
+        # Varios segmentos (cambio de conductor) se intercalan por tiempo
+        yield from heapq.merge(*segments, key=lambda point: point[0])
+
+    def _iter_trace(self, trace: LocationTrace, start, end) -> Iterator[Tuple]:
+        for timestamp, latitude, longitude in trace.iter_points():
+            if start and timestamp < start:
+                continue
+            if end and timestamp > end:
+                break
+            yield timestamp, latitude, longitude, trace.driver_id
+
+    def _build_trace(self, order_id, driver_id, encoder: TraceEncoder) -> LocationTrace:
+        return LocationTrace(
+            order_id=order_id,
+            driver_id=driver_id,
+            started_at=encoder.started_at,
+            ended_at=encoder.ended_at,
+            point_count=encoder.point_count,
+            encoding_version=TRACE_FORMAT_VERSION,
+            data=encoder.finish()
+        )
@@ -0,0 +1,117 @@
+import heapq
+import json
+from typing import Dict, Any, Iterator
+from django.db.models import Max
+
+from apps.orders.models import OrderStatusHistory
+from ..models import LocationHistory, LocationTrace
+from .trace_store import TraceStore
+
+
+class TripReplay:
+    """
+    Reproducción de un viaje: recorrido GPS + historial de estados en orden
+    cronológico, generado como NDJSON sin cargar todo en memoria.
+
+    Los puntos salen de LocationHistory (cursor del lado del servidor) y de
+    los recorridos archivados en LocationTrace.
+    """
+
+    def __init__(self, order, start=None, end=None, step: int = 1, min_interval: float = 0, chunk_size: int = 2000):
+        self.order = order
+        self.start = start
+        self.end = end
+        self.step = max(1, step)
+        self.min_interval = max(0.0, min_interval)
+        self.chunk_size = chunk_size
+
+    def iter_ndjson(self) -> Iterator[str]:
+        for record in self.iter_records():
+            yield json.dumps(record, default=str) + '\n'
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        yield {
+            'type': 'order',
+            'order_id': str(self.order.id),
+            'order_number': self.order.order_number,
+            'status': self.order.status,
+            'created_at': self.order.created_at.isoformat(),
+            'delivered_at': self.order.delivered_at.isoformat() if self.order.delivered_at else None
+        }
+
+        points = 0
+        events = 0
+        timeline = heapq.merge(
+            self._downsample(self._iter_points()),
+            self._iter_status_events(),
+            key=lambda record: record[0]
+        )
+
+        for timestamp, record in timeline:
+            record['t'] = timestamp.isoformat()
+            if record['type'] == 'location':
+                points += 1
+            else:
+                events += 1
+            yield record
+
+        yield {'type': 'summary', 'points': points, 'events': events}
+
+    def _iter_points(self):
+        """Puntos archivados y puntos crudos, intercalados por tiempo"""
+        raw = LocationHistory.objects.filter(order_id=self.order.id)
+        if self.start:
+            raw = raw.filter(timestamp__gte=self.start)
+        if self.end:
+            raw = raw.filter(timestamp__lte=self.end)
+
+        # Con --keep-raw los puntos archivados siguen en LocationHistory
+        archived_until = LocationTrace.objects.filter(order_id=self.order.id).aggregate(
+            until=Max('ended_at')
+        )['until']
+        if archived_until:
+            raw = raw.filter(timestamp__gt=archived_until)
+
+        raw_points = raw.order_by('timestamp').values_list(
+            'timestamp', 'latitude', 'longitude', 'driver_id'
+        ).iterator(chunk_size=self.chunk_size)
+
+        archived_points = TraceStore().iter_order_points(self.order.id, self.start, self.end)
+
+        return heapq.merge(archived_points, raw_points, key=lambda point: point[0])
+
+    def _downsample(self, points):
+        """Conservar uno de cada 'step' puntos y al menos 'min_interval' segundos entre puntos"""
+        last_emitted = None
+        for position, (timestamp, latitude, longitude, driver_id) in enumerate(points):
+            if position % self.step:
+                continue
+            if last_emitted and self.min_interval and (timestamp - last_emitted).total_seconds() < self.min_interval:
+                continue
+
+            last_emitted = timestamp
+            yield timestamp, {
+                'type': 'location',
+                'lat': float(latitude),
+                'lng': float(longitude),
+                'driver_id': str(driver_id)
+            }
+
+    def _iter_status_events(self):
+        events = OrderStatusHistory.objects.filter(order_id=self.order.id)
+        if self.start:
+            events = events.filter(timestamp__gte=self.start)
+        if self.end:
+            events = events.filter(timestamp__lte=self.end)
+
+        rows = events.order_by('timestamp').values_list(
+            'timestamp', 'status', 'notes', 'changed_by__username'
+        ).iterator(chunk_size=self.chunk_size)
+
+        for timestamp, status, notes, changed_by in rows:
+            yield timestamp, {
+                'type': 'status',
+                'status': status,
+                'notes': notes,
+                'changed_by': changed_by
+            }
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from apps.orders.models import Order
+from .services.geofence_service import GeofenceService
+
+
+@receiver(post_init, sender=Order)
+def remember_order_driver(sender, instance, **kwargs):
+    # Sin consultar si driver_id quedó diferido
+    instance._loaded_driver_id = instance.__dict__.get('driver_id')
+
+
+@receiver(post_save, sender=Order)
+def invalidate_driver_geofences(sender, instance, **kwargs):
+    """Reconstruir las geocercas del conductor (y del anterior si se reasignó) cuando cambia la orden"""
+    GeofenceService.invalidate(instance.driver_id, getattr(instance, '_loaded_driver_id', None))
+    instance._loaded_driver_id = instance.driver_id
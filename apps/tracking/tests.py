@@ -1,3 +1,284 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.businesses.models import Business
+from apps.orders.models import Order, OrderStatusHistory
+from apps.users.models import User, Address
+from .models import DriverLocation, DriverSpeedProfile, LocationHistory, LocationTrace, OrderTracking
+from .services.eta_service import ETAService
+from .services.geofence_service import GeofenceService
+from .services.trace_store import TraceStore
+from .services.trip_replay import TripReplay
+
+
+def create_order(status='assigned'):
+    customer = User.objects.create_user(username='cliente', password=None, phone='60000001', user_type='client')
+    driver = User.objects.create_user(username='conductor', password=None, phone='60000002', user_type='driver')
+    owner = User.objects.create_user(username='negocio', password=None, phone='60000003', user_type='business')
+    business = Business.objects.create(
+        owner=owner, name='Negocio', description='-', service_type='food', phone='60000003',
+        address='-', latitude=Decimal('9.000000'), longitude=Decimal('-79.500000')
+    )
+    address = Address.objects.create(
+        user=customer, title='Casa', address_line='-', latitude=Decimal('9.050000'), longitude=Decimal('-79.450000')
+    )
+    return Order.objects.create(
+        customer=customer, business=business, driver=driver, order_type='delivery', status=status,
+        delivery_address=address, subtotal=Decimal('10'), total=Decimal('12'), delivery_fee=Decimal('2')
+    )
+
+
+@override_settings(ETA_PROFILE_FLUSH_EVERY=3)
+class DriverSpeedProfileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.order = create_order()
+        self.now = timezone.now()
+
+    def ingest(self, speeds):
+        service = ETAService()
+        for speed in speeds:
+            service.ingest(self.order, self.order.driver, 9.0, -79.5, speed=speed, timestamp=self.now)
+
+    def test_flushes_are_added_to_the_stored_profile(self):
+        self.ingest([10, 20, 30])
+        # Otro proceso: sin nada en caché
+        cache.clear()
+        self.ingest([40, 50, 60])
+
+        profile = DriverSpeedProfile.objects.get(driver=self.order.driver)
+        self.assertEqual(profile.sample_count, 6)
+        self.assertEqual(profile.average_speed, Decimal('35.00'))
+
+    def test_pending_samples_count_before_the_flush(self):
+        self.ingest([10, 20, 30, 70])
+
+        hourly_speed, samples = ETAService()._update_hourly_speed(
+            self.order.driver_id, {'observed': None}, self.now
+        )
+        self.assertEqual(samples, 4)
+        self.assertAlmostEqual(hourly_speed, 32.5)
+
+
+class ActiveOrdersTests(TestCase):
+    def setUp(self):
+        self.order = create_order(status='on_the_way')
+        self.client = APIClient()
+        self.client.force_authenticate(self.order.customer)
+
+    def add_orders(self, count):
+        for index in range(count):
+            driver = User.objects.create_user(username=f'conductor-{index}', password=None,
+                                              phone=f'6100000{index}', user_type='driver')
+            DriverLocation.objects.create(driver=driver, latitude=Decimal('9.01'), longitude=Decimal('-79.49'))
+            order = Order.objects.create(
+                customer=self.order.customer, business=self.order.business, driver=driver, order_type='delivery',
+                status='picked_up', delivery_address=self.order.delivery_address,
+                subtotal=Decimal('10'), total=Decimal('12'), delivery_fee=Decimal('2')
+            )
+            OrderTracking.objects.create(order=order, driver=driver, estimated_duration=10)
+
+    def active_orders(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tracking/orders/active_orders/')
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_query_count_does_not_grow_with_the_orders(self):
+        orders, baseline = self.active_orders()
+        self.assertEqual(len(orders), 1)
+
+        self.add_orders(5)
+        orders, queries = self.active_orders()
+
+        self.assertEqual(len(orders), 6)
+        self.assertEqual(queries, baseline)
+        self.assertEqual(sum(1 for order in orders if order['tracking'] and order['driver_location']), 5)
+
+
+class UpdateLocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.order = create_order()
+        self.client = APIClient()
+        self.client.force_authenticate(self.order.driver)
+
+    def update(self):
+        response = self.client.post('/api/tracking/orders/update_location/', {
+            'order_id': str(self.order.id), 'latitude': 9.02, 'longitude': -79.48, 'speed': 30
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_response_keeps_the_original_keys_and_adds_the_eta(self):
+        Order.objects.filter(id=self.order.id).update(status='picked_up')
+
+        data = self.update()
+
+        self.assertTrue({
+            'id', 'order_id', 'order_status', 'status', 'latitude', 'longitude', 'notes', 'timestamp',
+            'customer_name', 'driver_name'
+        } <= set(data))
+        self.assertEqual((data['order_id'], data['status']), (str(self.order.id), 'picked_up'))
+        self.assertTrue(data['eta']['saved'])
+        self.assertIsNotNone(OrderTracking.objects.get(order=self.order).estimated_arrival)
+
+    def test_eta_is_skipped_before_pickup_and_after_delivery(self):
+        for order_status in ('assigned', 'delivered'):
+            Order.objects.filter(id=self.order.id).update(status=order_status)
+
+            self.assertIsNone(self.update()['eta'])
+
+        self.assertEqual(LocationHistory.objects.filter(order=self.order).count(), 2)
+        self.assertFalse(OrderTracking.objects.filter(order=self.order).exists())
+
+
+class TraceArchiveTests(TestCase):
+    def setUp(self):
+        self.order = create_order(status='delivered')
+        for index in range(5):
+            LocationHistory.objects.create(
+                driver=self.order.driver, order=self.order,
+                latitude=Decimal('9.0') + Decimal(index) / 1000, longitude=Decimal('-79.5')
+            )
+
+    def replayed_points(self):
+        return [record for record in TripReplay(self.order).iter_records() if record['type'] == 'location']
+
+    def test_keep_raw_archives_each_order_once(self):
+        store = TraceStore()
+        older_than = timezone.now() + timedelta(hours=1)
+
+        self.assertEqual(store.archive_completed_orders(older_than, delete_raw=False), 1)
+        self.assertEqual(store.archive_completed_orders(older_than, delete_raw=False), 0)
+        self.assertEqual(store.archive_order(self.order.id, delete_raw=False), [])
+
+        self.assertEqual(LocationTrace.objects.filter(order=self.order).count(), 1)
+        self.assertEqual(len(self.replayed_points()), 5)
+
+    def test_replay_keeps_points_recorded_after_the_archive(self):
+        TraceStore().archive_order(self.order.id, delete_raw=False)
+        LocationHistory.objects.create(
+            driver=self.order.driver, order=self.order, latitude=Decimal('9.01'), longitude=Decimal('-79.5')
+        )
+
+        self.assertEqual(len(self.replayed_points()), 6)
+
+
+@override_settings(GEOFENCE_AUTO_STATUS=True, GEOFENCE_NOTIFY=False, OUTBOX_INLINE_DISPATCH=False)
+class TripReplayTests(TestCase):
+    def setUp(self):
+        self.order = create_order(status='delivered')
+        self.base = (timezone.now() - timedelta(hours=1)).replace(microsecond=0)
+
+    def at(self, seconds):
+        return self.base + timedelta(seconds=seconds)
+
+    def point(self, seconds):
+        point = LocationHistory.objects.create(
+            driver=self.order.driver, order=self.order, latitude=Decimal('9.0'), longitude=Decimal('-79.5')
+        )
+        LocationHistory.objects.filter(id=point.id).update(timestamp=self.at(seconds))
+
+    def status_change(self, seconds, order_status):
+        history = OrderStatusHistory.objects.create(order=self.order, status=order_status, changed_by=self.order.driver)
+        OrderStatusHistory.objects.filter(id=history.id).update(timestamp=self.at(seconds))
+
+    def timeline(self, **options):
+        records = list(TripReplay(self.order, **options).iter_records())
+        return [
+            (record['type'], int((parse_datetime(record['t']) - self.base).total_seconds()))
+            for record in records[1:-1]
+        ], records[-1]
+
+    def test_archived_points_raw_points_and_status_events_are_merged_by_time(self):
+        for seconds in (0, 10, 20):
+            self.point(seconds)
+        TraceStore().archive_order(self.order.id)
+        for seconds in (30, 40):
+            self.point(seconds)
+        self.status_change(5, 'picked_up')
+        self.status_change(35, 'delivered')
+
+        timeline, summary = self.timeline()
+
+        self.assertEqual(timeline, [
+            ('location', 0), ('status', 5), ('location', 10), ('location', 20),
+            ('location', 30), ('status', 35), ('location', 40)
+        ])
+        self.assertEqual(summary, {'type': 'summary', 'points': 5, 'events': 2})
+
+    def test_step_and_min_interval_downsample_the_points(self):
+        for seconds in range(0, 60, 10):
+            self.point(seconds)
+
+        for options, expected in (
+            ({'step': 2}, [0, 20, 40]),
+            ({'min_interval': 15}, [0, 20, 40]),
+            ({'step': 2, 'min_interval': 30}, [0, 40]),
+        ):
+            timeline, _ = self.timeline(**options)
+            self.assertEqual([seconds for _, seconds in timeline], expected, options)
+
+    def test_replay_endpoint_is_only_for_admins_and_staff(self):
+        self.point(0)
+        url = f'/api/tracking/orders/replay/{self.order.id}/'
+        client = APIClient()
+
+        for user in (self.order.customer, self.order.driver):
+            client.force_authenticate(user)
+            self.assertEqual(client.get(url).status_code, 403)
+
+        staff = User.objects.create_user(username='soporte', password=None, phone='60000005',
+                                         user_type='client', is_staff=True)
+        admin = User.objects.create_user(username='admin', password=None, phone='60000006', user_type='admin')
+        for user in (staff, admin):
+            client.force_authenticate(user)
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+            self.assertEqual([record['type'] for record in records], ['order', 'location', 'summary'])
+
+
+class GeofenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.order = create_order(status='assigned')
+        self.driver = self.order.driver
+
+    def test_delivery_fence_waits_for_pickup(self):
+        service = GeofenceService()
+        # Camino al negocio, cerca del cliente
+        self.assertEqual(service.check(self.driver, 9.05, -79.45), [])
+        self.assertFalse(OrderTracking.objects.filter(order=self.order, actual_arrival__isnull=False).exists())
+
+        self.assertEqual(
+            service.check(self.driver, 9.0, -79.5),
+            [{'order_id': str(self.order.id), 'kind': 'pickup'}]
+        )
+        self.assertEqual(
+            service.check(self.driver, 9.05, -79.45),
+            [{'order_id': str(self.order.id), 'kind': 'delivery'}]
+        )
+
+    def test_reassignment_invalidates_previous_driver(self):
+        GeofenceService().check(self.driver, 8.0, -80.0)
+        self.assertIsNotNone(cache.get(GeofenceService.cache_key(self.driver.id)))
+
+        other = User.objects.create_user(username='otro', password=None, phone='60000004', user_type='driver')
+        order = Order.objects.get(id=self.order.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.driver = other
+            order.save()
+
+        self.assertIsNone(cache.get(GeofenceService.cache_key(self.driver.id)))
+        self.assertEqual(GeofenceService().check(self.driver, 9.0, -79.5), [])
@@ -3,13 +3,22 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.exceptions import ValidationError
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 import logging
 
-from .models import OrderTracking, DriverLocation
-from .serializers import OrderTrackingSerializer, DriverLocationSerializer
-from apps.orders.models import Order
+from .models import OrderTracking, DriverLocation, LocationHistory
+from .serializers import (
+    OrderTrackingSerializer, ActiveOrderTrackingSerializer, DriverLocationSerializer,
+    LocationPingSerializer
+)
+from .services.eta_service import ETAService, PICKED_UP_STATUSES
+from .services.geofence_service import GeofenceService
+from .services.trip_replay import TripReplay
+from apps.orders.models import Order, ACTIVE_ORDER_STATUSES
 
 logger = logging.getLogger(__name__)
 
@@ -17,18 +26,19 @@ class OrderTrackingViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = OrderTrackingSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['status']
+    filterset_fields = ['order__status']
     
     def get_queryset(self):
         user = self.request.user
+        queryset = OrderTracking.objects.select_related('order__customer', 'order__driver')
         if user.user_type == 'client':
-            return OrderTracking.objects.filter(order__customer=user).order_by('-timestamp')
+            return queryset.filter(order__customer=user).order_by('-updated_at')
         elif user.user_type == 'driver':
-            return OrderTracking.objects.filter(order__driver=user).order_by('-timestamp')
+            return queryset.filter(order__driver=user).order_by('-updated_at')
         elif user.user_type == 'business':
-            return OrderTracking.objects.filter(order__business__owner=user).order_by('-timestamp')
+            return queryset.filter(order__business__owner=user).order_by('-updated_at')
         elif user.user_type == 'admin':
-            return OrderTracking.objects.all().order_by('-timestamp')
+            return queryset.order_by('-updated_at')
         return OrderTracking.objects.none()
     
     @action(detail=False, methods=['get'])
@@ -36,37 +46,65 @@ class OrderTrackingViewSet(viewsets.ReadOnlyModelViewSet):
         """Obtener tracking de órdenes activas"""
         user = request.user
         
-        # Estados considerados como activos
-        active_statuses = ['confirmed', 'preparing', 'ready', 'picked_up', 'on_the_way']
-        
         if user.user_type == 'client':
-            orders = Order.objects.filter(
-                customer=user,
-                status__in=active_statuses
-            )
+            scope = {'customer': user}
         elif user.user_type == 'driver':
-            orders = Order.objects.filter(
-                driver=user,
-                status__in=active_statuses
-            )
+            scope = {'driver': user}
         elif user.user_type == 'business':
-            orders = Order.objects.filter(
-                business__owner=user,
-                status__in=active_statuses
-            )
+            scope = {'business__owner': user}
         else:
             return Response({
                 'error': 'No tienes permisos para ver órdenes activas'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Obtener último tracking de cada orden
-        tracking_data = []
-        for order in orders:
-            latest_tracking = OrderTracking.objects.filter(order=order).first()
-            if latest_tracking:
-                tracking_data.append(OrderTrackingSerializer(latest_tracking).data)
+        # Una sola consulta: tracking, conductor, ubicación y nombres vía JOIN
+        orders = Order.objects.filter(
+            status__in=ACTIVE_ORDER_STATUSES,
+            **scope
+        ).select_related(
+            'customer', 'business', 'driver', 'driver__current_location', 'tracking'
+        ).order_by('created_at')
+        
+        serializer = ActiveOrderTrackingSerializer(orders, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'], url_path=r'replay/(?P<order_id>[^/.]+)')
+    def replay(self, request, order_id=None):
+        """Reproducir el recorrido y los estados de una orden (NDJSON)"""
+        if request.user.user_type != 'admin' and not request.user.is_staff:
+            return Response({
+                'error': 'Solo soporte puede reproducir viajes'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            order = Order.objects.get(id=order_id)
+        except (Order.DoesNotExist, ValidationError):
+            return Response({
+                'error': 'Orden no encontrada'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        params = request.query_params
+        start = parse_datetime(params['start']) if params.get('start') else None
+        end = parse_datetime(params['end']) if params.get('end') else None
+        if (params.get('start') and not start) or (params.get('end') and not end):
+            return Response({
+                'error': 'start y end deben ser fechas ISO 8601'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        start = timezone.make_aware(start) if start and timezone.is_naive(start) else start
+        end = timezone.make_aware(end) if end and timezone.is_naive(end) else end
+        
+        try:
+            step = int(params.get('step', 1))
+            min_interval = float(params.get('min_interval', 0))
+        except ValueError:
+            return Response({
+                'error': 'step y min_interval deben ser números'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(tracking_data)
+        replay = TripReplay(order, start=start, end=end, step=step, min_interval=min_interval)
+        response = StreamingHttpResponse(replay.iter_ndjson(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'inline; filename="trip-{order.order_number}.ndjson"'
+        return response
     
     @action(detail=False, methods=['post'])
     def update_location(self, request):
@@ -86,30 +124,46 @@ class OrderTrackingViewSet(viewsets.ReadOnlyModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            order = Order.objects.get(id=order_id, driver=request.user)
+            order = Order.objects.select_related(
+                'delivery_address', 'pickup_address', 'business', 'customer'
+            ).get(id=order_id, driver=request.user)
             
-            # Crear tracking entry
-            tracking = OrderTracking.objects.create(
-                order=order,
-                status=order.status,
-                latitude=float(latitude),
-                longitude=float(longitude),
-                notes=f"Ubicación actualizada por conductor"
-            )
+            latitude = float(latitude)
+            longitude = float(longitude)
+            speed = request.data.get('speed')
+            speed = float(speed) if speed not in (None, '') else None
             
             # Actualizar ubicación del conductor
             DriverLocation.objects.update_or_create(
                 driver=request.user,
                 defaults={
-                    'latitude': float(latitude),
-                    'longitude': float(longitude),
-                    'is_active': True,
-                    'last_updated': timezone.now()
+                    'latitude': latitude,
+                    'longitude': longitude,
+                    'speed': speed,
+                    'heading': request.data.get('heading'),
+                    'accuracy': request.data.get('accuracy')
                 }
             )
             
-            serializer = OrderTrackingSerializer(tracking)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            # Registrar punto del recorrido
+            point = LocationHistory.objects.create(
+                driver=request.user,
+                order=order,
+                latitude=latitude,
+                longitude=longitude
+            )
+            
+            data = LocationPingSerializer(point).data
+            
+            # Recalcular ETA solo mientras el conductor lleva el pedido
+            data['eta'] = None
+            if order.status in PICKED_UP_STATUSES:
+                data['eta'] = ETAService().ingest(order, request.user, latitude, longitude, speed=speed)
+            
+            # Detectar llegada a recogida/entrega
+            data['geofence_events'] = GeofenceService().check(request.user, latitude, longitude)
+            
+            return Response(data, status=status.HTTP_201_CREATED)
             
         except Order.DoesNotExist:
             return Response({
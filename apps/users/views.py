@@ -5,7 +5,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import serializers
 from django_filters.rest_framework import DjangoFilterBackend
-from django.contrib.auth import login
+from django.contrib.auth import login, logout
 from rest_framework.authtoken.models import Token
 from .models import User, Address, DriverProfile
 from .serializers import (
@@ -117,6 +117,16 @@ class UserViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def logout(self, request):
+        """Cerrar sesión: revoca el token (la señal lo saca de la caché)"""
+        Token.objects.filter(user=request.user).delete()
+        logout(request)
+        
+        return Response({
+            'message': 'Sesión cerrada exitosamente'
+        })
+    
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def resend_verification_code(self, request):
         """Reenviar código de verificación por el método preferido"""
@@ -77,6 +77,7 @@ INSTALLED_APPS = [
     'apps.payments.apps.PaymentsConfig',
     'apps.notifications.apps.NotificationsConfig',
     'apps.tracking.apps.TrackingConfig',
+    'apps.outbox.apps.OutboxConfig',
 ]
 
 MIDDLEWARE = [
@@ -152,4 +153,141 @@ BACKEND_URL = os.environ.get('BACKEND_URL', 'https://easydeals-backend-241687594
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
-TWILIO_WHATSAPP_NUMBER = os.environ.get('TWILIO_WHATSAPP_NUMBER')
\ No newline at end of file
+TWILIO_WHATSAPP_NUMBER = os.environ.get('TWILIO_WHATSAPP_NUMBER')
+
+# Tracking / ETA
+ETA_DEFAULT_SPEED_KMH = float(os.environ.get('ETA_DEFAULT_SPEED_KMH', 25))  # Sin historial del conductor
+ETA_MIN_SPEED_KMH = float(os.environ.get('ETA_MIN_SPEED_KMH', 5))  # Evita ETAs infinitos en tráfico detenido
+ETA_MAX_SPEED_KMH = float(os.environ.get('ETA_MAX_SPEED_KMH', 150))  # Descarta saltos de GPS
+ETA_SMOOTHING_ALPHA = float(os.environ.get('ETA_SMOOTHING_ALPHA', 0.3))  # Peso de la muestra más reciente
+ETA_RECENT_WEIGHT = float(os.environ.get('ETA_RECENT_WEIGHT', 0.7))  # Velocidad reciente vs. histórica
+ETA_WARMUP_SAMPLES = int(os.environ.get('ETA_WARMUP_SAMPLES', 5))
+ETA_ROUTE_FACTOR = float(os.environ.get('ETA_ROUTE_FACTOR', 1.3))  # Línea recta -> distancia por calle
+ETA_MIN_CHANGE_SECONDS = int(os.environ.get('ETA_MIN_CHANGE_SECONDS', 60))
+ETA_PROFILE_MIN_SAMPLES = int(os.environ.get('ETA_PROFILE_MIN_SAMPLES', 20))
+ETA_PROFILE_FLUSH_EVERY = int(os.environ.get('ETA_PROFILE_FLUSH_EVERY', 10))
+
+# Geocercas de recogida y entrega
+GEOFENCE_PICKUP_RADIUS_METERS = float(os.environ.get('GEOFENCE_PICKUP_RADIUS_METERS', 75))
+GEOFENCE_DELIVERY_RADIUS_METERS = float(os.environ.get('GEOFENCE_DELIVERY_RADIUS_METERS', 75))
+GEOFENCE_AUTO_STATUS = config('GEOFENCE_AUTO_STATUS', default=False, cast=bool)  # ready/assigned -> picked_up
+GEOFENCE_NOTIFY = config('GEOFENCE_NOTIFY', default=True, cast=bool)
+
+# Cliente HTTP de Tilopay (pool keep-alive por worker)
+TILOPAY_CONNECT_TIMEOUT = float(os.environ.get('TILOPAY_CONNECT_TIMEOUT', 3.05))  # segundos
+TILOPAY_READ_TIMEOUT = float(os.environ.get('TILOPAY_READ_TIMEOUT', 20))  # segundos
+TILOPAY_POOL_MAXSIZE = int(os.environ.get('TILOPAY_POOL_MAXSIZE', 8))  # = hilos de gunicorn
+TILOPAY_MAX_RETRIES = int(os.environ.get('TILOPAY_MAX_RETRIES', 3))
+TILOPAY_RETRY_BACKOFF = float(os.environ.get('TILOPAY_RETRY_BACKOFF', 0.3))
+
+# Bandeja de webhooks de Tilopay
+TILOPAY_WEBHOOK_BATCH_SIZE = int(os.environ.get('TILOPAY_WEBHOOK_BATCH_SIZE', 100))
+TILOPAY_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('TILOPAY_WEBHOOK_MAX_ATTEMPTS', 5))
+TILOPAY_WEBHOOK_INLINE_DRAIN = config('TILOPAY_WEBHOOK_INLINE_DRAIN', default=True, cast=bool)  # False = solo el comando
+TILOPAY_WEBHOOK_VERIFY_SIGNATURE = config('TILOPAY_WEBHOOK_VERIFY_SIGNATURE', default=False, cast=bool)  # HMAC-SHA256 con TILOPAY_SECRET_KEY
+
+# Estadísticas de pagos
+PAYMENT_STATS_CACHE_TTL = int(os.environ.get('PAYMENT_STATS_CACHE_TTL', 30))  # segundos, 0 = sin caché
+
+# Conciliación de pagos con Tilopay
+TILOPAY_RECONCILE_AFTER_MINUTES = int(os.environ.get('TILOPAY_RECONCILE_AFTER_MINUTES', 15))
+TILOPAY_RECONCILE_WORKERS = int(os.environ.get('TILOPAY_RECONCILE_WORKERS', 4))  # <= TILOPAY_POOL_MAXSIZE
+TILOPAY_RECONCILE_RATE = float(os.environ.get('TILOPAY_RECONCILE_RATE', 10))  # consultas por segundo
+TILOPAY_RECONCILE_BATCH_SIZE = int(os.environ.get('TILOPAY_RECONCILE_BATCH_SIZE', 200))
+
+# Expiración de pagos pendientes
+PAYMENT_EXPIRY_MINUTES = int(os.environ.get('PAYMENT_EXPIRY_MINUTES', 60))
+PAYMENT_EXPIRY_GRACE_SECONDS = int(os.environ.get('PAYMENT_EXPIRY_GRACE_SECONDS', 300))  # webhooks tardíos de Tilopay
+PAYMENT_EXPIRY_BATCH_SIZE = int(os.environ.get('PAYMENT_EXPIRY_BATCH_SIZE', 500))
+# Orden de un pago expirado: 'cancel' la cancela; 'reopen' la deja pendiente
+# y avisa al cliente que puede reintentar el pago
+PAYMENT_EXPIRED_ORDER_ACTION = os.environ.get('PAYMENT_EXPIRED_ORDER_ACTION', 'cancel')
+
+# Caché en memoria para lecturas calientes (alias 'shared'): Redis con
+# REDIS_URL, compartida por todas las instancias; sin él, por proceso, y
+# entonces la invalidación por señales solo llega al proceso que hizo el
+# cambio y el TTL corto acota lo demás. Nunca la base de datos: sería la
+# misma consulta que la caché evita
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+else:
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'}
+
+# Caché de subcomercios para el split de pagos
+SUBMERCHANT_CACHE_TTL = int(os.environ.get('SUBMERCHANT_CACHE_TTL', 600 if REDIS_URL else 60))  # segundos
+
+# Checkout asíncrono: la sesión de Tilopay se crea fuera del request
+CHECKOUT_ASYNC = config('CHECKOUT_ASYNC', default=False, cast=bool)
+CHECKOUT_WORKERS = int(os.environ.get('CHECKOUT_WORKERS', 4))
+CHECKOUT_MAX_PENDING = int(os.environ.get('CHECKOUT_MAX_PENDING', 64))  # Con la cola llena se crea en el request
+
+# Registro de intentos de pago (PaymentAttempt) en segundo plano
+PAYMENT_ATTEMPTS_ENABLED = config('PAYMENT_ATTEMPTS_ENABLED', default=True, cast=bool)
+PAYMENT_ATTEMPT_FLUSH_INTERVAL = float(os.environ.get('PAYMENT_ATTEMPT_FLUSH_INTERVAL', 2))  # segundos
+PAYMENT_ATTEMPT_BATCH_SIZE = int(os.environ.get('PAYMENT_ATTEMPT_BATCH_SIZE', 200))
+PAYMENT_ATTEMPT_QUEUE_SIZE = int(os.environ.get('PAYMENT_ATTEMPT_QUEUE_SIZE', 10000))  # Llena = se descartan
+
+# Notificaciones masivas
+NOTIFICATION_BULK_CHUNK_SIZE = int(os.environ.get('NOTIFICATION_BULK_CHUNK_SIZE', 1000))  # usuarios por bulk_create
+
+# Envío de push (FCM)
+PUSH_BACKEND = os.environ.get('PUSH_BACKEND', '')  # '' = sin push, 'fake', 'firebase' o ruta a una clase
+PUSH_BATCH_SIZE = int(os.environ.get('PUSH_BATCH_SIZE', 500))  # tokens por multicast (máximo de FCM: 500)
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', 8))  # multicast simultáneos
+FIREBASE_CREDENTIALS_FILE = os.environ.get('FIREBASE_CREDENTIALS_FILE', '')  # vacío = credenciales por defecto
+
+# Outbox transaccional (efectos secundarios de órdenes y pagos)
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 60))  # Vencido, otro dispatcher retoma el evento
+OUTBOX_INLINE_DISPATCH = config('OUTBOX_INLINE_DISPATCH', default=True, cast=bool)  # False = solo dispatch_outbox --loop
+
+# Purga de notificaciones antiguas
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+NOTIFICATION_READ_PROMOTION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_READ_PROMOTION_RETENTION_DAYS', 14))
+NOTIFICATION_PURGE_BATCH_SIZE = int(os.environ.get('NOTIFICATION_PURGE_BATCH_SIZE', 1000))  # filas por DELETE
+NOTIFICATION_PURGE_PAUSE_SECONDS = float(os.environ.get('NOTIFICATION_PURGE_PAUSE_SECONDS', 0.1))
+
+# Agrupación de notificaciones seguidas (por usuario y collapse_key)
+NOTIFICATION_COALESCE_SECONDS = float(os.environ.get('NOTIFICATION_COALESCE_SECONDS', 20))  # 0 = sin ventana
+NOTIFICATION_COALESCE_BATCH_SIZE = int(os.environ.get('NOTIFICATION_COALESCE_BATCH_SIZE', 500))
+
+# Contador de no leídas en la caché 'shared' (write-through al confirmar)
+NOTIFICATION_UNREAD_CACHE_TTL = int(os.environ.get('NOTIFICATION_UNREAD_CACHE_TTL', 300 if REDIS_URL else 5))  # segundos, 0 = sin caché
+
+# Estadísticas de notificaciones
+NOTIFICATION_STATS_CACHE_TTL = int(os.environ.get('NOTIFICATION_STATS_CACHE_TTL', 60))  # segundos, 0 = sin caché
+
+# Autenticación por token con caché: en Redis (compartida, la invalidación
+# llega a todas las instancias) o, sin REDIS_URL, por proceso con un TTL de
+# segundos; en la caché de base de datos no ahorraría la consulta
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 60 if REDIS_URL else 5))  # segundos, 0 = sin caché
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_TOKEN_CACHE_MAX_ENTRIES', 10000))
+
+if REDIS_URL:
+    AUTH_TOKEN_CACHE = {**SHARED_CACHE, 'KEY_PREFIX': 'auth'}
+else:
+    AUTH_TOKEN_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth-tokens',
+        'OPTIONS': {'MAX_ENTRIES': AUTH_TOKEN_CACHE_MAX_ENTRIES},
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': SHARED_CACHE,
+    'auth_tokens': {**AUTH_TOKEN_CACHE, 'TIMEOUT': AUTH_TOKEN_CACHE_TTL},
+}
+
+# Solo se agrega el token con caché; el resto queda con los valores por
+# defecto de DRF (mismo orden: sin sesión ni token, responde 403)
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+        'apps.authentication.authentication.CachedTokenAuthentication',
+    ],
+}